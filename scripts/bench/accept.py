@@ -0,0 +1,61 @@
+"""
+Accepts 50k loopback TCP connections through a server Pipe and
+reports connections/sec. Clients connect in small windows (the
+select() based loop can't watch fds above FD_SETSIZE) and reset
+on close so TIME_WAIT doesn't use up the ephemeral ports.
+
+python scripts/bench/accept.py [connections]
+"""
+
+import asyncio
+import socket
+import struct
+import sys
+import time
+from aionetiface.testing import FakeInterface
+from aionetiface.net.net_defs import NET_CONF, TCP, IP4
+from aionetiface.net.pipe.pipe import Pipe
+
+WINDOW = 64
+
+
+async def connect_one(loop, dest):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+    sock.setblocking(False)
+    await loop.sock_connect(sock, dest)
+    return sock
+
+
+async def bench_loopback(n):
+    loop = asyncio.get_event_loop()
+    nic = FakeInterface("lo", 0, IP4, "127.0.0.1", None)
+    conf = dict(NET_CONF, accept_backlog=WINDOW * 2)
+    server = await Pipe(TCP, None, await nic.route(IP4).bind(), conf=conf).connect()
+    dest = ("127.0.0.1", server.sock.getsockname()[1])
+
+    accepted = 0
+    start = time.perf_counter()
+    while accepted < n:
+        count = min(WINDOW, n - accepted)
+        socks = await asyncio.gather(*[connect_one(loop, dest) for _ in range(count)])
+        for _ in range(count):
+            conn = await server.accept()
+            conn.transport.abort()
+
+        for sock in socks:
+            sock.close()
+
+        accepted += count
+
+    elapsed = time.perf_counter() - start
+    await server.close()
+    print(
+        "loopback accept: {0} cons in {1:.2f}s = {2:.0f} cons/s".format(
+            n, elapsed, n / elapsed
+        )
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(bench_loopback(int(sys.argv[1]) if len(sys.argv) > 1 else 50000))
@@ -0,0 +1,69 @@
+"""
+Opens and closes N loopback UDP pipes in bursts of B, with and
+without the pre-bound socket pool. Reports pipes opened per second
+and the pool's hit rate.
+
+python scripts/bench/pipe_open.py [N] [B]
+"""
+
+import asyncio
+import sys
+import time
+from aionetiface.testing import FakeInterface
+from aionetiface.net.net_defs import NET_CONF, UDP, IP4, LOOPBACK_BIND
+from aionetiface.net.pipe.pipe import Pipe
+from aionetiface.net.pipe.pipe_sock_pool import get_sock_pool, close_sock_pools
+from aionetiface.net.asyncio.async_run import async_run
+
+
+async def open_pipe(nic, dest, conf, pooled):
+    # A fresh route per pipe like StunClient.get_dest_pipe().
+    route = await nic.route(IP4).bind()
+    return await Pipe(UDP, dest, route, conf=conf, pooled=pooled).connect()
+
+
+async def run(nic, n, burst, pooled):
+    conf = dict(NET_CONF, sock_pool_size=burst)
+    dest = ("127.0.0.1", 9)
+    route = await nic.route(IP4).bind()
+    if pooled:
+        await get_sock_pool(route, conf, LOOPBACK_BIND).warm()
+
+    start = time.perf_counter()
+    for _ in range(n // burst):
+        pipes = await asyncio.gather(
+            *[open_pipe(nic, dest, conf, pooled) for _ in range(burst)]
+        )
+        opened = time.perf_counter()
+        for pipe in pipes:
+            await pipe.close()
+
+        # Time between bursts for the refill (not counted.)
+        start += time.perf_counter() - opened
+        await asyncio.sleep(0.01)
+        start += 0.01
+
+    took = time.perf_counter() - start
+    stats = get_sock_pool(route, conf, LOOPBACK_BIND).stats()
+    print(
+        "pooled={0}  n={1}  burst={2}  {3:.0f} opens/s  hits={4} misses={5}".format(
+            pooled, n, burst, n / took, stats["hits"], stats["misses"]
+        )
+    )
+    close_sock_pools()
+
+
+async def main(n, burst):
+    nic = FakeInterface("lo", 0, IP4, "127.0.0.1", None)
+    await run(nic, n, burst, False)
+    await run(nic, n, burst, True)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    async_run(
+        main(
+            int(args[0]) if args else 2000,
+            int(args[1]) if len(args) > 1 else 50,
+        )
+    )
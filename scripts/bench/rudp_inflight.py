@@ -0,0 +1,62 @@
+"""
+Sends N reliable datagrams between two RUDP pipes on loopback with
+all of them in flight at once. Reports how long until every one
+was ACKed, how many timer handles the loop had scheduled at the
+peak and the RTO the sender settled on for the peer.
+
+python scripts/bench/rudp_inflight.py [N] [--sack]
+
+--sack turns on rudp_sack (delayed, coalesced ACKs) for both pipes.
+"""
+
+import asyncio
+import sys
+import time
+from aionetiface.testing import FakeInterface
+from aionetiface.net.net_defs import NET_CONF, RUDP, IP4
+from aionetiface.net.pipe.pipe import Pipe
+from aionetiface.net.asyncio.async_run import async_run
+
+
+async def make_pipe(nic, conf):
+    route = await nic.route(IP4).bind()
+    return await Pipe(RUDP, None, route, conf=conf).connect()
+
+
+async def main(n, sack):
+    nic = FakeInterface("lo", 0, IP4, "127.0.0.1", None)
+    conf = dict(NET_CONF, rudp_sack=sack)
+    sender = await make_pipe(nic, conf)
+    receiver = await make_pipe(nic, conf)
+    dest = ("127.0.0.1", receiver.sock.getsockname()[1])
+    loop = asyncio.get_running_loop()
+
+    start = time.perf_counter()
+    entries = []
+    for i in range(n):
+        entry, _ = await sender.stream.ack_send(str(i).encode("ascii"), dest)
+        entries.append(entry)
+
+    scheduled = len(loop._scheduled)
+    acked = await asyncio.gather(*entries)
+    took = time.perf_counter() - start
+
+    print(
+        "n={0}  acked={1}  {2:.3f}s  timers at peak={3}  rto={4:.3f}s  ack pkts={5}  {6}".format(
+            n,
+            sum(acked),
+            took,
+            scheduled,
+            sender.stream.rtx.rto(dest),
+            sender.counters.msgs_in,
+            sender.stream.rtx.stats(),
+        )
+    )
+
+    await sender.close()
+    await receiver.close()
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--sack"]
+    async_run(main(int(args[0]) if args else 500, "--sack" in sys.argv))
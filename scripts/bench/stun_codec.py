@@ -0,0 +1,104 @@
+"""
+STUN encode and decode rates: building a Binding request
+attribute by attribute vs stun_req_buf() templates, and reading
+a reply with read_attr() + STUNAddrTup vs stun_proto() (offset
+table + unpack_addr.)
+
+python scripts/bench/stun_codec.py [N]
+"""
+
+import sys
+import time
+from aionetiface.net.net_defs import IP4
+from aionetiface.protocol.stun.stun_defs import (
+    RFC3489,
+    RFC5389,
+    STUNAddrTup,
+    STUNAttrs,
+    STUNMsg,
+    STUNMsgCodes,
+    stun_req_buf,
+)
+from aionetiface.protocol.stun.stun_utils import stun_proto
+
+CHANGE = [[STUNAttrs.ChangeRequest, b"\0\0\0\6"]]
+
+
+def encode_msg(mode, attrs):
+    msg = STUNMsg(mode=mode)
+    for attr_code, attr_data in attrs:
+        msg.write_attr(attr_code, attr_data)
+
+    msg.write_transaction_counter(1)
+    return msg.pack()
+
+
+def encode_template(mode, attrs):
+    return stun_req_buf(mode, attrs)[1]
+
+
+def reply_buf():
+    msg = STUNMsg(msg_code=STUNMsgCodes.SuccessResp, mode=RFC5389)
+    tup = STUNAddrTup(
+        ip="203.0.113.7",
+        port=40000,
+        txid=msg.txn_id,
+        magic_cookie=msg.magic_cookie,
+    )
+    msg.write_attr(STUNAttrs.MappedAddress, tup.encode(STUNAttrs.MappedAddress))
+    msg.write_attr(STUNAttrs.SourceAddress, tup.encode(STUNAttrs.MappedAddress))
+    msg.write_attr(STUNAttrs.ChangedAddress, tup.encode(STUNAttrs.MappedAddress))
+    msg.write_attr(STUNAttrs.XorMappedAddress, tup.encode(STUNAttrs.XorMappedAddress))
+    msg.write_attr(STUNAttrs.Software, b"bench")
+    return msg.pack()
+
+
+def decode_read_attr(buf):
+    msg, _ = STUNMsg.unpack(buf)
+    while not msg.eof():
+        attr_code, _, attr_data = msg.read_attr()
+        if attr_code == STUNAttrs.XorMappedAddress:
+            msg.rtup = STUNAddrTup(
+                af=IP4, txid=msg.txn_id, magic_cookie=msg.magic_cookie
+            ).unpack(attr_code, attr_data).tup
+        if attr_code == STUNAttrs.ChangedAddress:
+            msg.ctup = STUNAddrTup(af=IP4).unpack(attr_code, attr_data).tup
+
+    return msg
+
+
+def decode_table(buf):
+    return stun_proto(buf, IP4)[0]
+
+
+def rate(f, n, *args):
+    start = time.perf_counter()
+    for _ in range(n):
+        f(*args)
+
+    return n / (time.perf_counter() - start)
+
+
+def main(n):
+    for mode, name in ((RFC3489, "rfc3489"), (RFC5389, "rfc5389")):
+        for attrs in ([], CHANGE):
+            print(
+                "encode {0} attrs={1}  write_attr {2:.0f}/s  template {3:.0f}/s".format(
+                    name,
+                    len(attrs),
+                    rate(encode_msg, n, mode, attrs),
+                    rate(encode_template, n, mode, attrs),
+                )
+            )
+
+    buf = reply_buf()
+    print(
+        "decode  read_attr {0:.0f}/s  offset table {1:.0f}/s".format(
+            rate(decode_read_attr, n, buf), rate(decode_table, n, buf)
+        )
+    )
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 50000)
@@ -0,0 +1,129 @@
+"""
+Runs a loopback STUNServer and measures Binding transactions per
+second two ways:
+
+    raw    -- a bare datagram endpoint keeping W requests in flight
+              (the server's own throughput.)
+    client -- W concurrent get_stun_reply() calls sharing one pipe
+              (the client stack's throughput.)
+    txm    -- W concurrent STUNTransactionManager.request() calls
+              (one dict lookup per reply instead of subscriptions.)
+
+python scripts/bench/stun_server.py [N] [W]
+"""
+
+import asyncio
+import sys
+import time
+from aionetiface.testing import FakeInterface
+from aionetiface.net.net_defs import IP4, UDP
+from aionetiface.net.pipe.pipe import Pipe
+from aionetiface.protocol.stun.stun_defs import RFC5389, STUNMsg
+from aionetiface.protocol.stun.stun_server import STUNServer
+from aionetiface.protocol.stun.stun_utils import get_stun_reply
+from aionetiface.protocol.stun.stun_transactions import STUNTransactionManager
+from aionetiface.net.asyncio.async_run import async_run
+
+
+class Flood(asyncio.DatagramProtocol):
+    def __init__(self, dest, n, window):
+        self.dest = dest
+        self.n = n
+        self.left = n
+        self.window = window
+        self.got = 0
+        self.done = asyncio.get_running_loop().create_future()
+        self.req = STUNMsg(mode=RFC5389).pack()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        for _ in range(self.window):
+            self.send()
+
+    def send(self):
+        if self.left:
+            self.left -= 1
+            self.transport.sendto(self.req, self.dest)
+
+    def datagram_received(self, data, addr):
+        self.got += 1
+        if self.got == self.n and not self.done.done():
+            self.done.set_result(None)
+
+        self.send()
+
+
+async def run_raw(dest, n, window):
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    transport, flood = await loop.create_datagram_endpoint(
+        lambda: Flood(dest, n, window), local_addr=("127.0.0.1", 0)
+    )
+    try:
+        await asyncio.wait_for(flood.done, 30)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        transport.close()
+
+    took = time.perf_counter() - start
+    print("raw     n={0}  window={1}  {2:.0f} txn/s".format(flood.got, window, flood.got / took))
+
+
+async def run_client(nic, dest, n, window):
+    route = await nic.route(IP4).bind()
+    pipe = await Pipe(UDP, dest, route).connect()
+    ok = 0
+    start = time.perf_counter()
+    try:
+        for _ in range(n // window):
+            replies = await asyncio.gather(
+                *[get_stun_reply(RFC5389, dest, dest, pipe) for _ in range(window)],
+                return_exceptions=True,
+            )
+            ok += sum(1 for reply in replies if hasattr(reply, "rtup"))
+    finally:
+        await pipe.close()
+
+    took = time.perf_counter() - start
+    print("client  n={0}  window={1}  {2:.0f} txn/s".format(ok, window, ok / took))
+
+
+async def run_txm(nic, dest, n, window):
+    route = await nic.route(IP4).bind()
+    txm = await STUNTransactionManager.open(route)
+    ok = 0
+    start = time.perf_counter()
+    try:
+        for _ in range(n // window):
+            replies = await asyncio.gather(
+                *[txm.request(dest, mode=RFC5389) for _ in range(window)],
+                return_exceptions=True,
+            )
+            ok += sum(1 for reply in replies if hasattr(reply, "rtup"))
+    finally:
+        await txm.close()
+
+    took = time.perf_counter() - start
+    print("txm     n={0}  window={1}  {2:.0f} txn/s".format(ok, window, ok / took))
+
+
+async def main(n, window):
+    nic = FakeInterface("lo", 0, IP4, "127.0.0.1", None)
+    async with STUNServer() as serv:
+        await serv.listen_stun(nic, ["127.0.0.1"], [0], protos=[UDP])
+        dest = serv.addrs[(0, 0)]
+        await run_raw(dest, n, window)
+        await run_client(nic, dest, n, window)
+        await run_txm(nic, dest, n, window)
+        print(serv.stats())
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    async_run(
+        main(
+            int(args[0]) if args else 20000,
+            int(args[1]) if len(args) > 1 else 64,
+        )
+    )
@@ -0,0 +1,109 @@
+"""
+Measures PipeClient.add_msg dispatch cost with 1, 100 and 10k live
+subscriptions. Subscriptions look like the ones STUN transactions
+make: re.escape(txn_id) from any address. One message in the batch
+matches one subscription; the rest of the work is finding it.
+
+Compares add_msg against the old add_msg with its linear regex walk.
+Below SUB_INDEX_MIN subscriptions add_msg walks them too.
+
+python scripts/bench/sub_dispatch.py
+"""
+
+import os
+import re
+import time
+from aionetiface.net.pipe.pipe_client import PipeClient
+from aionetiface.net.pipe.pipe_utils import client_tup_norm
+from aionetiface.net.net_defs import NET_CONF
+from aionetiface.net.pipe.pipe_stats import PipeCounters
+
+
+class BenchEvents:
+    route = None
+    counters = PipeCounters()
+
+
+def linear_add_msg(client, data, client_tup):
+    # The pre-index PipeClient.add_msg (minus the discard log).
+    if not len(client.subs):
+        return
+
+    client_tup = client_tup_norm(client_tup)
+
+    def do_add(q):
+        if q.full():
+            q.get_nowait()
+
+        assert isinstance(client_tup, tuple)
+        q.put_nowait([client_tup, data])
+
+    for sub, q, handler in client.subs.values():
+        b_msg_p, m_client_tup = sub[:2]
+        if m_client_tup is not None:
+            if not isinstance(m_client_tup[1], int):
+                raise TypeError("bad port")
+            if m_client_tup[1]:
+                if m_client_tup != client_tup:
+                    continue
+
+            if not m_client_tup[1]:
+                if m_client_tup[0] != client_tup[0]:
+                    continue
+
+        if b_msg_p:
+            if re.findall(b_msg_p, data) == []:
+                continue
+
+        if handler is not None:
+            continue
+
+        do_add(q)
+
+
+def drain(client):
+    for _, q, _ in client.subs.values():
+        while not q.empty():
+            q.get_nowait()
+
+
+def timed(f, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        f()
+
+    return (time.perf_counter() - start) / rounds
+
+
+def bench(n, rounds=2000):
+    client = PipeClient(BenchEvents(), conf=dict(NET_CONF))
+    txn_ids = [os.urandom(12) for _ in range(n)]
+    for txn_id in txn_ids:
+        client.subscribe((re.escape(txn_id), None))
+
+    # STUN binding response shaped message.
+    client_tup = ("127.0.0.1", 3478)
+    msg = b"\x01\x01\x00\x0c\x21\x12\xa4\x42" + txn_ids[-1] + os.urandom(12)
+
+    # Best of a few runs, each starting with empty queues.
+    linear_rounds = max(1, rounds // max(1, n // 100))
+    indexed = linear = None
+    for _ in range(5):
+        drain(client)
+        t = timed(lambda: client.add_msg(msg, client_tup), rounds)
+        indexed = t if indexed is None else min(indexed, t)
+
+        drain(client)
+        t = timed(lambda: linear_add_msg(client, msg, client_tup), linear_rounds)
+        linear = t if linear is None else min(linear, t)
+
+    print(
+        "subs={0:>6}  indexed={1:>9.2f} us/msg  linear={2:>11.2f} us/msg  x{3:.1f}".format(
+            n, indexed * 1e6, linear * 1e6, linear / indexed
+        )
+    )
+
+
+if __name__ == "__main__":
+    for n in (1, 4, 100, 10000):
+        bench(n)
@@ -16,6 +16,7 @@ class PolledDatagramTransport:
         self.sock = sock
         self.protocol = protocol
         self.closing = False
+        self.paused = False
         self.consecutive_errors = 0
 
         # Windows: a UDP sendto whose destination replies with an ICMP
@@ -42,11 +43,11 @@ class PolledDatagramTransport:
 
     def poll(self):
         """Drain all pending datagrams from the socket and deliver them to the protocol."""
-        if self.closing:
+        if self.closing or self.paused:
             return
 
         try:
-            while True:
+            while not self.paused:
                 data, addr = self.sock.recvfrom(65536)
                 self.consecutive_errors = 0
                 self.protocol.datagram_received(data, addr)
@@ -65,6 +66,18 @@ class PolledDatagramTransport:
             if self.consecutive_errors >= 10:
                 self.close()
 
+    def pause_reading(self):
+        """Stop delivering datagrams; the kernel buffers them meanwhile."""
+        self.paused = True
+
+    def resume_reading(self):
+        """Start delivering datagrams again on the next poll."""
+        self.paused = False
+
+    def is_reading(self):
+        """Return True if datagrams are being delivered to the protocol."""
+        return not self.paused and not self.closing
+
     def sendto(self, data, addr=None):
         """Send a datagram to addr (or the connected remote if addr is None)."""
         if self.closing:
@@ -1,8 +1,10 @@
 """Event-loop creation and management helpers."""
 import asyncio
+import collections
 import selectors
 import traceback
 from ...utility.utils import *
+from .loop_stats import LoopStats, TimedReadyQueue
 
 
 # Map: id(socket_object) -> Future
@@ -18,6 +20,9 @@ class ProxySelector:
         self.selector = selector_instance
         self.loop = loop
 
+        # LoopStats when instrumentation is on.
+        self.stats = None
+
         # Proxy standard methods. select is wrapped (not bound directly)
         # so we can catch WinError 10038 ("not a socket") that fires on
         # older Windows (XP) when an FD is closed externally between
@@ -47,6 +52,23 @@ class ProxySelector:
         retry the full select. Single pass, no nested select() calls
         so a healthy registered FD can't be misidentified as bad.
         """
+        stats = self.stats
+        if stats is None:
+            return self.safe_select(timeout)
+
+        # Everything since the last select() was callbacks.
+        started = stats.clock()
+        ready_queue = self.loop._ready
+        if isinstance(ready_queue, TimedReadyQueue):
+            ready_queue.finish(started)
+
+        stats.on_select_start(started)
+        events = self.safe_select(timeout)
+        stats.on_select_end(started, stats.clock(), len(events))
+        return events
+
+    def safe_select(self, timeout=None):
+        """select() with the stale-FD recovery described in select()."""
         try:
             return self.selector.select(timeout)
         except OSError as exc:
@@ -152,6 +174,29 @@ class CustomEventLoop(asyncio.SelectorEventLoop):
         # The base SelectorEventLoop expects a selector object here.
         super().__init__(proxy_selector)
 
+    def enable_stats(self, top_n=10):
+        """
+        Turn on loop instrumentation (see loop_stats.py) and return the
+        LoopStats object. Calling it again returns the same object.
+        """
+        proxy = self._selector
+        if proxy.stats is None:
+            proxy.stats = LoopStats(top_n=top_n, clock=self.time)
+            self._ready = TimedReadyQueue(self._ready, proxy.stats)
+
+        return proxy.stats
+
+    def disable_stats(self):
+        """Turn instrumentation off again."""
+        self._selector.stats = None
+        if isinstance(self._ready, TimedReadyQueue):
+            self._ready = collections.deque(self._ready)
+
+    @property
+    def stats(self):
+        """LoopStats if enable_stats() was called, else None."""
+        return self._selector.stats
+
     def close(self):
         """
         Override to drain CLOSE_FUTURES when the loop is closed.
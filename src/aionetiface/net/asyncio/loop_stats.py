@@ -0,0 +1,225 @@
+"""
+Opt-in event loop instrumentation for CustomEventLoop.
+
+Each pass of the loop is: select() for I/O (or the next timer),
+then run every callback that became ready. A loop that spends
+most of its time in the second half is CPU-bound -- timers fire
+late, UDP socket buffers fill up and replies get dropped.
+
+LoopStats records, per iteration:
+
+    - select() wait time
+    - number of ready fds select() returned
+    - time spent running callbacks until the next select()
+    - loop lag: how late each timer callback ran vs when it
+      was scheduled for
+    - the slowest individual callbacks (top N)
+
+Everything goes into fixed-bucket histograms so recording is a
+couple of comparisons and an increment. Per-callback timing works
+by swapping the loop's ready queue for a deque that notes the
+time whenever the loop pops the next handle: the gap between
+two pops is how long the previous callback ran.
+
+    stats = loop.enable_stats()
+    ...
+    print(stats.snapshot())
+"""
+
+import heapq
+import time
+from bisect import bisect_left
+from collections import deque
+from asyncio import TimerHandle
+
+__all__ = [
+    "DURATION_BOUNDS",
+    "FD_BOUNDS",
+    "Histogram",
+    "LoopStats",
+    "TimedReadyQueue",
+]
+
+# Seconds.
+DURATION_BOUNDS = (
+    0.0001,
+    0.0005,
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.5,
+    1.0,
+)
+
+# Ready fds per select().
+FD_BOUNDS = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class Histogram:
+    """Counts values into fixed buckets: counts[i] holds values <= bounds[i]."""
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, value):
+        """Record one value."""
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def mean(self):
+        """Return the average value or 0."""
+        return self.total / self.count if self.count else 0
+
+    def percentile(self, pct):
+        """Return the upper bound of the bucket holding the pct'th percentile."""
+        if not self.count:
+            return 0
+
+        want = self.count * pct / 100.0
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= want:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+
+        return self.max
+
+    def reset(self):
+        """Zero every bucket."""
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def snapshot(self):
+        """Return the histogram as a plain dict."""
+        buckets = list(zip(self.bounds, self.counts))
+        buckets.append(("inf", self.counts[-1]))
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.mean(),
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+            "buckets": buckets,
+        }
+
+
+class LoopStats:
+    """Histograms and slowest callbacks for one event loop."""
+
+    def __init__(self, top_n=10, clock=time.monotonic):
+        self.clock = clock
+        self.top_n = top_n
+        self.select_wait = Histogram(DURATION_BOUNDS)
+        self.ready_fds = Histogram(FD_BOUNDS)
+        self.callback_time = Histogram(DURATION_BOUNDS)
+        self.loop_lag = Histogram(DURATION_BOUNDS)
+        self.iterations = 0
+        self.started = clock()
+
+        # Min-heap of (duration, seq, description) so the smallest
+        # of the top N is the one to replace.
+        self.slowest = []
+        self.seq = 0
+
+        # End of the last select() -- callbacks run from here until
+        # the next select() starts.
+        self.select_end = None
+
+    def on_select_start(self, now):
+        """Close out the callback phase of the previous iteration."""
+        if self.select_end is not None:
+            self.callback_time.add(now - self.select_end)
+
+    def on_select_end(self, started, now, ready):
+        """Record one select() call."""
+        self.iterations += 1
+        self.select_wait.add(now - started)
+        self.ready_fds.add(ready)
+        self.select_end = now
+
+    def on_callback(self, handle, duration):
+        """Record one callback's run time."""
+        slowest = self.slowest
+        if len(slowest) < self.top_n:
+            self.seq += 1
+            heapq.heappush(slowest, (duration, self.seq, repr(handle)))
+        elif duration > slowest[0][0]:
+            self.seq += 1
+            heapq.heapreplace(slowest, (duration, self.seq, repr(handle)))
+
+    def busy_ratio(self):
+        """Fraction of loop time spent running callbacks rather than waiting."""
+        busy = self.callback_time.total
+        idle = self.select_wait.total
+        if not busy + idle:
+            return 0
+
+        return busy / (busy + idle)
+
+    def reset(self):
+        """Start a new measuring window."""
+        for hist in (self.select_wait, self.ready_fds, self.callback_time, self.loop_lag):
+            hist.reset()
+
+        self.iterations = 0
+        self.slowest = []
+        self.started = self.clock()
+
+    def snapshot(self):
+        """Return every stat as a plain dict."""
+        return {
+            "uptime": self.clock() - self.started,
+            "iterations": self.iterations,
+            "busy_ratio": self.busy_ratio(),
+            "select_wait": self.select_wait.snapshot(),
+            "ready_fds": self.ready_fds.snapshot(),
+            "callback_time": self.callback_time.snapshot(),
+            "loop_lag": self.loop_lag.snapshot(),
+            "slowest": [
+                {"duration": duration, "callback": desc}
+                for duration, _, desc in sorted(self.slowest, reverse=True)
+            ],
+        }
+
+
+class TimedReadyQueue(deque):
+    """Stand-in for the loop's _ready deque that times each callback."""
+
+    def __init__(self, items, stats):
+        super().__init__(items)
+        self.stats = stats
+        self.cur = None
+        self.cur_start = 0
+
+    def popleft(self):
+        handle = super().popleft()
+        now = self.stats.clock()
+        if self.cur is not None:
+            self.stats.on_callback(self.cur, now - self.cur_start)
+
+        self.cur = handle
+        self.cur_start = now
+
+        # Timer that came due: how late is it running?
+        if isinstance(handle, TimerHandle):
+            self.stats.loop_lag.add(max(0, now - handle._when))
+
+        return handle
+
+    def finish(self, now):
+        """The loop went back to select(): the last callback is done."""
+        if self.cur is not None:
+            self.stats.on_callback(self.cur, now - self.cur_start)
+            self.cur = None
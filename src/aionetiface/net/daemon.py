@@ -75,7 +75,7 @@ async def is_serv_listening(proto, listen_route):
 
 
 def get_serv_lock(
-    af, proto, serv_port, serv_ip, install_path
+    af, proto, serv_port, serv_ip, install_path, shard=None
 ):
     """
     Return a filesystem-based inter-process lock for the given server endpoint.
@@ -85,6 +85,10 @@ def get_serv_lock(
     uncleanly the lock file may be stale; the caller should treat a failed
     acquire as a zombie-process condition.
 
+    Sharded daemons (see daemon_shards.py) share a port on purpose so each
+    shard gets its own lock file: a leftover worker with the same shard
+    number is still caught.
+
     Returns None if the lock library is unavailable.
     """
     # Make install dir if needed.
@@ -103,17 +107,19 @@ def get_serv_lock(
         serv_ip = "0"
         log("Serv ip in get serv lock is len 0")
 
+    shard_str = "" if shard is None else fstr("_s{0}", (shard,))
     pidfile_path = os.path.realpath(
         os.path.join(
             install_path,
             # TODO: use hashes here instead..
             fstr(
-                "{0}_{1}_{2}_{3}_pid.txt",
+                "{0}_{1}_{2}_{3}{4}_pid.txt",
                 (
                     af,
                     proto,
                     serv_port,
                     serv_ip,
+                    shard_str,
                 ),
             ),
         )
@@ -162,6 +168,9 @@ class Daemon:
             IP6: {TCP: {}, UDP: {}},
         }
 
+        # Worker number when run by DaemonShards.
+        self.shard = None
+
     # On message received (placeholder.)
     async def msg_cb(self, msg, client_tup, pipe):
         """Default message handler that echoes received data back to the sender."""
@@ -193,7 +202,9 @@ class Daemon:
         ip, port = route.bind_tup()[:2]
         if bind_port:
             # Detect zombie servers.
-            lock = get_serv_lock(route.af, proto, port, ip, self.install_path)
+            lock = get_serv_lock(
+                route.af, proto, port, ip, self.install_path, self.shard
+            )
             if lock is not None:
                 if not lock.acquire(blocking=False):
                     error = fstr(
@@ -206,8 +217,11 @@ class Daemon:
                     raise OSError(error)
 
             # A simple TCP con is made to TCP servers to check if it's
-            # still listening before binding.
-            is_listening = await async_wrap_errors(is_serv_listening(proto, route))
+            # still listening before binding. Later shards share the
+            # port with shard 0 which already did this check.
+            is_listening = False
+            if not self.shard:
+                is_listening = await async_wrap_errors(is_serv_listening(proto, route))
 
             # If it is then raise exception.
             if is_listening:
@@ -381,6 +395,31 @@ class Daemon:
         # the handler, causing a silent miss.
         return asyncio.create_task(for_server_in_daemon(self, func))
 
+    def stats(self):
+        """Return counts of servers and TCP connections across this daemon."""
+        out = {
+            "servers": 0,
+            "tcp_clients": 0,
+            "rejected": 0,
+            "evicted": 0,
+            "reaped": 0,
+        }
+        for af in VALID_AFS:
+            for proto in [TCP, UDP]:
+                for port in self.servers[af][proto]:
+                    for server in self.servers[af][proto][port].values():
+                        out["servers"] += 1
+                        if proto != TCP or server.pipe_events is None:
+                            continue
+
+                        conns = server.tcp_clients
+                        out["tcp_clients"] += len(conns)
+                        out["rejected"] += conns.rejected
+                        out["evicted"] += conns.evicted
+                        out["reaped"] += conns.reaped
+
+        return out
+
     async def close(self):
         """Close all server pipes managed by this daemon."""
         async def func(server):
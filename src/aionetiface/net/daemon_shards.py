@@ -0,0 +1,249 @@
+"""
+Runs a Daemon in several worker processes that share its ports.
+
+A Daemon has one event loop so it can only ever use one core.
+DaemonShards spawns N workers, each with its own aionetiface
+event loop and its own instance of the Daemon class. Every
+worker runs the same setup coroutine (listen_all, add_listener,
+etc.) and because Daemon sockets are created with SO_REUSEADDR
+and SO_REUSEPORT the kernel spreads new TCP connections and UDP
+flows across the workers. This needs Linux: other platforms
+either don't have SO_REUSEPORT or don't load balance with it.
+
+Shard 0 is started first and does the usual zombie / listen
+conflict checks. The rest start once it's up and skip the
+listen check (they'd only find shard 0) but still take their
+own per-shard lock file.
+
+daemon_cls and setup are sent to the workers by reference so
+they must be importable module-level names. Ports must be given
+explicitly -- with port 0 every worker would get its own port.
+
+    async def setup(daemon):
+        await daemon.listen_all(TCP, 8000, await Interface())
+
+    shards = await DaemonShards(EchoServer, setup, workers=4).start()
+    print(await shards.stats())
+    await shards.close()
+"""
+
+import asyncio
+import multiprocessing
+import os
+import socket
+import sys
+import time
+from ..utility.utils import fstr, log, log_exception, get_running_loop
+from .asyncio.async_run import async_run
+
+__all__ = [
+    "SHARDING_SUPPORTED",
+    "DaemonShards",
+]
+
+SHARDING_SUPPORTED = sys.platform.startswith("linux") and hasattr(socket, "SO_REUSEPORT")
+
+# Messages on the parent <-> worker pipe.
+SHARD_READY = "ready"
+SHARD_ERROR = "error"
+SHARD_STATS = "stats"
+SHARD_STOP = "stop"
+
+
+def shard_main(shard, daemon_cls, setup, conf, conn):
+    """Worker process entry point."""
+    async_run(shard_serve(shard, daemon_cls, setup, conf, conn))
+
+
+async def shard_serve(shard, daemon_cls, setup, conf, conn):
+    """Run one shard's Daemon until the parent says stop or goes away."""
+    daemon = daemon_cls()
+    daemon.shard = shard
+    if conf is not None:
+        daemon.conf = conf
+
+    # Sharing the port needs SO_REUSEPORT.
+    daemon.conf = dict(daemon.conf, reuse_addr=True)
+    try:
+        await setup(daemon)
+    except Exception as exc:
+        log_exception()
+        conn.send((SHARD_ERROR, shard, repr(exc)))
+        await daemon.close()
+        return
+
+    conn.send((SHARD_READY, shard, os.getpid()))
+
+    loop = get_running_loop()
+    stop = asyncio.Event()
+
+    def on_cmd():
+        try:
+            cmd = conn.recv()
+        except (EOFError, OSError):
+            cmd = SHARD_STOP
+
+        if cmd == SHARD_STATS:
+            conn.send((SHARD_STATS, shard, daemon.stats()))
+        else:
+            stop.set()
+
+    loop.add_reader(conn.fileno(), on_cmd)
+    try:
+        await stop.wait()
+    finally:
+        loop.remove_reader(conn.fileno())
+        await daemon.close()
+        conn.close()
+
+
+async def wait_readable(fd, timeout):
+    """Wait until fd is readable. Returns False on timeout."""
+    loop = get_running_loop()
+    ready = loop.create_future()
+
+    def on_readable():
+        if not ready.done():
+            ready.set_result(True)
+
+    loop.add_reader(fd, on_readable)
+    try:
+        return await asyncio.wait_for(ready, timeout)
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        loop.remove_reader(fd)
+
+
+async def shard_recv(conn, timeout):
+    """Wait for the next message from a worker or return None on timeout."""
+    try:
+        if not conn.poll() and not await wait_readable(conn.fileno(), timeout):
+            return None
+
+        return conn.recv()
+    except (EOFError, OSError):
+        return None
+
+
+class DaemonShards:
+    """Spawns and supervises worker processes that each run a Daemon."""
+
+    def __init__(
+        self, daemon_cls, setup, workers=None, conf=None, ready_timeout=10
+    ):
+        if not SHARDING_SUPPORTED:
+            raise NotImplementedError("Daemon sharding needs Linux SO_REUSEPORT.")
+
+        self.daemon_cls = daemon_cls
+        self.setup = setup
+        self.workers = workers or os.cpu_count() or 1
+        self.conf = conf
+        self.ready_timeout = ready_timeout
+
+        # Spawn, not fork: see aionetiface_setup_event_loop().
+        self.ctx = multiprocessing.get_context("spawn")
+
+        # [shard] = (process, parent end of pipe).
+        self.shards = {}
+        self.pids = {}
+
+    async def start(self):
+        """Start shard 0, then the rest. Raises OSError if any fail to come up."""
+        await self.spawn([0])
+        if self.workers > 1:
+            await self.spawn(range(1, self.workers))
+
+        return self
+
+    async def spawn(self, shard_ids):
+        """Start the given shards and wait for each to report in."""
+        for shard in shard_ids:
+            parent_conn, child_conn = self.ctx.Pipe()
+            proc = self.ctx.Process(
+                target=shard_main,
+                args=(shard, self.daemon_cls, self.setup, self.conf, child_conn),
+                daemon=True,
+            )
+            proc.start()
+            child_conn.close()
+            self.shards[shard] = (proc, parent_conn)
+
+        for shard in shard_ids:
+            proc, conn = self.shards[shard]
+            msg = await shard_recv(conn, self.ready_timeout)
+            if msg is None or msg[0] != SHARD_READY:
+                reason = "timeout" if msg is None else msg[2]
+                await self.close()
+                raise OSError(fstr("Daemon shard {0} failed: {1}", (shard, reason)))
+
+            self.pids[shard] = msg[2]
+            log(fstr("Daemon shard {0} up pid={1}", (shard, msg[2])))
+
+    def health(self):
+        """Return {shard: True if its process is alive}."""
+        return {shard: proc.is_alive() for shard, (proc, _) in self.shards.items()}
+
+    async def stats(self, timeout=2):
+        """Ask every live shard for Daemon.stats() and add them up."""
+        alive = self.health()
+        for shard, (_, conn) in self.shards.items():
+            if alive[shard]:
+                try:
+                    conn.send(SHARD_STATS)
+                except OSError:
+                    alive[shard] = False
+
+        per_shard = {}
+        totals = {}
+        for shard, (_, conn) in self.shards.items():
+            msg = None
+            if alive[shard]:
+                msg = await shard_recv(conn, timeout)
+
+            if msg is None or msg[0] != SHARD_STATS:
+                per_shard[shard] = None
+                continue
+
+            per_shard[shard] = msg[2]
+            for key, value in msg[2].items():
+                totals[key] = totals.get(key, 0) + value
+
+        return {
+            "workers": len(self.shards),
+            "alive": sum(1 for is_alive in alive.values() if is_alive),
+            "shards": per_shard,
+            "totals": totals,
+        }
+
+    async def close(self, timeout=5):
+        """Tell every shard to stop and wait for them, killing stragglers."""
+        for proc, conn in self.shards.values():
+            try:
+                conn.send(SHARD_STOP)
+            except OSError:
+                pass
+
+        deadline = time.monotonic() + timeout
+        for proc, conn in self.shards.values():
+            # The sentinel becomes readable when the process exits.
+            remaining = deadline - time.monotonic()
+            if proc.is_alive() and remaining > 0:
+                await wait_readable(proc.sentinel, remaining)
+
+            if proc.is_alive():
+                log(fstr("Terminating daemon shard pid={0}", (proc.pid,)))
+                proc.terminate()
+                proc.join(1)
+
+            conn.close()
+
+        self.shards = {}
+        self.pids = {}
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *_):
+        await self.close()
+        return False
@@ -219,14 +219,69 @@ NET_CONF = {
     "con_timeout": 2,
     # No of messages to receive per subscription.
     "max_qsize": 0,
+    # Bytes of messages to hold per subscription. 0 = no limit.
+    "max_qbytes": 0,
+    # On a full subscription queue pause reading from the socket
+    # instead of evicting the oldest message.
+    "sub_backpressure": False,
+    # Max TCP connections waiting for accept() before the server
+    # stops accepting. 0 = no limit.
+    "accept_backlog": 0,
+    # Max open TCP connections per server. 0 = no limit.
+    "max_connections": 0,
+    # When max_connections is hit: "reject" the new connection or
+    # "evict" the least recently active one.
+    "conn_overflow": "reject",
+    # Close server TCP connections that receive nothing for this
+    # many seconds. 0 = never.
+    "idle_timeout": 0,
     # Require unique messages or not.
     "enable_msg_ids": 0,
-    # Number of message IDs to keep around.
+    # Message IDs to keep around per peer IP.
     "max_msg_ids": 1000,
+    # Peers to keep message IDs for (least recently seen are dropped.)
+    "max_msg_id_peers": 256,
+    # Seconds a message ID is remembered for (at least half of this.)
+    "msg_id_window": 30,
+    # RUDP: hold ACKs for rudp_ack_delay seconds and send them as one
+    # SACK per peer. Both ends must enable it.
+    "rudp_sack": False,
+    "rudp_ack_delay": 0.005,
+    # RUDP: accept ordered streams (see pipe_rudp.py) from peers.
+    "rudp_stream": False,
+    # Stream segment payload size, segments in flight and tries per segment.
+    "rudp_mss": 1200,
+    "rudp_window": 64,
+    "rudp_stream_tries": 8,
+    # Unsent stream bytes before drain() waits.
+    "rudp_stream_buf": 2**18,
+    # Open UDP pipes on pre-bound sockets (see pipe_sock_pool.py.)
+    "sock_pool": False,
+    # Idle sockets kept per bind address.
+    "sock_pool_size": 8,
+    # Reuse idle TCP pipes for request/response callers that opt in
+    # (see pipe_pool.py.)
+    "pipe_pool": False,
+    # Idle pipes kept per (bind address, destination, TLS) and the
+    # seconds one may sit idle before it's closed.
+    "pipe_pool_max": 4,
+    "pipe_pool_idle": 30,
+    # STUN transactions (see stun_transactions.py): initial RTO in
+    # seconds, requests sent (Rc) and the RTO multiple to wait after
+    # the last one (Rm.) RFC 5389 section 7.2.1.
+    "stun_rto": 0.5,
+    "stun_rc": 7,
+    "stun_rm": 16,
     # Reuse address tuple for bind() socket call.
     "reuse_addr": False,
     # Setup socket as a broadcast socket.
     "broadcast": False,
+    # Transport write buffer marks: pause_writing() above high, resume
+    # (and wake drain()) at or below low. None = asyncio's defaults.
+    "write_high_water": 2**16,
+    "write_low_water": 2**14,
+    # Make send() wait for drain() while the write buffer is over high.
+    "send_drain": False,
     # Buf size for asyncio.StreamReader.
     "reader_limit": 2**16,
     # Return the sock instead of the base proto.
@@ -240,6 +295,9 @@ NET_CONF = {
     "send_retry": 2,
     # Ref to an event loop.
     "loop": None,
+    # Linux: drain up to N datagrams per read event for UDP pipes.
+    # 0 = one datagram per event (stock asyncio transport.)
+    "udp_batch": 0,
 }
 
 
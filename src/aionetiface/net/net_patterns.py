@@ -31,11 +31,17 @@ async def proto_send(pipe, buf):
 
 
 async def send_recv_loop(dest, pipe, buf, sub=SUB_ALL):
-    """Send buf to dest and wait for a matching reply, retrying up to 3 times for UDP."""
+    """
+    Send buf to dest and wait for a matching reply, retrying up to 3
+    times for UDP. buf can be a list of buffers to send with sendv().
+    """
     n = 1 if pipe.sock.type == TCP else 3
     for _ in range(0, n):
         try:
-            await pipe.send(buf, dest)
+            if isinstance(buf, list):
+                pipe.sendv(buf, dest)
+            else:
+                await pipe.send(buf, dest)
             return await pipe.recv(sub=sub, timeout=pipe.conf["recv_timeout"])
         except asyncio.CancelledError:
             raise
@@ -39,11 +39,14 @@ from ..net_defs import (
     IP6,
     VALID_LOOPBACKS,
     VALID_ANY_ADDR,
+    NIC_BIND,
+    LOOPBACK_BIND,
 )
 from .pipe_events import PipeEvents
 from .pipe_client import PipeClient
 from .pipe_tcp_events import TCPClientProtocol
 from .pipe_utils import norm_client_tup, tup_to_sub
+from .pipe_sock_pool import get_sock_pool
 from ..address import Address
 from ..ip_range import IPRange, IPR, ipr_norm
 from ..asyncio.asyncio_patches import create_datagram_endpoint
@@ -57,6 +60,7 @@ from .pipe_defs import (
     aionetiface_fds,
 )
 from ..asyncio.create_udp_fallback import PolledDatagramTransport, UdpPoller
+from ..asyncio.batch_udp import BATCH_UDP_SUPPORTED, create_batch_datagram_endpoint
 from ..asyncio.event_loop import CustomEventLoop
 
 
@@ -71,6 +75,7 @@ class Pipe:
         route=None,
         sock=None,
         conf=None,
+        pooled=None,
     ):
         self.set_nic_and_route(route)
         self.proto = proto
@@ -79,6 +84,9 @@ class Pipe:
         self.pipe_events = None
         self.conf = conf if conf is not None else NET_CONF
         self.owns_socket = sock is None
+
+        # Take UDP sockets from the route's SockPool (default: sock_pool.)
+        self.pooled = self.conf.get("sock_pool", False) if pooled is None else pooled
         if sock is not None:
             log("Warning: externally provided socket will not be closed by Pipe")
 
@@ -124,6 +132,12 @@ class Pipe:
         if self.pipe_events is not None:
             return await self.pipe_events.make_awaitable()
 
+    def __aiter__(self):
+        if self.pipe_events is None:
+            raise TypeError("Pipe is not connected.")
+
+        return self.pipe_events.__aiter__()
+
     # Pretend to be a pipe_client.
     def __getattr__(self, name):
         """
@@ -285,6 +299,9 @@ class Pipe:
         Adds socket to global aionetiface_fds set.
         Sets route.bind_port to the bound local port.
         """
+        if self.sock is None and self.pooled and self.proto in (UDP, RUDP):
+            self.sock = self.take_pooled_sock()
+
         if self.sock is None:
             self.sock = await socket_factory(
                 route=self.route,
@@ -305,6 +322,18 @@ class Pipe:
         # Resolve the port that the route ended up on.
         self.route.bind_port = self.sock.getsockname()[1]
 
+    def take_pooled_sock(self):
+        """Return a bound socket from the route's SockPool or None."""
+        bind_flag = NIC_BIND
+        if self.dest is not None and self.dest.is_loopback:
+            bind_flag = LOOPBACK_BIND
+
+        pool = get_sock_pool(self.route, self.conf, bind_flag)
+        if pool is None:
+            return None
+
+        return pool.take()
+
     async def tcp_client_connect_if_needed(self):
         """
         Connects TCP socket to remote dest if this is a TCP client.
@@ -380,13 +409,23 @@ class Pipe:
             else:
                 # Use standard asyncio method for creating UDP transport.
                 # Note: Use patched version of create_datagram_endpoint.
-                if isinstance(
+                is_selector = isinstance(
                     loop,
                     (
                         asyncio.SelectorEventLoop,
                         CustomEventLoop,
                     ),
-                ):
+                )
+
+                # Linux: drain many datagrams per read event.
+                if is_selector and BATCH_UDP_SUPPORTED and self.conf.get("udp_batch"):
+                    transport, _ = await create_batch_datagram_endpoint(
+                        loop=loop,
+                        protocol_factory=lambda: self.pipe_events,
+                        sock=self.sock,
+                        batch_size=self.conf["udp_batch"],
+                    )
+                elif is_selector:
                     transport, _ = await create_datagram_endpoint(
                         loop=loop,
                         protocol_factory=lambda: self.pipe_events,
@@ -406,15 +445,17 @@ class Pipe:
             # Use ensure_future so we can cancel the wait without cancelling
             # the underlying Event (which stays set for later callers), but
             # we DO cancel the waiting coroutine itself to free the task.
-            fut = asyncio.ensure_future(self.pipe_events.stream_ready.wait())
-            try:
-                await asyncio.wait_for(asyncio.shield(fut), timeout=2)
-            except asyncio.TimeoutError:
-                fut.cancel()
+            # Usually connection_made already ran: skip the wait tasks.
+            if not self.pipe_events.stream_ready.is_set():
+                fut = asyncio.ensure_future(self.pipe_events.stream_ready.wait())
                 try:
-                    await fut
-                except asyncio.CancelledError:
-                    pass
+                    await asyncio.wait_for(asyncio.shield(fut), timeout=2)
+                except asyncio.TimeoutError:
+                    fut.cancel()
+                    try:
+                        await fut
+                    except asyncio.CancelledError:
+                        pass
 
             # Record type of transport in pipe events.
             self.pipe_events.stream.set_handle(transport, client_tup=None)
@@ -0,0 +1,124 @@
+"""
+Accept queue for TCP server pipes.
+
+New connections go into a FIFO (or straight to a waiting
+accept() if there is one) so accept() is O(1) regardless of
+how many connections came before. With a backlog limit set
+the queue calls on_full() when it reaches the limit -- the
+server stops taking connections off the listen socket and the
+kernel's own listen backlog holds the rest -- and on_space()
+once it has drained to half the limit.
+
+Connections that close before they're accepted are skipped.
+"""
+
+import asyncio
+from collections import deque
+
+__all__ = [
+    "AcceptQueue",
+]
+
+
+def client_closed(client):
+    """Return True if a queued client connection has already gone away."""
+    return client.on_close.is_set()
+
+
+class AcceptQueue:
+    """Bounded FIFO of accepted TCP client PipeEvents with awaitable get()."""
+
+    def __init__(self, backlog=0, on_full=None, on_space=None):
+        # 0 = unbounded.
+        self.backlog = backlog
+        self.on_full = on_full
+        self.on_space = on_space
+
+        # Accepted but not yet returned by get().
+        self.items = deque()
+        self.queued = set()
+
+        # Futures from get() calls waiting for a connection.
+        self.waiters = deque()
+
+        # Queued clients that have since disconnected.
+        self.dead = 0
+        self.paused = False
+        self.closed = False
+
+    def __len__(self):
+        return len(self.items)
+
+    def put(self, client):
+        """Hand client to the oldest waiter or queue it."""
+        if self.closed:
+            return
+
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(client)
+                return
+
+        self.items.append(client)
+        self.queued.add(client)
+        if self.backlog and not self.paused and len(self.items) >= self.backlog:
+            self.paused = True
+            if self.on_full is not None:
+                self.on_full()
+
+    def get_nowait(self):
+        """Return the next live queued client or None."""
+        items = self.items
+        while items:
+            client = items.popleft()
+            self.queued.discard(client)
+            if client_closed(client):
+                self.dead = max(0, self.dead - 1)
+                continue
+
+            self.check_space()
+            return client
+
+        self.check_space()
+        return None
+
+    async def get(self):
+        """Wait for the next client. Returns None once the queue is closed."""
+        client = self.get_nowait()
+        if client is not None or self.closed:
+            return client
+
+        waiter = asyncio.get_event_loop().create_future()
+        self.waiters.append(waiter)
+        return await waiter
+
+    def note_closed(self, client):
+        """A client disconnected: if still queued, compact once most of the queue is dead."""
+        # Clients already handed out by get() aren't ours to count.
+        if client not in self.queued:
+            return
+
+        self.dead += 1
+        if self.dead * 2 > len(self.items):
+            self.items = deque(c for c in self.items if not client_closed(c))
+            self.queued = set(self.items)
+            self.dead = 0
+            self.check_space()
+
+    def check_space(self):
+        """Undo on_full() once the queue has drained to half the backlog."""
+        if self.paused and len(self.items) <= self.backlog // 2:
+            self.paused = False
+            if self.on_space is not None:
+                self.on_space()
+
+    def close(self):
+        """Stop queueing and release every waiter with None."""
+        self.closed = True
+        self.items.clear()
+        self.queued.clear()
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
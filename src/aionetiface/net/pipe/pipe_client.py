@@ -1,11 +1,14 @@
 """Outbound pipe (TCP/UDP client) implementation."""
 import asyncio
-import re
-from ...utility.utils import fstr, log, log_exception, run_handler
+from ...utility.utils import fstr, log, log_debug, log_exception, run_handler, get_running_loop
 from ...protocol.ack_udp import ACKUDP
 from ..net_defs import NET_CONF, SUB_ALL, UDP, RUDP, TCP, IP6
 from .pipe_defs import TYPE_UDP_CON
 from .pipe_utils import client_tup_norm, norm_client_tup
+from .pipe_subs import SubIndex, SubTable, SubQueue, sub_matches, SUB_INDEX_MIN
+
+# Max normalised destinations remembered per pipe.
+DEST_CACHE_MAX = 1024
 
 
 """
@@ -30,8 +33,13 @@ class PipeClient(ACKUDP):
 
         # [Bool(msg)] = Queue.
         # Lets convert this to [b"msg pattern", b"host pattern"] = [Queue]
+        # Indexed by address + message pattern for dispatch.
+        self.sub_index = SubIndex()
         self.subs = {}
 
+        # Sub queues over budget that paused reading (backpressure.)
+        self.pressured = set()
+
         # Instance of the base proto class.
         self.pipe_events = pipe_events
         self.route = self.pipe_events.route
@@ -39,12 +47,30 @@ class PipeClient(ACKUDP):
         # Used for doing send calls.
         self.handle = {}
 
+        # [(ip, port)] = sockaddr to use with sendto().
+        self.dest_cache = {}
+
+        # Sends coalesced until the end of the loop iteration.
+        self.send_queue = []
+        self.flush_scheduled = False
+
     """
     (1) UDP is multiplexed and doesn't need a destination bound.
     (2) TCP cons have a dest set.
     (3) TCP and UDP servers won't have a dest.
     """
 
+    @property
+    def subs(self):
+        """[offset] = [sub, Queue, handler] for every active subscription."""
+        return self._subs
+
+    @subs.setter
+    def subs(self, subs):
+        # Some callers reset subs wholesale (e.g. subs = {}).
+        # Edits to the table keep the dispatch index in step.
+        self._subs = SubTable(self.sub_index, subs)
+
     def set_dest_tup(self, dest_tup):
         """Normalise and store the remote destination tuple for outbound sends."""
         dest_tup = client_tup_norm(dest_tup)
@@ -99,7 +125,12 @@ class PipeClient(ACKUDP):
 
         offset = self.hash_sub(sub)
         if offset not in self.subs:
-            self.subs[offset] = [sub, asyncio.Queue(self.conf["max_qsize"]), handler]
+            q = SubQueue(
+                max_items=self.conf["max_qsize"],
+                max_bytes=self.conf.get("max_qbytes", 0),
+                on_drain=self.on_sub_drain,
+            )
+            self.subs[offset] = [sub, q, handler]
 
         return offset
 
@@ -108,69 +139,91 @@ class PipeClient(ACKUDP):
         """Remove the subscription matching sub and return self."""
         offset = self.hash_sub(sub)
         if offset in self.subs:
+            q = self.subs[offset][1]
             del self.subs[offset]
 
+            # A removed queue can't hold reading paused.
+            if q in self.pressured:
+                self.pressured.discard(q)
+                if not self.pressured:
+                    self.pipe_events.resume_reading("subs")
+
         return self
 
+    def on_sub_drain(self, q):
+        """Resume reading once every over-budget queue has drained to low water."""
+        if q not in self.pressured:
+            return
+
+        if not q.low_water():
+            return
+
+        self.pressured.discard(q)
+        if not self.pressured:
+            self.pipe_events.resume_reading("subs")
+
     # Adds a message to the first valid bucket.
     """
-    TODO: If the queue is full what should the default
-    actions be? Should the program await the queue
-    being empty? Should it discard data? Maybe on limit - 1
-    call https://docs.python.org/3/library/asyncio-eventloop.html#asyncio.loop.remove_reader and on queue empty add it back.
+    When a queue is over its item or byte budget the default is
+    to discard the oldest messages. With conf["sub_backpressure"]
+    the message is kept and reading on the socket is paused until
+    the queue drains. For TCP the kernel buffer fills and flow
+    control slows the sender. For UDP the kernel buffers what
+    it can.
     """
 
+    def queue_msg(self, q, data, client_tup):
+        """Enqueue data into q, evicting old items or pausing reads if it's over budget."""
+        backpressure = self.conf.get("sub_backpressure")
+
+        # Make room by discarding the oldest messages.
+        if not backpressure:
+            if q.max_items or q.max_bytes:
+                counters = self.pipe_events.counters
+                while not q.empty() and q.would_overflow(len(data)):
+                    q.get_nowait()
+                    q.evicted += 1
+                    counters.evicted += 1
+
+        # Put an item on the queue.
+        assert isinstance(client_tup, tuple)
+        q.put_nowait([client_tup, data])
+
+        # Stop reading until the queue drains.
+        if backpressure and q.over_budget():
+            self.pressured.add(q)
+            self.pipe_events.pause_reading("subs")
+
     def add_msg(self, data, client_tup):
         """Route an incoming message to any matching subscription queues or handlers."""
         # No subscriptions.
-        if not len(self.subs):
+        subs = self._subs
+        if not subs:
             return
 
         # Norm compressed IPv6 addresses.
         client_tup = client_tup_norm(client_tup)
 
-        # Add message to queue and raise an event.
-        def do_add(q):
-            """Enqueue data and client_tup into q, evicting the oldest item if the queue is full."""
-            # Check queue isn't full.
-            if q.full():
-                # TODO: Remove sock from event select.
-                # To give time for queue to be processed.
-                q.get_nowait()
-
-            # Put an item on the queue.
-            assert isinstance(client_tup, tuple)
-            q.put_nowait([client_tup, data])
+        # A few subs: checking each directly beats the index.
+        # Otherwise only visit subs whose address and pattern match.
+        if len(subs) < SUB_INDEX_MIN:
+            offsets = [
+                offset
+                for offset, entry in subs.items()
+                if sub_matches(entry[0], data, client_tup)
+            ]
+        else:
+            offsets = self.sub_index.match(data, client_tup)
 
-        # Apply bool filters to message.
         msg_added = False
-        for sub, q, handler in self.subs.values():
-            # Msg pattern, address pattern.
-            b_msg_p, m_client_tup = sub[:2]
-
-            # Check client_addr matches their host pattern.
-            if m_client_tup is not None:
-                # Also check the source port.
-                if not isinstance(m_client_tup[1], int):
-                    raise TypeError(
-                        "subscription pattern port must be int, got {0}".format(
-                            type(m_client_tup[1]).__name__,
-                        )
-                    )
-                if m_client_tup[1]:
-                    if m_client_tup != client_tup:
-                        continue
-
-                # Ignore source port but check IPs.
-                if not m_client_tup[1]:
-                    if m_client_tup[0] != client_tup[0]:
-                        continue
+        for offset in offsets:
+            # A handler may have unsubscribed it already.
+            entry = subs.get(offset)
+            if entry is None:
+                continue
 
-            # Check data matches their message pattern.
-            if b_msg_p:
-                msg_matches = re.findall(b_msg_p, data)
-                if msg_matches == []:
-                    continue
+            _, q, handler = entry
+            msg_added = True
 
             # Execute message using handle instead of adding to queue.
             if handler is not None:
@@ -179,19 +232,11 @@ class PipeClient(ACKUDP):
                 continue
 
             # Add message to queue.
-            msg_added = True
-            do_add(q)
+            self.queue_msg(q, data, client_tup)
 
         if not msg_added:
-            log(
-                fstr(
-                    "Discarded {0} = {1}",
-                    (
-                        client_tup,
-                        data,
-                    ),
-                )
-            )
+            self.pipe_events.counters.unmatched += 1
+            log_debug("Discarded {0} = {1}", client_tup, data)
 
     # Async wait for a message that matches a pattern in a queue.
     async def recv(
@@ -242,14 +287,149 @@ class PipeClient(ACKUDP):
         """Receive and concatenate messages until at least n bytes have been accumulated."""
         if sub is None:
             sub = SUB_ALL
-        buf = b""
+        buf = bytearray()
         while len(buf) < n:
             out = await self.recv(sub)
             if out is None:
                 break
             buf += out
 
-        return buf
+        return bytes(buf)
+
+    def udp_dest(self, dest_tup):
+        """Return the normalised sockaddr to pass to sendto() for dest_tup."""
+        key = (dest_tup[0], dest_tup[1])
+        addr = self.dest_cache.get(key)
+        if addr is not None:
+            return addr
+
+        addr = client_tup_norm(key)
+
+        """
+        When you bind to IPv6 you specify the 4 tup. The 4 tup must be
+        provided for dest (ip, port, 0, scope_id) but the last two can be
+        inferred. However, that depends on OS, event-loop type, and Python
+        version. The correct pattern is to provide the full 4 tup for
+        the dest tup as well.
+        """
+        if self.pipe_events.endpoint_type != TYPE_UDP_CON:
+            if self.route.af == IP6:
+                if addr[0][:2] in (
+                    "fe",
+                    "fd",
+                ):
+                    nic_id = self.route.interface.nic_no or 0
+                else:
+                    nic_id = 0
+
+                # 4 tup dest for UDP IPv6.
+                addr = (addr[0], addr[1], 0, nic_id)
+
+        # Keep memory bounded for servers replying to many peers.
+        if len(self.dest_cache) >= DEST_CACHE_MAX:
+            self.dest_cache.clear()
+
+        self.dest_cache[key] = addr
+        return addr
+
+    def send_many(self, items):
+        """
+        Send [(data, dest_tup), ...] in one pass without awaiting.
+        Destinations are normalised once per unique address. Returns
+        a list with 1 (sent) or 0 (failed) for each item.
+        dest_tup may be None to use the pipe's destination.
+        """
+        results = []
+        is_udp = self.pipe_events.proto in (UDP, RUDP)
+        counters = self.pipe_events.counters
+        for data, dest_tup in items:
+            if dest_tup is None:
+                dest_tup = self.dest_tup
+
+            try:
+                if is_udp:
+                    self.handle.sendto(data, self.udp_dest(dest_tup))
+                elif isinstance(self.handle, dict):
+                    self.handle[client_tup_norm(dest_tup)].write(data)
+                else:
+                    self.handle.write(data)
+
+                counters.add_out(data)
+                results.append(1)
+            except (OSError, ConnectionError, ValueError, TypeError, KeyError):
+                log(fstr(" send_many error {0}", (dest_tup,)))
+                log_exception()
+                results.append(0)
+
+        return results
+
+    def sendv(self, bufs, dest_tup=None):
+        """
+        Send the buffers in bufs as one message without joining them.
+        UDP goes out as a single sendmsg() datagram and TCP uses
+        writelines(). Returns 1 (sent) or 0 (failed.)
+        """
+        if dest_tup is None:
+            dest_tup = self.dest_tup
+
+        try:
+            if self.pipe_events.proto in (UDP, RUDP):
+                addr = self.udp_dest(dest_tup)
+                if not self.sendmsg(bufs, addr):
+                    self.handle.sendto(b"".join(bufs), addr)
+            elif isinstance(self.handle, dict):
+                self.handle[client_tup_norm(dest_tup)].writelines(bufs)
+            else:
+                self.handle.writelines(bufs)
+
+            self.pipe_events.counters.add_out_size(sum(map(len, bufs)))
+            return 1
+        except (OSError, ConnectionError, ValueError, TypeError, KeyError):
+            log(fstr(" sendv error {0}", (dest_tup,)))
+            log_exception()
+            return 0
+
+    def sendmsg(self, bufs, addr):
+        """
+        Send bufs as one datagram straight from the socket. Returns
+        False if the transport has to queue it instead (nothing can
+        skip ahead of data it already holds.)
+        """
+        sock = self.pipe_events.sock
+        transport = self.pipe_events.transport
+        if not hasattr(sock, "sendmsg") or transport is None:
+            return False
+
+        get_size = getattr(transport, "get_write_buffer_size", None)
+        if get_size is None or get_size():
+            return False
+
+        try:
+            sock.sendmsg(bufs, (), 0, addr)
+        except (BlockingIOError, InterruptedError):
+            return False
+
+        return True
+
+    def send_soon(self, data, dest_tup=None):
+        """
+        Queue data for dest_tup and send everything queued in one
+        send_many() pass at the end of this loop iteration.
+        """
+        self.send_queue.append((data, dest_tup))
+        if not self.flush_scheduled:
+            self.flush_scheduled = True
+            loop = self.loop or get_running_loop()
+            loop.call_soon(self.flush_sends)
+
+    def flush_sends(self):
+        """Send everything queued by send_soon() now and return the results."""
+        self.flush_scheduled = False
+        items, self.send_queue = self.send_queue, []
+        if not items:
+            return []
+
+        return self.send_many(items)
 
     # Async send for TCP and UDP cons.
     # Listen servers also supported.
@@ -267,6 +447,7 @@ class PipeClient(ACKUDP):
             # Indexed by writer streams per con.
             if isinstance(handle, asyncio.streams.StreamWriter):
                 handle.write(data)
+                self.pipe_events.counters.add_out(data)
                 await handle.drain()
                 return 1
 
@@ -282,31 +463,9 @@ class PipeClient(ACKUDP):
                 # (overloaded) UDP sockets that are never truly OS-connected.
                 # Always pass dest_tup — passing None causes TypeError in the
                 # asyncio transport because _address is None on unconnected
-                # sockets.
-                if self.pipe_events.endpoint_type == TYPE_UDP_CON:
-                    handle.sendto(data, dest_tup)
-                    return 1
-
-                """
-                When you bind to IPv6 you specify the 4 tup. The 4 tup must be
-                provided for dest (ip, port, 0, scope_id) but the last two can be
-                inferred. However, that depends on OS, event-loop type, and Python
-                version. The correct pattern is to provide the full 4 tup for
-                the dest tup as well.
-                """
-                if self.route.af == IP6:
-                    if dest_tup[0][:2] in (
-                        "fe",
-                        "fd",
-                    ):
-                        nic_id = self.route.interface.nic_no or 0
-                    else:
-                        nic_id = 0
-
-                    # 4 tup dest for UDP IPv6.
-                    dest_tup = (dest_tup[0], dest_tup[1], 0, nic_id)
-
-                handle.sendto(data, dest_tup)
+                # sockets. udp_dest() also adds the IPv6 4 tup for servers.
+                handle.sendto(data, self.udp_dest(dest_tup))
+                self.pipe_events.counters.add_out(data)
 
                 return 1
 
@@ -314,19 +473,10 @@ class PipeClient(ACKUDP):
             # TCP Transport instance.
             if self.pipe_events.proto == TCP:
                 # This also works for SSL wrapped sockets.
+                # Buffered by the transport. Over the high-water mark
+                # it calls pause_writing() -- see PipeEvents.drain().
                 handle.write(data)
-
-                # await self.pipe_events.safe_write(data)
-
-                """
-                await self.loop.sock_sendall(
-                    self.pipe_events.sock,
-                    data
-                )
-                """
-
-                # await handle.drain()
-
+                self.pipe_events.counters.add_out(data)
                 return 1
 
             return 0
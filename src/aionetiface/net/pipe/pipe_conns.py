@@ -0,0 +1,198 @@
+"""
+Connection table for TCP server pipes.
+
+Accepted clients are kept in an ordered dict keyed by client
+tuple so adding and removing a connection is O(1) and nothing
+lingers after it closes. The dict is kept in least-recently-
+active order which makes 'evict the oldest idle connection'
+a look at the front of it.
+
+Idle timeouts don't use a timer per connection. Each connection
+has one entry in a shared TimerWheel set to last_active +
+idle_timeout. Activity only updates a timestamp. When the entry
+comes due the connection is closed if it really has been idle
+that long, otherwise the entry is pushed back to its new
+deadline. A single loop.call_later() drives the wheel while
+the table has connections.
+"""
+
+import time
+from collections import OrderedDict
+from ...utility.utils import fstr, log, get_running_loop
+from ..timer_wheel import TimerWheel
+
+__all__ = [
+    "CONN_REJECT",
+    "CONN_EVICT",
+    "ConnTable",
+]
+
+# What to do with a new connection when the table is full.
+CONN_REJECT = "reject"
+CONN_EVICT = "evict"
+
+
+def close_client(client):
+    """Close a client's transport without waiting on it."""
+    transport = client.transport
+    if transport is not None:
+        if hasattr(transport, "abort"):
+            transport.abort()
+        else:
+            transport.close()
+
+
+class ConnTable:
+    """Client tuple -> client PipeEvents for one TCP server."""
+
+    def __init__(
+        self,
+        max_conns=0,
+        overflow=CONN_REJECT,
+        idle_timeout=0,
+        tick=None,
+        clock=time.monotonic,
+    ):
+        if overflow not in (CONN_REJECT, CONN_EVICT):
+            raise ValueError(fstr("Unknown conn overflow policy {0}", (overflow,)))
+
+        # 0 = no limit / no idle timeout.
+        self.max_conns = max_conns
+        self.overflow = overflow
+        self.idle_timeout = idle_timeout
+        self.clock = clock
+
+        # Reap within a quarter of the timeout (but at most every second.)
+        if tick is None:
+            tick = min(1.0, idle_timeout / 4.0) if idle_timeout else 1.0
+
+        # [client_tup] = client, least recently active first.
+        self.conns = OrderedDict()
+        self.last_active = {}
+        self.wheel = TimerWheel(tick=tick, clock=clock)
+        self.tick_handle = None
+
+        # Counters.
+        self.rejected = 0
+        self.evicted = 0
+        self.reaped = 0
+
+    def __len__(self):
+        return len(self.conns)
+
+    def __iter__(self):
+        # Snapshot: closing clients can remove them mid-iteration.
+        return iter(list(self.conns.values()))
+
+    def __contains__(self, client_tup):
+        return client_tup in self.conns
+
+    def get(self, client_tup):
+        """Return the client for client_tup or None."""
+        return self.conns.get(client_tup)
+
+    def admit(self):
+        """
+        Return True if a new connection may be added. When the table is
+        full this rejects it or closes the least recently active client.
+        """
+        if not self.max_conns or len(self.conns) < self.max_conns:
+            return True
+
+        if self.overflow == CONN_REJECT:
+            self.rejected += 1
+            return False
+
+        client_tup = next(iter(self.conns))
+        client = self.remove(client_tup)
+        log(fstr("Evicting idle TCP client {0}", (client_tup,)))
+        close_client(client)
+        self.evicted += 1
+        return True
+
+    def add(self, client_tup, client):
+        """Insert client. Starts its idle timer if idle_timeout is set."""
+        self.conns[client_tup] = client
+        self.conns.move_to_end(client_tup)
+        now = self.clock()
+        self.last_active[client_tup] = now
+        if self.idle_timeout:
+            self.wheel.schedule(client_tup, now + self.idle_timeout)
+            self.start_ticking()
+
+    def touch(self, client_tup):
+        """Record activity on client_tup."""
+        if client_tup in self.last_active:
+            self.last_active[client_tup] = self.clock()
+            self.conns.move_to_end(client_tup)
+
+    def remove(self, client_tup, client=None):
+        """
+        Remove client_tup and return its client. If client is given only
+        remove the entry if it's still that client.
+        """
+        found = self.conns.get(client_tup)
+        if found is None or (client is not None and found is not client):
+            return None
+
+        del self.conns[client_tup]
+        del self.last_active[client_tup]
+        self.wheel.cancel(client_tup)
+        if not self.conns:
+            self.stop_ticking()
+
+        return found
+
+    def reap(self, now=None):
+        """Close clients idle for longer than idle_timeout. Returns how many."""
+        now = self.clock() if now is None else now
+        closed = 0
+        for client_tup in self.wheel.advance(now):
+            last_active = self.last_active.get(client_tup)
+            if last_active is None:
+                continue
+
+            # Active since the timer was set: push it back.
+            deadline = last_active + self.idle_timeout
+            if deadline > now:
+                self.wheel.schedule(client_tup, deadline)
+                continue
+
+            client = self.remove(client_tup)
+            log(fstr("Reaping idle TCP client {0}", (client_tup,)))
+            close_client(client)
+            closed += 1
+
+        self.reaped += closed
+        return closed
+
+    def on_tick(self):
+        """Wheel tick: reap and keep ticking while there are connections."""
+        self.tick_handle = None
+        self.reap()
+        if self.conns:
+            self.start_ticking()
+
+    def start_ticking(self):
+        """Schedule the next wheel tick if one isn't already pending."""
+        if self.tick_handle is not None:
+            return
+
+        loop = get_running_loop()
+        if loop is None:
+            return
+
+        self.tick_handle = loop.call_later(self.wheel.tick, self.on_tick)
+
+    def stop_ticking(self):
+        """Cancel the pending wheel tick."""
+        if self.tick_handle is not None:
+            self.tick_handle.cancel()
+            self.tick_handle = None
+
+    def clear(self):
+        """Forget every connection and stop the reaper."""
+        self.stop_ticking()
+        self.conns.clear()
+        self.last_active.clear()
+        self.wheel.clear()
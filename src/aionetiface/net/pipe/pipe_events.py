@@ -18,7 +18,6 @@ TODO: revisit drain and shutdown for close.
 """
 
 import asyncio
-import sys
 from ...utility.utils import (
     fstr,
     log,
@@ -31,10 +30,16 @@ from ...utility.utils import (
     cancel_tasks,
     get_running_loop,
 )
-from ..net_defs import NET_CONF, SUB_ALL, IP4, IP6
+from ..net_defs import NET_CONF, SUB_ALL, IP4, IP6, RUDP
 from ...protocol.ack_udp import BaseACKProto
 from .pipe_client import PipeClient
-from .pipe_defs import TYPE_TCP_SERVER
+from .pipe_reader import PipeReader
+from .pipe_rudp import STREAM_FLAGS, RUDPStreamMux
+from .pipe_relay import RelayLink
+from .pipe_accept import AcceptQueue
+from .pipe_conns import ConnTable
+from .pipe_stats import PipeCounters, register_pipe, unregister_pipe
+from .pipe_defs import TYPE_TCP_SERVER, TYPE_TCP_CON, TYPE_TCP_CLIENT
 from .pipe_utils import norm_client_tup, close_all_clients
 
 
@@ -50,6 +55,19 @@ mix well with the async way of doing things. But with some small
 tweaks it is flexible enough to do whatever you want.
 """
 
+# Set once the 'backlog not enforced' warning has been logged.
+backlog_warned = False
+
+
+def backlog_unsupported():
+    """Log (once per process) that this loop can't pause a TCP server."""
+    global backlog_warned
+    if backlog_warned:
+        return
+
+    backlog_warned = True
+    log("accept_backlog is not enforced: this event loop can't pause a TCP server.")
+
 
 class PipeEvents(BaseACKProto):
     """asyncio protocol class that routes datagrams and stream data to subscribers and callbacks."""
@@ -64,17 +82,23 @@ class PipeEvents(BaseACKProto):
         # Socket of underlying connection.
         self.client_tup = None
         self.sock = sock
-        self.tcp_clients = []
+        self.tcp_clients = ConnTable(
+            self.conf.get("max_connections", 0),
+            self.conf.get("conn_overflow", "reject"),
+            self.conf.get("idle_timeout", 0),
+        )
         self.tcp_server = None
         self.tcp_server_task = None
         self.endpoint_type = None
         self.proto = None
 
-        # Used for TCP server awaitable.
-        self.p_client_entry = 0  # Location of the pipe in client futures.
-        self.p_client_insert = 0  # Last insert location in client futures.
-        self.p_client_get = 0  # Offset that increases per await over the futures.
-        self.client_futures = {0: asyncio.Future()}  # Table for TCP client pipes.
+        # New TCP server connections waiting for accept().
+        self.accept_queue = AcceptQueue(
+            self.conf.get("accept_backlog", 0),
+            on_full=self.pause_accepting,
+            on_space=self.resume_accepting,
+        )
+        self.accepting_paused = False
 
         # Bind / route.
         self.route = route
@@ -85,6 +109,16 @@ class PipeEvents(BaseACKProto):
         # List of other pipes that pipe to this.
         self.parent_pipes = []
 
+        # [target pipe events] = RelayLink for direct relays.
+        self.relay_links = {}
+
+        # Set by the transport when its write buffer is over the
+        # high-water mark. Relays blocked on it wait in blocked_links
+        # and drain() callers wait on drain_waiters.
+        self.write_paused = False
+        self.blocked_links = set()
+        self.drain_waiters = []
+
         # Process messages in real time. Sets so duplicate-add (e.g.
         # when a plugin pre-populates pipe_events to win the
         # connection_made race AND the on_plugin_done callback later
@@ -121,8 +155,11 @@ class PipeEvents(BaseACKProto):
         """
         self.handler_tasks = []
 
-        # For unique messages if enabled.
-        self.msg_ids = {}
+        # Duplicate filter for enable_msg_ids (built on first use.)
+        self.msg_dedup = None
+
+        # Ordered RUDP streams (built on first use, see pipe_rudp.py.)
+        self.rudp_streams = None
 
         # Event fired when stream set.
         self.stream_ready = asyncio.Event()
@@ -131,13 +168,20 @@ class PipeEvents(BaseACKProto):
         # Placeholders.
         self.transport = None
         self.stream = None
+        self.reader = None
         self.is_ack = None
         self.is_ackable = None
         self.is_running = True
         self.proc_lock = None
+        self.reading_paused = False
+        self.read_pausers = set()
 
         self.reachability = {IP4: {}, IP6: {}}
 
+        # Traffic counters (see pipe_stats.py.)
+        self.counters = PipeCounters()
+        register_pipe(self)
+
     # Indicates the type of endpoint this is.
     def set_endpoint_type(self, endpoint_type):
         """Record whether this pipe is a UDP server, UDP connection, TCP server, or TCP client."""
@@ -176,49 +220,137 @@ class PipeEvents(BaseACKProto):
 
         return client_tup
 
-    def add_tcp_client(self, client):
-        """Register a new TCP client PipeEvents and resolve its corresponding awaitable Future."""
-        # Save location of this client pipe in the table.
-        client.p_client_entry = self.p_client_insert
+    def add_tcp_client(self, client, client_tup=None):
+        """Register a new TCP client PipeEvents and queue it for accept()."""
+        if client_tup is None:
+            client_tup = client.stream.dest_tup
 
-        # Point to next entry in table and initialize it.
-        self.p_client_insert = (self.p_client_insert + 1) % sys.maxsize
-        self.client_futures[self.p_client_insert] = asyncio.Future()
+        self.tcp_clients.add(client_tup, client)
+        self.accept_queue.put(client)
 
-        # Store this pipe in the Future.
-        self.tcp_clients.append(client)
-        self.client_futures[client.p_client_entry].set_result(client)
+    def del_tcp_client(self, client, client_tup=None):
+        """Remove a closed TCP client from the connection table."""
+        if client_tup is None:
+            client_tup = client.stream.dest_tup
+
+        self.tcp_clients.remove(client_tup, client)
 
     async def make_awaitable(self):
         """Await the next accepted TCP client or return self for non-server endpoints."""
         if self.endpoint_type == TYPE_TCP_SERVER:
-            bound = self.p_client_insert + 1
-            for p in range(0, bound):
-                # Get reference to the current future to await on.
-                cur_p_get = (self.p_client_get + p) % bound
-
-                # Skip empty entries deleted on connection lost.
-                if self.client_futures[cur_p_get] is None:
-                    continue
-
-                # Increment the pointer to the next future in line.
-                # This sets it up for the next await call to work.
-                # Only increment it if the current location is taken.
-                if self.client_futures[cur_p_get].done():
-                    self.p_client_get = (cur_p_get + 1) % bound
-
-                # Await on the future at the head of the futures.
-                return await self.client_futures[cur_p_get]
-
-            raise AssertionError("Could not find awaitable future accept().")
+            return await self.accept_queue.get()
         else:
             # TCP con -> one pipe so no reason to await it.
             # UDP server or con -> multiplex so one pipe for everything.
             return self
 
+    def pause_accepting(self):
+        """
+        Stop taking new connections off the listen socket. They wait in
+        the kernel's listen backlog until resume_accepting().
+        """
+        server = self.tcp_server
+        if self.accepting_paused or server is None:
+            return
+
+        # asyncio.Server has no public pause so stop watching its sockets.
+        # Loops without readers (Windows Proactor) can't do this.
+        if not server.sockets:
+            return
+        if not hasattr(server, "_start_serving") or not hasattr(server, "_serving"):
+            backlog_unsupported()
+            return
+
+        loop = get_running_loop()
+        fds = [sock.fileno() for sock in server.sockets]
+        try:
+            for fd in fds:
+                loop.remove_reader(fd)
+        except (NotImplementedError, AttributeError):
+            backlog_unsupported()
+            return
+
+        server._serving = False
+        self.accepting_paused = True
+
+    def resume_accepting(self):
+        """Start accepting connections again after pause_accepting()."""
+        server = self.tcp_server
+        if not self.accepting_paused or server is None:
+            return
+
+        self.accepting_paused = False
+        if server.sockets:
+            try:
+                server._start_serving()
+            except (NotImplementedError, AttributeError):
+                backlog_unsupported()
+
+    def __aiter__(self):
+        if self.endpoint_type != TYPE_TCP_SERVER:
+            raise TypeError("async for needs a TCP server pipe.")
+
+        return self
+
+    async def __anext__(self):
+        client = await self.accept_queue.get()
+        if client is None:
+            raise StopAsyncIteration
+
+        return client
+
     def __await__(self):
         return self.make_awaitable().__await__()
 
+    def pause_reading(self, reason="app"):
+        """
+        Stop reading from the socket until resume_reading() is called
+        with the same reason. Several features (subscription queues,
+        stream reader, relays) can hold reading paused at once and it
+        only resumes when all of them have let go.
+        """
+        self.read_pausers.add(reason)
+        transport = self.transport
+        if self.reading_paused or transport is None:
+            return
+
+        # Stream, SSL, and newer datagram transports.
+        if hasattr(transport, "pause_reading"):
+            try:
+                transport.pause_reading()
+                self.reading_paused = True
+                return
+            except (NotImplementedError, RuntimeError):
+                pass
+
+        # Older selector datagram transports: drop the fd from select.
+        if self.sock is not None and hasattr(transport, "_read_ready"):
+            loop = self.loop or get_running_loop()
+            loop.remove_reader(self.sock.fileno())
+            self.reading_paused = True
+
+    def resume_reading(self, reason="app"):
+        """Release a pause_reading() and start reading once nothing holds it."""
+        self.read_pausers.discard(reason)
+        transport = self.transport
+        if not self.reading_paused or self.read_pausers:
+            return
+
+        self.reading_paused = False
+        if transport is None or transport.is_closing():
+            return
+
+        if hasattr(transport, "resume_reading"):
+            try:
+                transport.resume_reading()
+                return
+            except (NotImplementedError, RuntimeError):
+                pass
+
+        if self.sock is not None and hasattr(transport, "_read_ready"):
+            loop = self.loop or get_running_loop()
+            loop.add_reader(self.sock.fileno(), transport._read_ready)
+
     def set_tcp_server(self, server):
         """Store the asyncio Server object as both the transport and tcp_server reference."""
         self.transport = server
@@ -236,9 +368,19 @@ class PipeEvents(BaseACKProto):
         self.is_ackable = is_ackable
         return self
 
-    def add_pipe(self, pipe):
-        """Link pipe as an outbound relay target and register self as its parent."""
-        self.pipes.append(pipe)
+    def add_pipe(self, pipe, relay=False):
+        """
+        Link pipe as an outbound relay target and register self as its parent.
+        With relay=True messages are written straight into the target's
+        transport from the receive callback (no task per message) and
+        reading pauses while the target's write buffer is full.
+        """
+        if relay:
+            target = relay_target(pipe)
+            self.relay_links[target] = RelayLink(self, target)
+        else:
+            self.pipes.append(pipe)
+
         pipe.parent_pipes.append(self)
         return self
 
@@ -247,8 +389,101 @@ class PipeEvents(BaseACKProto):
         if pipe in self.pipes:
             self.pipes.remove(pipe)
 
+        link = self.relay_links.pop(relay_target(pipe), None)
+        if link is not None:
+            link.target.blocked_links.discard(link)
+            link.unblock()
+
         return self
 
+    def stats(self):
+        """Return this pipe's counters, queue depths and relays as a dict."""
+        local = None
+        if self.sock is not None:
+            try:
+                local = self.sock.getsockname()
+            except OSError:
+                pass
+
+        subs = []
+        depth = 0
+        if self.stream is not None:
+            for sub, q, handler in list(self.stream.subs.values()):
+                depth += q.qsize()
+                subs.append(
+                    {
+                        "sub": sub,
+                        "depth": q.qsize(),
+                        "bytes": q.nbytes,
+                        "evicted": q.evicted,
+                        "handler": handler is not None,
+                    }
+                )
+
+        return {
+            "proto": self.proto,
+            "endpoint_type": self.endpoint_type,
+            "local": local,
+            "peer": self.stream.dest_tup if self.stream is not None else None,
+            "counters": self.counters.as_dict(),
+            "queue_depth": depth,
+            "subs": subs,
+            "tcp_clients": len(self.tcp_clients),
+            "reading_paused": self.reading_paused,
+            "relays": [stats for _, stats in self.relay_stats()],
+            "dedup": self.msg_dedup.stats() if self.msg_dedup is not None else None,
+            "retransmit": self.stream.rtx.stats() if self.stream is not None else None,
+            "rudp_streams": len(self.rudp_streams) if self.rudp_streams is not None else 0,
+        }
+
+    def relay_stats(self):
+        """Return [(target pipe events, counters dict)] for every direct relay."""
+        return [(target, link.stats()) for target, link in self.relay_links.items()]
+
+    def set_write_limits(self, transport):
+        """Apply the write_high_water / write_low_water marks to transport."""
+        high = self.conf.get("write_high_water")
+        if high is None or not hasattr(transport, "set_write_buffer_limits"):
+            return
+
+        try:
+            transport.set_write_buffer_limits(high, self.conf.get("write_low_water"))
+        except (NotImplementedError, ValueError):
+            log_exception()
+
+    def pause_writing(self):
+        """Called by the transport when its write buffer is over the high-water mark."""
+        self.write_paused = True
+
+    def resume_writing(self):
+        """Called by the transport when its write buffer drained; unblocks relays and drain()."""
+        self.write_paused = False
+        links, self.blocked_links = self.blocked_links, set()
+        for link in links:
+            link.unblock()
+
+        self.wake_drain_waiters()
+
+    def wake_drain_waiters(self):
+        waiters, self.drain_waiters = self.drain_waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def drain(self):
+        """
+        Wait until the transport's write buffer is back under the
+        low-water mark. Returns at once if writing isn't paused.
+        Raises ConnectionError if the pipe closes while waiting.
+        """
+        while self.write_paused:
+            if not self.is_running or self.on_close.is_set():
+                raise ConnectionError("Pipe closed while draining.")
+
+            waiter = get_running_loop().create_future()
+            self.drain_waiters.append(waiter)
+            await waiter
+
     def add_msg_cb(self, msg_cb):
         """Add msg_cb to the set of callbacks invoked on every incoming message (idempotent)."""
         self.msg_cbs.add(msg_cb)
@@ -294,9 +529,10 @@ class PipeEvents(BaseACKProto):
             if transport is not None:
                 self.transport = transport
                 self.client_tup = self.get_client_tup()
+                self.set_write_limits(transport)
 
             # Set stream object for doing I/O.
-            self.stream = PipeClient(self, loop=self.loop)
+            self.stream = PipeClient(self, loop=self.loop, conf=self.conf)
             self.stream_ready.set()
 
         # Process messages using any registered handlers.
@@ -311,9 +547,17 @@ class PipeEvents(BaseACKProto):
         for pipe in self.parent_pipes:
             pipe.del_pipe(self)
 
+        # Wake up any pending stream reads.
+        if self.reader is not None:
+            self.reader.feed_eof()
+
+        # Don't leave relay sources paused on a dead target.
+        self.resume_writing()
+
         # Execute any cleanup handlers.
         self.run_handlers(self.end_cbs, self.client_tup)
         self.on_close.set()
+        unregister_pipe(self)
 
     def route_msg(self, data, client_tup):
         """Relay data to linked pipes, run message callbacks, and deliver to subscriptions."""
@@ -321,6 +565,11 @@ class PipeEvents(BaseACKProto):
         if not data:
             return
 
+        # Direct relays: a transport write each, no tasks.
+        if self.relay_links:
+            for link in list(self.relay_links.values()):
+                link.forward(data)
+
         # Route messages to any pipes.
         for pipe in self.pipes:
             task = create_task(async_wrap_errors(pipe.send(data, pipe.sock.getpeername())))
@@ -330,6 +579,11 @@ class PipeEvents(BaseACKProto):
         # Process messages using any registered handlers.
         self.run_handlers(self.msg_cbs, client_tup, data)
 
+        # Stream reader consumes the bytes directly.
+        if self.reader is not None:
+            self.reader.feed_data(data)
+            return
+
         # Add message to any interested subscriptions.
         # Matching pattern for host is in bytes so
         # there is a need to convert ip to bytes.
@@ -341,9 +595,20 @@ class PipeEvents(BaseACKProto):
         if isinstance(data, bytearray):
             data = bytes(data)
 
+        counters = self.counters
+        counters.msgs_in += 1
+        counters.bytes_in += len(data)
+
         # Norm IP.
         client_tup = norm_client_tup(client_tup)
 
+        # Ordered stream segments skip the datagram ACK path. Anything
+        # the mux doesn't claim is a plain RUDP message.
+        if self.proto == RUDP and len(data) > 8 and data[8] in STREAM_FLAGS:
+            mux = self.get_stream_mux(create=self.conf.get("rudp_stream", False))
+            if mux is not None and mux.handle(data, client_tup):
+                return
+
         # Ack UDP msg if enabled.
         if self.is_ack and self.is_ackable:
             """
@@ -357,6 +622,7 @@ class PipeEvents(BaseACKProto):
                 self.is_ack,
                 self.is_ackable,
                 lambda buf: self.stream.send(buf, client_tup),
+                client_tup,
             )
 
             """
@@ -393,6 +659,21 @@ class PipeEvents(BaseACKProto):
 
         self.handle_data(data, client_tup)
 
+    # Batches of UDP packets (BatchedDatagramTransport.)
+    def batch_received(self, batch):
+        """
+        Called with [(memoryview, client_tup), ...] for every datagram
+        drained in one read event. The views are reused after this
+        returns so each one is copied before normal processing.
+        Subclasses can override this to work on the views directly.
+        """
+        for view, client_tup in batch:
+            if self.transport is None:
+                log(fstr("Skipping process data cause transport none 1."))
+                return
+
+            self.handle_data(bytes(view), client_tup)
+
     # Single TCP connection.
     def data_received(self, data):
         """Called by asyncio when TCP stream data arrives; extracts peer address and forwards."""
@@ -411,16 +692,33 @@ class PipeEvents(BaseACKProto):
         if not self.is_running:
             return
         self.is_running = False
+        unregister_pipe(self)
 
         # Unblock any recv() calls waiting on subscription queues.
         # Without this, they would wait the full recv_timeout before returning None.
         if self.stream is not None:
+            # Stop resending reliable messages and send any held ACKs.
+            self.stream.rtx.close()
+            self.stream.flush_sacks()
+
             for sub_entry in list(self.stream.subs.values()):
                 try:
                     sub_entry[1].put_nowait([None, None])
                 except Exception:
                     pass
 
+        if self.rudp_streams is not None:
+            self.rudp_streams.close()
+
+        if self.reader is not None:
+            self.reader.feed_eof()
+
+        # Release any accept() calls.
+        self.accept_queue.close()
+
+        # And drain() calls (they see is_running is False.)
+        self.wake_drain_waiters()
+
         """
         If this is a transport for a TCP server its important to close
         it first before closing tcp_clients. Otherwise, new clients may
@@ -484,7 +782,7 @@ class PipeEvents(BaseACKProto):
         self.sock = None
         self.tcp_server = None
         self.tcp_server_task = None
-        self.tcp_clients = []
+        self.tcp_clients.clear()
         self.tasks.clear()
         if self.proc_lock is not None:
             self.proc_lock.release()
@@ -504,14 +802,104 @@ class PipeEvents(BaseACKProto):
             sub = SUB_ALL
         return await self.stream.recv_n(n, sub)
 
+    def open_reader(self, limit=None):
+        """
+        Switch a TCP pipe to stream reading. Data goes to a PipeReader
+        instead of the subscription queues. Anything already queued
+        for SUB_ALL is moved into the reader so no bytes are lost.
+        """
+        if self.reader is not None:
+            return self.reader
+
+        if self.endpoint_type not in (TYPE_TCP_CON, TYPE_TCP_CLIENT):
+            raise TypeError("Stream reader needs a connected TCP pipe.")
+
+        limit = limit or self.conf["reader_limit"]
+        reader = PipeReader(self, limit=limit)
+        if self.stream is not None:
+            entry = self.stream.subs.get(self.stream.hash_sub(SUB_ALL))
+            if entry is not None:
+                q = entry[1]
+                while not q.empty():
+                    reader.feed_data(q.get_nowait()[1])
+
+        if not self.is_running or self.on_close.is_set():
+            reader.feed_eof()
+
+        self.reader = reader
+        return reader
+
+    async def readexactly(self, n):
+        """Return exactly n bytes from a TCP pipe."""
+        return await self.open_reader().readexactly(n)
+
+    async def readuntil(self, separator=b"\n"):
+        """Return bytes up to and including separator from a TCP pipe."""
+        return await self.open_reader().readuntil(separator)
+
+    async def read_into(self, buffer):
+        """Read into a writable buffer and return the byte count (0 = EOF)."""
+        return await self.open_reader().read_into(buffer)
+
+    def get_stream_mux(self, create=True):
+        """Return the pipe's RUDPStreamMux, building it if create is set."""
+        if self.rudp_streams is None and create:
+            self.rudp_streams = RUDPStreamMux(self, self.conf)
+
+        return self.rudp_streams
+
+    def open_stream(self, dest_tup=None):
+        """Open an ordered byte stream to dest_tup over a RUDP pipe."""
+        if self.proto != RUDP:
+            raise TypeError("Ordered streams need a RUDP pipe.")
+
+        dest_tup = dest_tup or self.stream.dest_tup
+        return self.get_stream_mux().open(dest_tup)
+
+    async def accept_stream(self):
+        """Wait for a peer to open a stream on a RUDP pipe. None once closed."""
+        if self.proto != RUDP:
+            raise TypeError("Ordered streams need a RUDP pipe.")
+
+        return await self.get_stream_mux().accept()
+
     async def send(
-        self, data, dest_tup=None
+        self, data, dest_tup=None, drain=None
     ):
-        """Send data to dest_tup (or the stored destination) via the stream."""
+        """
+        Send data to dest_tup (or the stored destination) via the stream.
+        With drain (default: the send_drain option) wait for the write
+        buffer to get under the low-water mark before returning.
+        """
         if not self.is_running or self.stream is None:
             return 0
         dest_tup = dest_tup or self.stream.dest_tup
-        return await self.stream.send(data, dest_tup)
+        ret = await self.stream.send(data, dest_tup)
+        if drain is None:
+            drain = self.conf.get("send_drain", False)
+
+        if drain and self.write_paused:
+            await self.drain()
+
+        return ret
+
+    def send_many(self, items):
+        """Send [(data, dest_tup), ...] in one pass; returns 1 or 0 per item."""
+        if not self.is_running or self.stream is None:
+            return [0] * len(items)
+        return self.stream.send_many(items)
+
+    def sendv(self, bufs, dest_tup=None):
+        """Send [header, payload, ...] as one message without joining them; returns 1 or 0."""
+        if not self.is_running or self.stream is None:
+            return 0
+        return self.stream.sendv(bufs, dest_tup)
+
+    def send_soon(self, data, dest_tup=None):
+        """Coalesce data into one send_many() pass at the end of the loop iteration."""
+        if not self.is_running or self.stream is None:
+            return
+        self.stream.send_soon(data, dest_tup)
 
     # Sync subscribe to a message.
     # Easy way to get a message from sync code too.
@@ -530,12 +918,10 @@ class PipeEvents(BaseACKProto):
     # Echo client just for testing.
     async def echo(self, msg, dest_tup):
         """Send an ECHO-prefixed message back to dest_tup for testing purposes."""
-        buf = bytearray().join([b"ECHO ", msg, b"\n"])
-        await self.send(buf, dest_tup)
+        self.sendv([b"ECHO ", msg, b"\n"], dest_tup)
 
     async def safe_write(self, data):
         """Write data to the transport and drain, raising ConnectionError if the socket closes."""
-        # 1. Check BEFORE writing
         if (
             self.on_close.is_set()
             or self.transport is None
@@ -543,26 +929,9 @@ class PipeEvents(BaseACKProto):
         ):
             raise ConnectionError("Attempted to write to a closed socket.")
 
-        # 2. Perform the write
         self.transport.write(data)
-
-        await asyncio.sleep(0)
-        if self.on_close.is_set():
-            raise ConnectionError("Socket closed during flush.")
-
-        # 3. Simple Drain (Wait for buffer to clear)
-        # We wait until the transport buffer size is 0.
-        # Snapshot transport each iteration: close() can set self.transport = None
-        # (pipe_events.py close(), line ~425) while we're suspended at the sleep
-        # below, causing AttributeError if we access self.transport directly in
-        # the while condition.  Always check for None before dereferencing.
-        while True:
-            t = self.transport
-            if t is None or self.on_close.is_set():
-                raise ConnectionError("Socket closed during flush.")
-            if t.get_write_buffer_size() == 0:
-                break
-            await asyncio.sleep(0.01)  # Small yields to the loop
+        self.counters.add_out(data)
+        await self.drain()
 
     async def __aenter__(self):
         return self
@@ -570,3 +939,12 @@ class PipeEvents(BaseACKProto):
     async def __aexit__(self, *_):
         await self.close()
         return False
+
+
+def relay_target(pipe):
+    """Return the PipeEvents behind a Pipe (or pipe itself if it already is one)."""
+    pipe_events = getattr(pipe, "pipe_events", None)
+    if pipe_events is not None:
+        return pipe_events
+
+    return pipe
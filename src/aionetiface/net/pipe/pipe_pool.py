@@ -0,0 +1,294 @@
+"""
+Idle TCP pipes kept open for reuse by request/response callers.
+
+Request/response code (do_web_req, STUN over TCP) normally opens
+a new Pipe(TCP, dest, route) per request and closes it after the
+reply. That's a 3-way handshake (plus a TLS handshake with
+use_ssl) every time and leaves a socket in TIME_WAIT on the
+closing side.
+
+A PipePool hands out pipes by key: the route's bind address, the
+destination and the TLS setting. checkout() returns an idle pipe
+for the key if there's a healthy one and opens a new one if not.
+checkin() returns a pipe to the pool once the caller has read its
+whole reply:
+
+    pool = get_pipe_pool()
+    pipe = await pool.checkout(route, dest_tup)
+    await pipe.send(req)
+    ...
+    pool.checkin(pipe)
+
+An idle pipe is only handed out again if its transport is open,
+the socket hasn't seen a FIN or reset (is_socket_closed) and
+nothing arrived while it was idle -- stray bytes would be read as
+the start of the next reply. At most max_idle pipes are kept per
+key and a pipe that sits idle for idle_timeout seconds is closed.
+"""
+
+import asyncio
+import time
+from collections import deque
+from ...utility.utils import log_exception, create_task, get_running_loop
+from ..net_defs import NET_CONF, TCP
+from ..net_utils import is_socket_closed
+from .pipe import Pipe
+
+__all__ = [
+    "PipePool",
+    "get_pipe_pool",
+    "close_pipe_pools",
+]
+
+# [id(conf)] = PipePool.
+PIPE_POOLS = {}
+
+
+def pipe_key(route, dest_tup, conf):
+    """Return the pool key for pipes from route to dest_tup."""
+    try:
+        bind_tup = tuple(route.bind_tup())
+    except (ValueError, TypeError, IndexError):
+        bind_tup = None
+
+    return (
+        route.af,
+        bind_tup,
+        getattr(route.interface, "name", None),
+        (dest_tup[0], dest_tup[1]),
+        bool(conf.get("use_ssl")),
+    )
+
+
+def queued(pipe):
+    """Return the number of unread messages in a pipe's subscriptions."""
+    stream = pipe.pipe_events.stream
+    if stream is None:
+        return 0
+
+    return sum(q.qsize() for _, q, _ in stream.subs.values())
+
+
+class IdlePipe:
+    """A pooled pipe and when it went idle."""
+
+    __slots__ = ("pipe", "since")
+
+    def __init__(self, pipe, since):
+        self.pipe = pipe
+        self.since = since
+
+
+class PipePool:
+    """Idle TCP pipes by (bind address, destination, TLS.)"""
+
+    def __init__(self, max_idle=4, idle_timeout=30, conf=None, clock=time.monotonic):
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.conf = conf if conf is not None else NET_CONF
+        self.clock = clock
+
+        # [key] = deque of IdlePipe, most recently used on the right.
+        self.idle = {}
+
+        # [pipe] = key for pipes that are checked out.
+        self.busy = {}
+        self.sweep_handle = None
+
+        # Counters.
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.expired = 0
+        self.overflow = 0
+
+    @classmethod
+    def from_conf(cls, conf):
+        """Build a pool from a NET_CONF style dict."""
+        return cls(
+            max_idle=conf.get("pipe_pool_max", 4),
+            idle_timeout=conf.get("pipe_pool_idle", 30),
+            conf=conf,
+        )
+
+    def __len__(self):
+        return sum(len(idle) for idle in self.idle.values())
+
+    def is_healthy(self, pipe):
+        """True if an idle pipe can carry another request."""
+        pipe_events = pipe.pipe_events
+        if pipe_events is None or not pipe_events.is_running:
+            return False
+
+        transport = pipe_events.transport
+        if transport is None or transport.is_closing():
+            return False
+
+        if pipe_events.on_close.is_set() or queued(pipe):
+            return False
+
+        if pipe.sock is None:
+            return False
+
+        # TLS records belong to the SSL transport: don't peek at them.
+        if transport.get_extra_info("sslcontext") is not None:
+            return True
+
+        return not is_socket_closed(pipe.sock)
+
+    def take(self, key):
+        """Return the newest healthy idle pipe for key or None."""
+        idle = self.idle.get(key)
+        while idle:
+            entry = idle.pop()
+            if self.is_healthy(entry.pipe):
+                if not idle:
+                    del self.idle[key]
+
+                return entry.pipe
+
+            self.stale += 1
+            self.discard(entry.pipe)
+
+        self.idle.pop(key, None)
+        return None
+
+    def get_idle(self, route, dest_tup, conf=None):
+        """Check out an idle pipe from route to dest_tup. None if there's none."""
+        conf = conf if conf is not None else self.conf
+        key = pipe_key(route, dest_tup, conf)
+        pipe = self.take(key)
+        if pipe is not None:
+            self.hits += 1
+            self.busy[pipe] = key
+
+        return pipe
+
+    async def open(self, route, dest_tup, conf=None):
+        """Check out a new pipe from route to dest_tup."""
+        conf = conf if conf is not None else self.conf
+        key = pipe_key(route, dest_tup, conf)
+        self.misses += 1
+        pipe = await Pipe(TCP, dest_tup, route, conf=conf).connect()
+        self.busy[pipe] = key
+        return pipe
+
+    async def checkout(self, route, dest_tup, conf=None):
+        """
+        Return a connected pipe from route to dest_tup: an idle one
+        if the pool has one, otherwise a new one.
+        """
+        pipe = self.get_idle(route, dest_tup, conf)
+        if pipe is None:
+            pipe = await self.open(route, dest_tup, conf)
+
+        return pipe
+
+    def checkin(self, pipe, reuse=True):
+        """
+        Hand a checked out pipe back. It's kept for reuse if reuse is
+        True, it's healthy and the key has room -- otherwise closed.
+        Returns True if it was kept.
+        """
+        key = self.busy.pop(pipe, None)
+        if key is None or not reuse or not self.is_healthy(pipe):
+            self.discard(pipe)
+            return False
+
+        idle = self.idle.setdefault(key, deque())
+        if len(idle) >= self.max_idle:
+            self.overflow += 1
+            self.discard(idle.popleft().pipe)
+
+        idle.append(IdlePipe(pipe, self.clock()))
+        self.start_sweeping()
+        return True
+
+    def discard(self, pipe):
+        """Close a pipe the pool won't reuse."""
+        self.busy.pop(pipe, None)
+        if pipe.pipe_events is None:
+            return
+
+        if get_running_loop() is None:
+            return
+
+        create_task(self.close_pipe(pipe))
+
+    async def close_pipe(self, pipe):
+        try:
+            await pipe.close()
+        except (OSError, ConnectionError, RuntimeError):
+            log_exception()
+
+    def expire(self, now=None):
+        """Close every pipe that has been idle for idle_timeout."""
+        now = self.clock() if now is None else now
+        for key in list(self.idle):
+            idle = self.idle[key]
+            while idle and now - idle[0].since >= self.idle_timeout:
+                self.expired += 1
+                self.discard(idle.popleft().pipe)
+
+            if not idle:
+                del self.idle[key]
+
+    def on_sweep(self):
+        self.sweep_handle = None
+        self.expire()
+        self.start_sweeping()
+
+    def start_sweeping(self):
+        """Schedule the next idle sweep while there are idle pipes."""
+        if self.sweep_handle is not None or not self.idle:
+            return
+
+        loop = get_running_loop()
+        if loop is None:
+            return
+
+        oldest = min(idle[0].since for idle in self.idle.values())
+        delay = max(0, oldest + self.idle_timeout - self.clock())
+        self.sweep_handle = loop.call_later(delay, self.on_sweep)
+
+    async def close(self):
+        """Close every idle pipe. Checked out pipes are left to their callers."""
+        if self.sweep_handle is not None:
+            self.sweep_handle.cancel()
+            self.sweep_handle = None
+
+        pipes = [entry.pipe for idle in self.idle.values() for entry in idle]
+        self.idle.clear()
+        if pipes:
+            await asyncio.gather(*[self.close_pipe(pipe) for pipe in pipes])
+
+    def stats(self):
+        """Return the pool's counters as a plain dict."""
+        return {
+            "keys": len(self.idle),
+            "idle": len(self),
+            "busy": len(self.busy),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "expired": self.expired,
+            "overflow": self.overflow,
+        }
+
+
+def get_pipe_pool(conf=None):
+    """Return the shared PipePool for conf."""
+    conf = conf if conf is not None else NET_CONF
+    pool = PIPE_POOLS.get(id(conf))
+    if pool is None or pool.conf is not conf:
+        pool = PIPE_POOLS[id(conf)] = PipePool.from_conf(conf)
+
+    return pool
+
+
+async def close_pipe_pools():
+    """Close every shared pool's idle pipes and forget the pools."""
+    pools = list(PIPE_POOLS.values())
+    PIPE_POOLS.clear()
+    for pool in pools:
+        await pool.close()
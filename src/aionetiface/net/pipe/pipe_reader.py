@@ -0,0 +1,162 @@
+"""
+Stream reader for TCP pipes.
+
+recv() hands back whatever chunk data_received produced and goes
+through the subscription queues. That's fine for message-style
+protocols but framed protocols (HTTP, length-prefixed RPC) want
+'give me exactly N bytes' or 'give me everything up to CRLF'.
+
+PipeReader keeps received bytes in one bytearray with a read
+offset. Reads slice out of a memoryview and only advance the
+offset. The consumed prefix is dropped in one move once it's
+bigger than the unread part so the buffer doesn't grow and
+compaction is amortised O(1) per byte.
+"""
+
+import asyncio
+
+__all__ = [
+    "PipeReader",
+]
+
+
+class PipeReader:
+    """Buffered reader fed by PipeEvents for TCP pipes."""
+
+    def __init__(self, pipe_events=None, limit=2**16):
+        # Reading pauses at 2 x limit unread bytes and resumes at limit.
+        self.limit = limit
+        self.pipe_events = pipe_events
+
+        # Unread bytes are buf[start:].
+        self.buf = bytearray()
+        self.start = 0
+        self.eof = False
+        self.waiter = None
+        self.paused = False
+
+    def __len__(self):
+        return len(self.buf) - self.start
+
+    def at_eof(self):
+        """Return True if EOF was seen and the buffer is empty."""
+        return self.eof and not len(self)
+
+    def wakeup(self):
+        """Resolve the pending wait_for_data() future, if any."""
+        waiter = self.waiter
+        if waiter is not None:
+            self.waiter = None
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def feed_data(self, data):
+        """Append received bytes and wake any waiting reader."""
+        if not data:
+            return
+
+        self.buf += data
+        self.wakeup()
+
+        # Apply TCP flow control when the app isn't keeping up.
+        if not self.paused and len(self) > 2 * self.limit:
+            if self.pipe_events is not None:
+                self.pipe_events.pause_reading("reader")
+                self.paused = True
+
+    def feed_eof(self):
+        """Signal the peer closed the stream."""
+        self.eof = True
+        self.wakeup()
+
+    async def wait_for_data(self):
+        """Suspend until feed_data() or feed_eof() is called."""
+        if self.waiter is not None:
+            raise RuntimeError("Another coroutine is already waiting on this reader.")
+
+        loop = asyncio.get_event_loop()
+        self.waiter = loop.create_future()
+        try:
+            await self.waiter
+        finally:
+            self.waiter = None
+
+    def consume(self, n):
+        """Return the next n unread bytes and advance past them."""
+        start = self.start
+        out = bytes(memoryview(self.buf)[start:start + n])
+        self.advance(n)
+        return out
+
+    def advance(self, n):
+        """Mark n unread bytes as read without copying them."""
+        self.start += n
+
+        # Drop the consumed prefix once it outweighs the unread part.
+        if self.start >= len(self.buf) - self.start:
+            del self.buf[:self.start]
+            self.start = 0
+
+        if self.paused and len(self) <= self.limit:
+            self.paused = False
+            self.pipe_events.resume_reading("reader")
+
+    async def readexactly(self, n):
+        """Return exactly n bytes or raise IncompleteReadError on EOF."""
+        if n < 0:
+            raise ValueError("readexactly size can not be less than zero")
+
+        while len(self) < n:
+            if self.eof:
+                partial = self.consume(len(self))
+                raise asyncio.IncompleteReadError(partial, n)
+
+            await self.wait_for_data()
+
+        return self.consume(n)
+
+    async def readuntil(self, separator=b"\n"):
+        """Return bytes up to and including separator."""
+        if not separator:
+            raise ValueError("Separator should be at least one-byte string")
+
+        # Only search the bytes added since the last look.
+        offset = 0
+        sep_len = len(separator)
+        while True:
+            pos = self.buf.find(separator, self.start + offset)
+            if pos != -1:
+                return self.consume(pos - self.start + sep_len)
+
+            offset = max(0, len(self) - sep_len + 1)
+            if offset > self.limit:
+                raise asyncio.LimitOverrunError(
+                    "Separator is not found, and chunk exceed the limit", offset
+                )
+
+            if self.eof:
+                partial = self.consume(len(self))
+                raise asyncio.IncompleteReadError(partial, None)
+
+            await self.wait_for_data()
+
+    async def read(self, n=-1):
+        """Return up to n bytes (all buffered if n < 0), b"" on EOF."""
+        while not len(self) and not self.eof:
+            await self.wait_for_data()
+
+        if n < 0:
+            n = len(self)
+
+        return self.consume(min(n, len(self)))
+
+    async def read_into(self, buffer):
+        """Copy up to len(buffer) bytes into buffer and return the count. 0 = EOF."""
+        while not len(self) and not self.eof:
+            await self.wait_for_data()
+
+        view = memoryview(buffer)
+        n = min(len(view), len(self))
+        view[:n] = memoryview(self.buf)[self.start:self.start + n]
+        self.advance(n)
+        return n
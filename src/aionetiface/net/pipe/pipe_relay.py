@@ -0,0 +1,85 @@
+"""
+Direct relay links between pipes.
+
+The default relay in PipeEvents.route_msg schedules a task per
+message per linked pipe and calls getpeername() every time. A
+RelayLink instead writes straight into the target's transport
+from inside the receive callback. The destination is worked out
+once. If the write pushes the target's buffer over its high-water
+mark (the transport calls pause_writing() on the target) reading
+on the source is paused until the target calls resume_writing().
+"""
+
+from ..net_defs import UDP, RUDP
+
+__all__ = [
+    "RelayLink",
+]
+
+
+class RelayLink:
+    """Forwards messages from a source PipeEvents into a target PipeEvents' transport."""
+
+    def __init__(self, source, target):
+        self.source = source
+        self.target = target
+
+        # Cached sendto() address for UDP targets.
+        self.peer = None
+
+        # Holding reading paused on the source.
+        self.paused = False
+
+        # Counters.
+        self.msgs = 0
+        self.bytes = 0
+        self.drops = 0
+
+    def forward(self, data):
+        """Write data to the target transport and return 1, or 0 if dropped."""
+        target = self.target
+        transport = target.transport
+        if transport is None or transport.is_closing():
+            self.drops += 1
+            return 0
+
+        if target.proto in (UDP, RUDP):
+            peer = self.peer
+            if peer is None:
+                dest_tup = target.stream.dest_tup
+                if dest_tup is None:
+                    self.drops += 1
+                    return 0
+
+                peer = self.peer = target.stream.udp_dest(dest_tup)
+
+            transport.sendto(data, peer)
+        else:
+            transport.write(data)
+
+        self.msgs += 1
+        self.bytes += len(data)
+        target.counters.add_out(data)
+
+        # Target buffer is over its high-water mark.
+        if target.write_paused and not self.paused:
+            self.paused = True
+            target.blocked_links.add(self)
+            self.source.pause_reading(self)
+
+        return 1
+
+    def unblock(self):
+        """Let the source read again after the target drained."""
+        if self.paused:
+            self.paused = False
+            self.source.resume_reading(self)
+
+    def stats(self):
+        """Return the link counters as a dict."""
+        return {
+            "msgs": self.msgs,
+            "bytes": self.bytes,
+            "drops": self.drops,
+            "paused": self.paused,
+        }
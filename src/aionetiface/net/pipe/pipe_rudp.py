@@ -0,0 +1,467 @@
+"""
+Ordered, flow-controlled byte streams over RUDP pipes.
+
+Plain RUDP (ack_udp) makes each datagram reliable but delivers
+them in any order and sends as fast as the app calls ack_send().
+An RUDPStream is a TCP-like byte stream to one peer on top of a
+RUDP pipe:
+
+    - Bytes written are cut into segments of rudp_mss bytes
+      with sequential sequence numbers.
+    - At most rudp_window segments are unacknowledged at once
+      and never more than the receiver says it has room for.
+    - The receiver ACKs with the next sequence number it needs,
+      how many more segments it can take and a bitmap of the
+      out-of-order segments it already holds.
+    - Out-of-order segments wait in a buffer bounded by the
+      window. In-order bytes go to a PipeReader so reads work
+      like a TCP pipe's (read, readexactly, readuntil.)
+    - Lost segments are resent by a RetransmitQueue with the
+      peer's RFC 6298 RTO.
+
+When the app stops reading the reader fills up, the advertised
+window drops to zero and the sender stops. Reading frees space
+and sends a window update. With a zero window and nothing in
+flight the sender keeps one segment in flight as a probe.
+
+Segments share the RUDP header layout -- [seq u64][flag u8] --
+using flags ACKUDP doesn't (3-5) followed by a 32 bit stream id
+picked by the opener. Both ends need rudp_stream set (or to
+call accept_stream()) or stream segments are treated as plain
+RUDP messages.
+
+    stream = pipe.open_stream(dest_tup)
+    stream.write(b"hello")
+    await stream.drain()
+
+    # Other end.
+    stream = await pipe.accept_stream()
+    data = await stream.readexactly(5)
+"""
+
+import asyncio
+import random
+import struct
+from collections import OrderedDict
+from ...utility.utils import log, get_running_loop
+from ...protocol.ack_retransmit import RetransmitQueue
+from ...protocol.ack_udp import sack_bitmap, unpack_sack
+from .pipe_accept import AcceptQueue
+from .pipe_reader import PipeReader
+from .pipe_utils import norm_client_tup
+
+__all__ = [
+    "STREAM_DATA",
+    "STREAM_ACK",
+    "STREAM_FIN",
+    "STREAM_FLAGS",
+    "RUDPStream",
+    "RUDPStreamMux",
+]
+
+# Flag byte values after ACKUDP's 0 - 2.
+STREAM_DATA = 3
+STREAM_ACK = 4
+STREAM_FIN = 5
+STREAM_FLAGS = (STREAM_DATA, STREAM_ACK, STREAM_FIN)
+
+# seq, flag, stream id.
+DATA_HDR = struct.Struct("!QBI")
+
+# Next seq wanted, flag, stream id, window (segments.)
+ACK_HDR = struct.Struct("!QBII")
+
+# Closed streams to remember so late segments don't reopen them
+# and a resent FIN still gets ACKed.
+CLOSED_STREAMS_MAX = 256
+
+
+class RUDPStream:
+    """One ordered byte stream to a peer over a RUDP pipe."""
+
+    def __init__(self, mux, dest_tup, sid, conf):
+        self.mux = mux
+        self.dest_tup = dest_tup
+        self.sid = sid
+        self.mss = conf.get("rudp_mss", 1200)
+        self.window = conf.get("rudp_window", 64)
+        self.tries = conf.get("rudp_stream_tries", 8)
+        self.send_limit = conf.get("rudp_stream_buf", 2**18)
+
+        # Send side. Unsent bytes are send_buf[send_start:].
+        self.snd_nxt = 1
+        self.snd_una = 1
+        self.peer_window = self.window
+        self.send_buf = bytearray()
+        self.send_start = 0
+        self.fin_queued = False
+        self.fin_seq = None
+        self.fin_acked = False
+        self.drain_waiter = None
+        self.rtx = RetransmitQueue(
+            mux.send_many, on_give_up=self.on_give_up, sendv=mux.sendv
+        )
+
+        # Receive side. The reader 'pauses' at half the window and
+        # 'resumes' at a quarter -- when a window update is sent.
+        self.rcv_nxt = 1
+        self.ooo = {}
+        self.reader = PipeReader(self, limit=max(1, self.window * self.mss // 4))
+        self.peer_fin = False
+        self.ack_scheduled = False
+
+        self.error = None
+        self.closed = False
+        self.on_close = asyncio.Event()
+
+    def __repr__(self):
+        return "<RUDPStream {0} sid={1}>".format(self.dest_tup, self.sid)
+
+    # Send side.
+
+    def unsent(self):
+        """Bytes written but not yet sent."""
+        return len(self.send_buf) - self.send_start
+
+    def write(self, data):
+        """Queue data to send. Use drain() to wait for buffer space."""
+        if self.error is not None:
+            raise self.error
+
+        if self.fin_queued:
+            raise ConnectionError("RUDP stream is closed for writing.")
+
+        self.send_buf += data
+        self.pump()
+
+    async def drain(self):
+        """Wait until the unsent buffer is under rudp_stream_buf bytes."""
+        while self.unsent() > self.send_limit:
+            if self.error is not None:
+                raise self.error
+
+            if self.drain_waiter is None:
+                self.drain_waiter = get_running_loop().create_future()
+
+            await self.drain_waiter
+
+        if self.error is not None:
+            raise self.error
+
+    def wake_drain(self):
+        waiter = self.drain_waiter
+        if waiter is not None:
+            self.drain_waiter = None
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def send_segment(self, flag, payload):
+        seq = self.snd_nxt
+        self.snd_nxt += 1
+        hdr = DATA_HDR.pack(seq, flag, self.sid)
+        self.rtx.add(seq, [hdr, payload], self.dest_tup, self.tries)
+
+    def pump(self):
+        """Send queued bytes while the window allows."""
+        if self.closed:
+            return
+
+        window = min(self.window, self.peer_window)
+        if not window and not len(self.rtx):
+            # Zero window probe.
+            window = 1
+
+        limit = self.snd_una + window
+        mss = self.mss
+        while self.snd_nxt < limit:
+            if self.unsent():
+                start = self.send_start
+                chunk = bytes(memoryview(self.send_buf)[start:start + mss])
+                self.send_start = start + len(chunk)
+                self.send_segment(STREAM_DATA, chunk)
+            elif self.fin_queued and self.fin_seq is None:
+                self.fin_seq = self.snd_nxt
+                self.send_segment(STREAM_FIN, b"")
+            else:
+                break
+
+        # Drop the sent prefix once it outweighs the unsent part.
+        if self.send_start >= self.unsent():
+            del self.send_buf[:self.send_start]
+            self.send_start = 0
+
+        if self.unsent() <= self.send_limit:
+            self.wake_drain()
+
+    def on_ack(self, next_seq, window, bitmap):
+        """Peer ACKed everything before next_seq and holds the segments in bitmap."""
+        # Bogus or older than an ACK already seen.
+        if next_seq > self.snd_nxt or next_seq < self.snd_una:
+            return
+
+        for seq in range(self.snd_una, next_seq):
+            self.rtx.ack(seq)
+
+        self.snd_una = max(self.snd_una, next_seq)
+        if bitmap:
+            self.rtx.ack_many(unpack_sack(next_seq + 1, bitmap))
+
+        self.peer_window = window
+        if self.fin_seq is not None and self.snd_una > self.fin_seq:
+            self.fin_acked = True
+
+        self.pump()
+        self.check_done()
+
+    def on_give_up(self, entry):
+        self.abort(ConnectionError("RUDP stream to peer timed out."))
+
+    # Receive side.
+
+    def recv_room(self):
+        """Segments the receive side can still take."""
+        buffered = -(-len(self.reader) // self.mss)
+        return max(0, self.window - len(self.ooo) - buffered)
+
+    def on_data(self, seq, flag, payload):
+        """Handle a data or FIN segment from the peer."""
+        if self.rcv_nxt <= seq < self.rcv_nxt + self.window:
+            if seq == self.rcv_nxt:
+                if self.recv_room() or flag == STREAM_FIN:
+                    self.deliver(flag, payload)
+                    self.rcv_nxt += 1
+                    ooo = self.ooo
+                    while self.rcv_nxt in ooo:
+                        self.deliver(*ooo.pop(self.rcv_nxt))
+                        self.rcv_nxt += 1
+            elif seq not in self.ooo and len(self.ooo) < self.window - 1:
+                self.ooo[seq] = (flag, payload)
+
+        # Dups and out of window segments are re-ACKed too.
+        self.schedule_ack()
+
+    def deliver(self, flag, payload):
+        if flag == STREAM_FIN:
+            self.peer_fin = True
+            self.reader.feed_eof()
+            self.check_done()
+        else:
+            self.reader.feed_data(payload)
+
+    def schedule_ack(self):
+        """ACK once at the end of this loop iteration."""
+        if not self.ack_scheduled:
+            self.ack_scheduled = True
+            get_running_loop().call_soon(self.send_ack)
+
+    def send_ack(self):
+        # Still sent once closed: the peer needs the ACK for its FIN.
+        self.ack_scheduled = False
+        if self.error is not None:
+            return
+
+        buf = ACK_HDR.pack(self.rcv_nxt, STREAM_ACK, self.sid, self.recv_room())
+        buf += sack_bitmap(self.rcv_nxt + 1, list(self.ooo))
+        self.mux.send_many([(buf, self.dest_tup)])
+
+    # PipeReader flow control hooks.
+
+    def pause_reading(self, reason="reader"):
+        # The advertised window already shrinks as the reader fills.
+        pass
+
+    def resume_reading(self, reason="reader"):
+        # The app read enough to reopen the window: tell the peer.
+        self.schedule_ack()
+
+    async def read(self, n=-1):
+        """Return up to n bytes (all buffered if n < 0), b"" on EOF."""
+        return await self.reader.read(n)
+
+    async def readexactly(self, n):
+        """Return exactly n bytes or raise IncompleteReadError on EOF."""
+        reader = self.reader
+        if n <= len(reader) or n <= reader.limit:
+            return await reader.readexactly(n)
+
+        # More than the window holds: read it in pieces so the
+        # window keeps reopening.
+        chunks = []
+        got = 0
+        while got < n:
+            chunk = await reader.read(n - got)
+            if not chunk:
+                raise asyncio.IncompleteReadError(b"".join(chunks), n)
+
+            chunks.append(chunk)
+            got += len(chunk)
+
+        return b"".join(chunks)
+
+    async def readuntil(self, separator=b"\n"):
+        """Return bytes up to and including separator."""
+        return await self.reader.readuntil(separator)
+
+    async def read_into(self, buffer):
+        """Read into a writable buffer and return the byte count (0 = EOF)."""
+        return await self.reader.read_into(buffer)
+
+    def at_eof(self):
+        """True once the peer closed and every byte was read."""
+        return self.reader.at_eof()
+
+    # Closing.
+
+    def close(self):
+        """Send everything queued, then a FIN."""
+        if not self.fin_queued and not self.closed:
+            self.fin_queued = True
+            self.pump()
+
+    async def wait_closed(self):
+        """Wait until both sides have closed (or the stream was aborted.)"""
+        await self.on_close.wait()
+
+    def check_done(self):
+        if self.fin_acked and self.peer_fin:
+            self.finish()
+
+    def abort(self, exc=None):
+        """Drop the stream without a FIN."""
+        if self.closed:
+            return
+
+        self.error = exc
+        if exc is not None:
+            log("{0} aborted: {1}", self, exc)
+
+        self.finish()
+
+    def finish(self):
+        if self.closed:
+            return
+
+        self.closed = True
+        self.rtx.close()
+        self.reader.feed_eof()
+        self.wake_drain()
+        self.mux.remove(self)
+        self.on_close.set()
+
+    def stats(self):
+        """Return the stream's state and counters as a plain dict."""
+        return {
+            "dest": self.dest_tup,
+            "sid": self.sid,
+            "snd_nxt": self.snd_nxt,
+            "snd_una": self.snd_una,
+            "peer_window": self.peer_window,
+            "unsent": self.unsent(),
+            "rcv_nxt": self.rcv_nxt,
+            "ooo": len(self.ooo),
+            "unread": len(self.reader),
+            "retransmit": self.rtx.stats(),
+            "closed": self.closed,
+        }
+
+
+class RUDPStreamMux:
+    """Routes stream segments on one RUDP pipe to their RUDPStream."""
+
+    def __init__(self, pipe_events, conf):
+        self.pipe_events = pipe_events
+        self.conf = conf
+        self.accepting = bool(conf.get("rudp_stream", False))
+
+        # [(client_tup, sid)] = RUDPStream.
+        self.streams = {}
+        self.closed_streams = OrderedDict()
+        self.accept_queue = AcceptQueue()
+
+    def __len__(self):
+        return len(self.streams)
+
+    def send_many(self, items):
+        return self.pipe_events.send_many(items)
+
+    def sendv(self, bufs, dest_tup):
+        return self.pipe_events.sendv(bufs, dest_tup)
+
+    def open(self, dest_tup):
+        """Start a new stream to dest_tup."""
+        dest_tup = norm_client_tup(dest_tup)
+        while True:
+            sid = random.randrange(1, 2**32)
+            if (dest_tup, sid) not in self.streams:
+                break
+
+        stream = RUDPStream(self, dest_tup, sid, self.conf)
+        self.streams[(dest_tup, sid)] = stream
+        return stream
+
+    def handle(self, data, client_tup):
+        """
+        Feed a stream segment from client_tup to its stream. Returns
+        False for datagrams that only look like segments (unknown
+        stream and not the start of a new one) so they can go down
+        the normal message path.
+        """
+        if data[8] == STREAM_ACK:
+            if len(data) < ACK_HDR.size:
+                return False
+
+            next_seq, _, sid, window = ACK_HDR.unpack_from(data)
+            stream = self.streams.get((client_tup, sid))
+            if stream is None:
+                return False
+
+            stream.on_ack(next_seq, window, data[ACK_HDR.size:])
+            return True
+
+        if len(data) < DATA_HDR.size:
+            return False
+
+        seq, flag, sid = DATA_HDR.unpack_from(data)
+        key = (client_tup, sid)
+        stream = self.streams.get(key)
+        if stream is None:
+            # Our last ACK was lost: the peer is still resending.
+            final_seq = self.closed_streams.get(key)
+            if final_seq is not None:
+                ack = ACK_HDR.pack(final_seq, STREAM_ACK, sid, 0)
+                self.send_many([(ack, client_tup)])
+                return True
+
+            # New streams only when asked for, and only from a
+            # segment in the first window of one.
+            if not self.accepting or not sid:
+                return False
+            if not 1 <= seq <= self.conf.get("rudp_window", 64):
+                return False
+
+            stream = self.streams[key] = RUDPStream(self, client_tup, sid, self.conf)
+            self.accept_queue.put(stream)
+
+        stream.on_data(seq, flag, data[DATA_HDR.size:])
+        return True
+
+    def remove(self, stream):
+        """Forget a finished stream."""
+        key = (stream.dest_tup, stream.sid)
+        if self.streams.get(key) is stream:
+            del self.streams[key]
+            self.closed_streams[key] = stream.rcv_nxt
+            if len(self.closed_streams) > CLOSED_STREAMS_MAX:
+                self.closed_streams.popitem(last=False)
+
+    async def accept(self):
+        """Wait for a peer to open a stream. None once the pipe closes."""
+        self.accepting = True
+        return await self.accept_queue.get()
+
+    def close(self):
+        """Abort every stream and release accept() waiters."""
+        for stream in list(self.streams.values()):
+            stream.abort()
+
+        self.accept_queue.close()
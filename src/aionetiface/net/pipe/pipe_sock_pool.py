@@ -0,0 +1,201 @@
+"""
+Pre-bound UDP sockets for Pipe(..., pooled=True).
+
+Opening a UDP pipe normally creates, configures and binds a new
+socket (several syscalls plus the socket option and NIC pinning
+work in socket_factory.) Code that opens bursts of short-lived
+pipes -- STUN lookups, NAT tests -- pays that every time.
+
+A SockPool keeps up to sock_pool_size bound sockets for one bind
+address. Taking one is a deque pop. Every take schedules a
+background refill so the next burst finds the pool full again.
+Only routes bound to port 0 use the pool: a fixed port can only
+have one socket.
+
+Pools are shared by every route that binds to the same address
+with the same socket options:
+
+    pool = get_sock_pool(route, conf)
+    await pool.warm()
+    pipe = await Pipe(UDP, dest, route, pooled=True).connect()
+
+Transports aren't pre-created: they belong to one event loop and
+PipeEvents instance whose callbacks and destination are only known
+when the pipe is opened.
+"""
+
+import asyncio
+from collections import deque
+from ...utility.utils import log_exception, create_task, get_running_loop
+from ..net_defs import NET_CONF, UDP, IP6, NIC_BIND, LOOPBACK_BIND
+from ..socket import socket_factory
+
+__all__ = [
+    "SockPool",
+    "get_sock_pool",
+    "sock_pool_stats",
+    "close_sock_pools",
+]
+
+# [pool key] = SockPool.
+SOCK_POOLS = {}
+
+
+def pool_bind_tup(route, bind_flag):
+    """Return the address a pooled socket binds to or None if the route can't be pooled."""
+    if bind_flag == LOOPBACK_BIND:
+        # Not route.bind_tup(): its loopback port is the last port a
+        # pipe on the route was given.
+        return ("::1", 0) if route.af == IP6 else ("127.0.0.1", 0)
+
+    try:
+        bind_tup = tuple(route.bind_tup(flag=bind_flag))
+    except (ValueError, TypeError, IndexError):
+        return None
+
+    if bind_tup[1]:
+        return None
+
+    return bind_tup
+
+
+def pool_key(route, bind_tup, conf):
+    nic_name = getattr(route.interface, "name", None)
+    return (
+        route.af,
+        bind_tup,
+        nic_name,
+        conf["sock_proto"],
+        conf["linger"],
+        conf["reuse_addr"],
+        conf["broadcast"],
+    )
+
+
+class SockPool:
+    """Bound UDP sockets for one bind address, refilled in the background."""
+
+    def __init__(self, route, bind_tup, size=8, conf=None):
+        self.route = route
+        self.bind_tup = bind_tup
+        self.size = size
+        self.conf = conf if conf is not None else NET_CONF
+        self.socks = deque()
+        self.refill_task = None
+
+        # Counters.
+        self.hits = 0
+        self.misses = 0
+        self.created = 0
+        self.failed = 0
+
+    def __len__(self):
+        return len(self.socks)
+
+    def take(self):
+        """Return a bound socket or None if the pool is empty. Starts a refill."""
+        sock = None
+        while self.socks:
+            sock = self.socks.popleft()
+            if sock.fileno() != -1:
+                break
+
+            sock = None
+
+        if sock is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+        self.refill()
+        return sock
+
+    def refill(self):
+        """Top the pool back up in a background task."""
+        loop = get_running_loop()
+        if loop is None or len(self.socks) >= self.size:
+            return
+
+        # A task left on a closed loop never finishes: replace it.
+        task = self.refill_task
+        if task is not None and not task.done() and task.get_loop() is loop:
+            return
+
+        self.refill_task = create_task(self.warm())
+
+    async def warm(self):
+        """Fill the pool up to its size."""
+        while len(self.socks) < self.size:
+            sock = await socket_factory(
+                route=self.route,
+                sock_type=UDP,
+                conf=self.conf,
+                bind_tup=self.bind_tup,
+            )
+
+            if sock is None:
+                self.failed += 1
+                return
+
+            self.created += 1
+            self.socks.append(sock)
+
+            # Let the pipes that emptied the pool run.
+            await asyncio.sleep(0)
+
+    def close(self):
+        """Close every idle socket and stop refilling."""
+        if self.refill_task is not None:
+            self.refill_task.cancel()
+            self.refill_task = None
+
+        while self.socks:
+            try:
+                self.socks.popleft().close()
+            except OSError:
+                log_exception()
+
+    def stats(self):
+        """Return the pool's counters as a plain dict."""
+        return {
+            "bind": self.bind_tup,
+            "idle": len(self.socks),
+            "size": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "created": self.created,
+            "failed": self.failed,
+        }
+
+
+def get_sock_pool(route, conf=None, bind_flag=NIC_BIND):
+    """
+    Return the shared SockPool for route (and bind_flag) or None if
+    the route is bound to a fixed port.
+    """
+    conf = conf if conf is not None else NET_CONF
+    bind_tup = pool_bind_tup(route, bind_flag)
+    if bind_tup is None:
+        return None
+
+    key = pool_key(route, bind_tup, conf)
+    pool = SOCK_POOLS.get(key)
+    if pool is None:
+        pool = SOCK_POOLS[key] = SockPool(
+            route, bind_tup, size=conf.get("sock_pool_size", 8), conf=conf
+        )
+
+    return pool
+
+
+def sock_pool_stats():
+    """Return stats() for every pool."""
+    return [pool.stats() for pool in SOCK_POOLS.values()]
+
+
+def close_sock_pools():
+    """Close every pool's idle sockets and forget the pools."""
+    for pool in list(SOCK_POOLS.values()):
+        pool.close()
+
+    SOCK_POOLS.clear()
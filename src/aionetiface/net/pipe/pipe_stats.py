@@ -0,0 +1,90 @@
+"""
+Traffic counters for pipes and a registry of live pipes.
+
+Every PipeEvents has a PipeCounters that the hot paths bump as
+they go (a few integer increments -- no logging, no locks):
+messages and bytes in and out, messages that matched no
+subscription, messages evicted from full subscription queues
+and exceptions raised by message handlers.
+
+PipeEvents register themselves in PIPE_REGISTRY (a WeakSet so
+the registry never keeps a pipe alive) and pipes_snapshot()
+reports counters, queue depths and per-subscription evictions
+for all of them -- enough to see where traffic is piling up on
+a running node without turning on file logging.
+"""
+
+import weakref
+
+__all__ = [
+    "PipeCounters",
+    "PIPE_REGISTRY",
+    "register_pipe",
+    "unregister_pipe",
+    "live_pipes",
+    "pipes_snapshot",
+]
+
+# Every open PipeEvents.
+PIPE_REGISTRY = weakref.WeakSet()
+
+
+class PipeCounters:
+    """Running totals for one pipe."""
+
+    __slots__ = (
+        "msgs_in",
+        "bytes_in",
+        "msgs_out",
+        "bytes_out",
+        "unmatched",
+        "evicted",
+        "handler_errors",
+    )
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Zero every counter."""
+        self.msgs_in = 0
+        self.bytes_in = 0
+        self.msgs_out = 0
+        self.bytes_out = 0
+        self.unmatched = 0
+        self.evicted = 0
+        self.handler_errors = 0
+
+    def add_out(self, data):
+        """Count one sent message."""
+        self.msgs_out += 1
+        self.bytes_out += len(data)
+
+    def add_out_size(self, size):
+        """Count one sent message of size bytes."""
+        self.msgs_out += 1
+        self.bytes_out += size
+
+    def as_dict(self):
+        """Return the counters as a plain dict."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def register_pipe(pipe_events):
+    """Add pipe_events to the live pipe registry."""
+    PIPE_REGISTRY.add(pipe_events)
+
+
+def unregister_pipe(pipe_events):
+    """Remove pipe_events from the live pipe registry."""
+    PIPE_REGISTRY.discard(pipe_events)
+
+
+def live_pipes():
+    """Return a list of every registered PipeEvents."""
+    return list(PIPE_REGISTRY)
+
+
+def pipes_snapshot():
+    """Return PipeEvents.stats() for every live pipe."""
+    return [pipe_events.stats() for pipe_events in live_pipes()]
@@ -0,0 +1,460 @@
+"""
+Dispatch index for PipeClient subscriptions.
+
+The original dispatch loop walked every subscription and ran
+re.findall() for each one. That's fine for a handful of subs but
+a UDP socket carrying hundreds of STUN transactions (each one
+subscribes to re.escape(txn_id)) ends up doing hundreds of regex
+scans per datagram.
+
+The index splits the work in two:
+
+(1) Address buckets. Subs for an exact (ip, port), subs for an
+ip with any port (port = 0), and subs for any address live in
+separate hash buckets. A message only looks at the three buckets
+that can possibly match its sender.
+
+(2) Message matchers. Most patterns in practice are either empty
+(match all) or the output of re.escape() on a literal value.
+These are detected and matched without the regex engine:
+'^literal' becomes a prefix lookup in a dict keyed by length and
+'literal' becomes either a C-level 'in' check or -- when a bucket
+holds many literals of the same length -- a sliding window over
+the message with one dict lookup per offset. Only patterns that
+are real regular expressions get compiled (once, cached) and run.
+
+With only a few subscriptions the index costs more than it
+saves so PipeClient walks them directly (see sub_matches.)
+PipeClient.subs is a SubTable: every change to it is applied
+to the index as well, so the two can't drift apart.
+
+Queues for subscriptions are SubQueues: they have an item and a
+byte budget. PipeClient either evicts old messages to stay inside
+the budget or -- in backpressure mode -- pauses reading from the
+socket until the queue drains.
+"""
+
+import asyncio
+import re
+
+__all__ = [
+    "SubIndex",
+    "SubTable",
+    "SubQueue",
+    "literal_from_pattern",
+    "compile_sub_pattern",
+    "sub_matches",
+    "SUB_INDEX_MIN",
+]
+
+# Bytes that make a pattern a real regex when unescaped.
+REGEX_META = frozenset(b".^$*+?{}[]|()")
+
+# Compiled regex cache shared by all pipes.
+# Patterns are usually a small fixed set per protocol.
+REGEX_CACHE = {}
+REGEX_CACHE_MAX = 1024
+
+# When a bucket holds more literals of one length than this
+# it's cheaper to slide a window over the message than to
+# run 'lit in data' for every literal.
+WINDOW_SCAN_MIN = 8
+
+# Below this many subscriptions add_msg skips the index
+# and checks each subscription in turn.
+SUB_INDEX_MIN = 8
+
+
+def compile_sub_pattern(pattern):
+    """Return a compiled regex for pattern using a bounded module-level cache."""
+    if hasattr(pattern, "search"):
+        return pattern
+
+    regex = REGEX_CACHE.get(pattern)
+    if regex is None:
+        if len(REGEX_CACHE) >= REGEX_CACHE_MAX:
+            REGEX_CACHE.clear()
+
+        regex = re.compile(pattern)
+        REGEX_CACHE[pattern] = regex
+
+    return regex
+
+
+def sub_matches(sub, data, client_tup):
+    """Return True if a message from client_tup matches sub (msg_pattern, client_tup)."""
+    b_msg_p, m_client_tup = sub[:2]
+
+    # Check client_addr matches their host pattern.
+    if m_client_tup is not None:
+        if m_client_tup[1]:
+            if m_client_tup != client_tup:
+                return False
+        elif m_client_tup[0] != client_tup[0]:
+            return False
+
+    # Check data matches their message pattern.
+    if b_msg_p:
+        return compile_sub_pattern(b_msg_p).search(data) is not None
+
+    return True
+
+
+def literal_from_pattern(pattern):
+    """
+    Return (anchored, literal) if pattern only matches a fixed byte
+    string, otherwise None. Understands the escaping done by
+    re.escape() on all supported Python versions.
+    """
+    if not isinstance(pattern, (bytes, bytearray)):
+        return None
+
+    anchored = False
+    if pattern[:1] == b"^":
+        anchored = True
+        pattern = pattern[1:]
+
+    out = bytearray()
+    i = 0
+    end = len(pattern)
+    while i < end:
+        c = pattern[i]
+        if c == 0x5C:  # Backslash.
+            if i + 1 >= end:
+                return None
+
+            # \d, \w, \1, \x00 ... are regex syntax.
+            n = pattern[i + 1]
+            if (0x30 <= n <= 0x39) or (0x41 <= n <= 0x5A) or (0x61 <= n <= 0x7A):
+                return None
+
+            out.append(n)
+            i += 2
+            continue
+
+        if c in REGEX_META:
+            return None
+
+        out.append(c)
+        i += 1
+
+    return anchored, bytes(out)
+
+
+class MsgMatcher:
+    """Matches message payloads against all the patterns for one address bucket."""
+
+    def __init__(self):
+        # Offsets of subs with no msg pattern.
+        self.match_all = set()
+
+        # [len] = {prefix: set(offsets)}
+        self.prefixes = {}
+
+        # [len] = {literal: set(offsets)}
+        self.literals = {}
+
+        # [offset] = compiled regex.
+        self.regexes = {}
+
+        # [offset] = how it was indexed. Used for removal.
+        self.kinds = {}
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def add(self, offset, pattern):
+        """Index the message pattern for the subscription at offset."""
+        if not pattern:
+            self.match_all.add(offset)
+            self.kinds[offset] = (0, None)
+            return
+
+        lit = literal_from_pattern(pattern)
+        if lit is not None:
+            anchored, value = lit
+
+            # An empty literal matches everything.
+            if not value:
+                self.match_all.add(offset)
+                self.kinds[offset] = (0, None)
+                return
+
+            table = self.prefixes if anchored else self.literals
+            by_len = table.setdefault(len(value), {})
+            by_len.setdefault(value, set()).add(offset)
+            self.kinds[offset] = (1 if anchored else 2, value)
+            return
+
+        self.regexes[offset] = compile_sub_pattern(pattern)
+        self.kinds[offset] = (3, None)
+
+    def remove(self, offset):
+        """Remove the subscription at offset from the matcher."""
+        kind, value = self.kinds.pop(offset, (None, None))
+        if kind == 0:
+            self.match_all.discard(offset)
+        elif kind in (1, 2):
+            table = self.prefixes if kind == 1 else self.literals
+            by_len = table[len(value)]
+            offsets = by_len[value]
+            offsets.discard(offset)
+            if not offsets:
+                del by_len[value]
+                if not by_len:
+                    del table[len(value)]
+        elif kind == 3:
+            del self.regexes[offset]
+
+    def match(self, data, out):
+        """Add the offsets of every pattern that matches data into the set out."""
+        if self.match_all:
+            out.update(self.match_all)
+
+        # Anchored literals: one slice + dict lookup per length.
+        if self.prefixes:
+            for size, by_len in self.prefixes.items():
+                offsets = by_len.get(data[:size])
+                if offsets:
+                    out.update(offsets)
+
+        # Literals anywhere in the message.
+        if self.literals:
+            data_len = len(data)
+            for size, by_len in self.literals.items():
+                if size > data_len:
+                    continue
+
+                # Few literals: substring search in C is cheapest.
+                windows = data_len - size + 1
+                if len(by_len) < WINDOW_SCAN_MIN or len(by_len) < windows:
+                    for value, offsets in by_len.items():
+                        if value in data:
+                            out.update(offsets)
+
+                    continue
+
+                # Many literals: one dict probe per window offset.
+                for i in range(0, windows):
+                    offsets = by_len.get(data[i:i + size])
+                    if offsets:
+                        out.update(offsets)
+
+        # Real patterns.
+        if self.regexes:
+            for offset, regex in self.regexes.items():
+                if regex.search(data) is not None:
+                    out.add(offset)
+
+        return out
+
+
+class SubIndex:
+    """
+    Indexes subscriptions by address so that dispatching a message
+    only touches the subscriptions that could match its sender.
+    Entries are keyed by the same offsets PipeClient uses in subs.
+    """
+
+    def __init__(self):
+        # Subs that match any sender.
+        self.any_addr = MsgMatcher()
+
+        # [ip] = matcher for subs with port = 0.
+        self.by_ip = {}
+
+        # [(ip, port)] = matcher for exact subs.
+        self.by_tup = {}
+
+        # [offset] = (bucket key, insertion order).
+        self.entries = {}
+        self.order = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def bucket_for(self, client_tup, create=False):
+        """Return the matcher for a subscription address pattern (or None)."""
+        if client_tup is None:
+            return self.any_addr
+
+        if client_tup[1]:
+            table, key = self.by_tup, (client_tup[0], client_tup[1])
+        else:
+            table, key = self.by_ip, client_tup[0]
+
+        matcher = table.get(key)
+        if matcher is None and create:
+            matcher = table[key] = MsgMatcher()
+
+        return matcher
+
+    def add(self, offset, sub):
+        """Index sub (msg_pattern, client_tup) under offset."""
+        if offset in self.entries:
+            return
+
+        b_msg_p, client_tup = sub[:2]
+        self.bucket_for(client_tup, create=True).add(offset, b_msg_p)
+        self.entries[offset] = (client_tup, self.order)
+        self.order += 1
+
+    def remove(self, offset):
+        """Remove the subscription stored under offset."""
+        entry = self.entries.pop(offset, None)
+        if entry is None:
+            return
+
+        client_tup = entry[0]
+        matcher = self.bucket_for(client_tup)
+        matcher.remove(offset)
+
+        # Drop empty per-address buckets so churn doesn't leak.
+        if client_tup is not None and not len(matcher):
+            if client_tup[1]:
+                del self.by_tup[(client_tup[0], client_tup[1])]
+            else:
+                del self.by_ip[client_tup[0]]
+
+    def clear(self):
+        """Forget all indexed subscriptions."""
+        self.__init__()
+
+    def match(self, data, client_tup):
+        """Return the offsets of matching subscriptions in subscription order."""
+        out = set()
+        self.any_addr.match(data, out)
+
+        matcher = self.by_ip.get(client_tup[0])
+        if matcher is not None:
+            matcher.match(data, out)
+
+        matcher = self.by_tup.get(client_tup)
+        if matcher is not None:
+            matcher.match(data, out)
+
+        # Keep the delivery order the same as the old linear walk.
+        if len(out) > 1:
+            entries = self.entries
+            return sorted(out, key=lambda offset: entries[offset][1])
+
+        return out
+
+
+class SubTable(dict):
+    """
+    The subs dict of a PipeClient: [offset] = [sub, Queue, handler].
+    Every change is mirrored into index so dispatch never sees
+    a stale index, whoever edits the table.
+    """
+
+    def __init__(self, index, entries=()):
+        super().__init__()
+        self.index = index
+        index.clear()
+        self.update(entries)
+
+    def __setitem__(self, offset, entry):
+        if offset in self:
+            self.index.remove(offset)
+
+        super().__setitem__(offset, entry)
+        self.index.add(offset, entry[0])
+
+    def __delitem__(self, offset):
+        super().__delitem__(offset)
+        self.index.remove(offset)
+
+    def __ior__(self, entries):
+        self.update(entries)
+        return self
+
+    def pop(self, offset, *default):
+        if offset in self:
+            self.index.remove(offset)
+
+        return super().pop(offset, *default)
+
+    def popitem(self):
+        offset, entry = super().popitem()
+        self.index.remove(offset)
+        return offset, entry
+
+    def setdefault(self, offset, entry=None):
+        if offset not in self:
+            self[offset] = entry
+
+        return self[offset]
+
+    def update(self, *args, **kwargs):
+        for offset, entry in dict(*args, **kwargs).items():
+            self[offset] = entry
+
+    def clear(self):
+        super().clear()
+        self.index.clear()
+
+
+class SubQueue(asyncio.Queue):
+    """
+    Subscription queue with an item budget and a byte budget.
+    The asyncio maxsize is left unbounded so put_nowait never
+    raises -- the budgets are enforced by PipeClient instead.
+    Items are [client_tup, data] lists.
+    """
+
+    def __init__(self, max_items=0, max_bytes=0, on_drain=None):
+        super().__init__()
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.on_drain = on_drain
+        self.nbytes = 0
+
+        # Messages discarded to stay in budget.
+        self.evicted = 0
+
+    def _put(self, item):
+        super()._put(item)
+        if item[1] is not None:
+            self.nbytes += len(item[1])
+
+    def _get(self):
+        item = super()._get()
+        if item[1] is not None:
+            self.nbytes -= len(item[1])
+
+        # Lets the pipe resume reading once the queue drains.
+        if self.on_drain is not None:
+            self.on_drain(self)
+
+        return item
+
+    def over_budget(self):
+        """Return True if the queue is at or over its item or byte budget."""
+        if self.max_items and self.qsize() >= self.max_items:
+            return True
+
+        if self.max_bytes and self.nbytes >= self.max_bytes:
+            return True
+
+        return False
+
+    def would_overflow(self, size):
+        """Return True if adding a message of size bytes would break a budget."""
+        if self.max_items and self.qsize() + 1 > self.max_items:
+            return True
+
+        if self.max_bytes and self.nbytes + size > self.max_bytes:
+            return True
+
+        return False
+
+    def low_water(self):
+        """Return True once the queue has drained to half its budgets."""
+        if self.max_items and self.qsize() > self.max_items // 2:
+            return False
+
+        if self.max_bytes and self.nbytes > self.max_bytes // 2:
+            return False
+
+        return True
@@ -1,9 +1,10 @@
 """TCP-specific event handlers for the pipe abstraction."""
 import asyncio
 import sys
-from ...utility.utils import fstr, log, log_exception
+from ...utility.utils import fstr, log, log_debug, log_exception
 from ..net_defs import NET_CONF
 from .pipe_events import PipeEvents
+from .pipe_stats import unregister_pipe
 from .pipe_defs import TYPE_TCP_CLIENT, aionetiface_fds
 
 
@@ -69,9 +70,15 @@ class TCPClientProtocol(asyncio.StreamReaderProtocol):
         # Wrap this connection in a BaseProto object.
         self.transport = transport
         self.sock = transport.get_extra_info("socket")
-        aionetiface_fds.add(self.sock)
-
         self.remote_tup = self.sock.getpeername()
+
+        # Server is at max_connections and set to reject.
+        if not self.pipe_events.tcp_clients.admit():
+            log(fstr("Rejecting TCP client r={0}: too many connections", (self.remote_tup,)))
+            transport.abort()
+            return
+
+        aionetiface_fds.add(self.sock)
         self.client_events = PipeEvents(
             sock=self.sock, route=self.pipe_events.route, conf=self.conf, loop=self.loop
         )
@@ -98,7 +105,7 @@ class TCPClientProtocol(asyncio.StreamReaderProtocol):
         self.client_events.stream.set_dest_tup(self.remote_tup)
 
         # Record instance to allow cleanup in server.
-        self.pipe_events.add_tcp_client(self.client_events)
+        self.pipe_events.add_tcp_client(self.client_events, self.remote_tup)
 
         # Setup handle for writing. _stream_writer is set by super().connection_made() on all
         # Python versions (3.12 sets it directly; 3.13+ goes through the set_streams callback).
@@ -116,11 +123,16 @@ class TCPClientProtocol(asyncio.StreamReaderProtocol):
         """Clean up the client entry, run disconnect handlers, and signal the on_close event."""
         super().connection_lost(exc)
 
-        # Cleanup client futures entry.
-        p_client_entry = self.client_events.p_client_entry
-        client_future = self.pipe_events.client_futures.get(p_client_entry)
-        if client_future is not None and client_future.done():
-            del self.pipe_events.client_futures[p_client_entry]
+        # Rejected before it was set up.
+        if self.client_events is None:
+            return
+
+        # Remove this as an object to close and manage in the server.
+        self.pipe_events.del_tcp_client(self.client_events, self.remote_tup)
+
+        # Wake up any pending stream reads.
+        if self.client_events.reader is not None:
+            self.client_events.reader.feed_eof()
 
         # Run disconnect handlers if any set.
         client_tup = self.remote_tup
@@ -128,28 +140,22 @@ class TCPClientProtocol(asyncio.StreamReaderProtocol):
 
         # Set on close event.
         self.client_events.on_close.set()
+        unregister_pipe(self.client_events)
 
-        # Close its client socket and transport.
-        """
-        Will lead to issues iterating on closing TCP clients?
-        try:
-            if self.client_events in self.pipe_events.tcp_clients:
-                self.pipe_events.tcp_clients.remove(self.client_events)
-        except Exception:
-            log_exception()
-        """
-
-        """
-        Transport should be closed if this is called?
-        try:
-            self.transport.close()
-            self.transport = None
-        except Exception:
-            log_exception()
-        """
+        # Skip it in the accept queue if it was never accepted.
+        self.pipe_events.accept_queue.note_closed(self.client_events)
 
-        # Remove this as an object to close and manage in the server.
-        # super().connection_lost(exc)
+    def pause_writing(self):
+        """Forward write-buffer high-water events to the client PipeEvents."""
+        super().pause_writing()
+        if self.client_events is not None:
+            self.client_events.pause_writing()
+
+    def resume_writing(self):
+        """Forward write-buffer drain events to the client PipeEvents."""
+        super().resume_writing()
+        if self.client_events is not None:
+            self.client_events.resume_writing()
 
     def error_received(self, exp):
         """Log any transport-level error received for this connection."""
@@ -157,12 +163,15 @@ class TCPClientProtocol(asyncio.StreamReaderProtocol):
 
     def data_received(self, data):
         """Forward received bytes to the client PipeEvents message handler."""
-        log(fstr("Base proto recv tcp client = {0}", (data,)))
+        log_debug("Base proto recv tcp client = {0}", data)
         # This just adds data to reader which we are handling ourselves.
         # super().connection_lost(exc)
         if self.client_events is None:
             return
 
+        # Keep the idle reaper off this connection.
+        self.pipe_events.tcp_clients.touch(self.remote_tup)
+
         if not len(self.client_events.msg_cbs):
             log("No msg cbs registered for inbound message in hacked tcp server.")
 
@@ -242,8 +242,12 @@ async def socket_factory(
     dest_addr=None,
     sock_type=TCP,
     conf=None,
+    bind_tup=None,
 ):
-    """Create, configure, and bind a socket for the given route and optional destination, returning it or None on failure."""
+    """
+    Create, configure, and bind a socket for the given route and optional destination, returning it or None on failure.
+    bind_tup overrides the address picked from the route.
+    """
     if conf is None:
         conf = NET_CONF
     # Check route is bound.
@@ -299,7 +303,8 @@ async def socket_factory(
             bind_flag = LOOPBACK_BIND
 
     # Choose bind tup to use.
-    bind_tup = route.bind_tup(flag=bind_flag)
+    if bind_tup is None:
+        bind_tup = route.bind_tup(flag=bind_flag)
 
     # Attempt to bind to the tup.
     try:
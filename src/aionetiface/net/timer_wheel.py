@@ -0,0 +1,118 @@
+"""
+Hashed timer wheel.
+
+Lots of connections each wanting a timeout (idle reaping,
+retransmissions) would mean lots of loop.call_later() handles
+that mostly get cancelled. A wheel keeps every deadline in one
+of a fixed number of slots (deadline // tick % slots) and one
+periodic tick pops the slots that have come due. Scheduling
+and cancelling are O(1) and a tick only looks at the slots
+it passes over.
+
+Deadlines are rounded up to the tick so timers can fire up to
+one tick late but never early. Rescheduling a key replaces its
+old deadline; stale entries are dropped lazily when their slot
+comes around.
+
+Slots are only allocated once something lands in them so an idle
+wheel (most pipes never retransmit or reap) costs next to nothing
+to create and clear.
+"""
+
+import time
+
+__all__ = [
+    "TimerWheel",
+]
+
+
+class TimerWheel:
+    """Fixed-size hashed wheel of key -> deadline timers."""
+
+    def __init__(self, tick=0.1, slots=512, clock=time.monotonic):
+        self.tick = tick
+        self.clock = clock
+        self.slot_count = slots
+
+        # [slot index] = [(deadline, key), ...] for non-empty slots.
+        self.slots = {}
+
+        # [key] = deadline. Only the latest deadline for a key counts.
+        self.deadlines = {}
+
+        # Index of the last tick processed.
+        self.cur_tick = int(clock() / tick)
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    def __contains__(self, key):
+        return key in self.deadlines
+
+    def schedule(self, key, deadline):
+        """Set key to expire at deadline (clock seconds), replacing any old one."""
+        self.deadlines[key] = deadline
+        pos = max(int(-(-deadline // self.tick)), self.cur_tick + 1)
+        idx = pos % self.slot_count
+        slot = self.slots.get(idx)
+        if slot is None:
+            slot = self.slots[idx] = []
+
+        slot.append((deadline, key))
+
+    def schedule_in(self, key, delay):
+        """Set key to expire delay seconds from now."""
+        self.schedule(key, self.clock() + delay)
+
+    def cancel(self, key):
+        """Stop key from expiring. Returns its deadline or None."""
+        return self.deadlines.pop(key, None)
+
+    def advance(self, now=None):
+        """Return the keys whose deadlines are <= now, in slot order."""
+        now = self.clock() if now is None else now
+        end_tick = int(now / self.tick)
+        if end_tick <= self.cur_tick:
+            return []
+
+        # A long gap still only needs one pass over the wheel.
+        slot_count = self.slot_count
+        start_tick = max(self.cur_tick + 1, end_tick - slot_count + 1)
+        self.cur_tick = end_tick
+
+        expired = []
+        slots = self.slots
+        if not slots:
+            return expired
+
+        deadlines = self.deadlines
+        for pos in range(start_tick, end_tick + 1):
+            idx = pos % slot_count
+            slot = slots.get(idx)
+            if slot is None:
+                continue
+
+            keep = []
+            for entry in slot:
+                deadline, key = entry
+                if deadlines.get(key) != deadline:
+                    continue
+
+                if deadline <= now:
+                    del deadlines[key]
+                    expired.append(key)
+                else:
+                    # Due on a later lap of the wheel.
+                    keep.append(entry)
+
+            if keep:
+                slots[idx] = keep
+            else:
+                del slots[idx]
+
+        return expired
+
+    def clear(self):
+        """Drop every timer."""
+        self.deadlines.clear()
+        self.slots.clear()
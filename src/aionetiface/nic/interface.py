@@ -34,11 +34,14 @@ failures under repeated launches to 100% success after the fixed-gateway
 + fixed-metric change.
 """
 
+import asyncio
 import copy
 import pprint
 import socket
-from ..utility.utils import async_test, fstr
+from ..utility.utils import async_test, create_task, fstr, log, log_exception
 from ..net.net_defs import DUEL_STACK, IP4, IP6, UNKNOWN_STACK, VALID_STACKS
+from ..net.net_utils import ip_norm
+from ..net.ip_range import IPRange
 from ..net.address import Address
 from .route.route_pool import RoutePool
 from .nat.nat_utils import nat_info
@@ -70,6 +73,11 @@ class Interface:
         timeout=4,
     ):
         super().__init__()
+
+        # Called as cb(nic, af, src_ip, old_wan_ip, new_wan_ip) when a
+        # background revalidation finds a cached WAN IP has changed.
+        self.wan_ip_cbs = set()
+        self.wan_task = None
         if name == "default":
             use_default_interface(self)
             return
@@ -111,8 +119,13 @@ class Interface:
         min_agree=2,
         max_agree=5,
         timeout=4,
+        wan_cache=True,
     ):
-        """Resolve this interface's routes and external IPs by running STUN and NIC discovery."""
+        """
+        Resolve this interface's routes and external IPs by running STUN and NIC discovery.
+        With wan_cache, WAN IPs STUN found on this network before are used
+        straight away and revalidated in the background (see add_wan_ip_cb.)
+        """
         # Declared in load_interface.py.
         return await load_interface(
             nic=self,
@@ -120,8 +133,39 @@ class Interface:
             min_agree=min_agree,
             max_agree=max_agree,
             timeout=timeout,
+            wan_cache=wan_cache,
         )
 
+    def add_wan_ip_cb(self, wan_ip_cb):
+        """Add a callback for WAN IP changes found by background revalidation."""
+        self.wan_ip_cbs.add(wan_ip_cb)
+        return self
+
+    def del_wan_ip_cb(self, wan_ip_cb):
+        """Remove a WAN IP change callback."""
+        self.wan_ip_cbs.discard(wan_ip_cb)
+        return self
+
+    def wan_ip_changed(self, af, src_ip, old_ip, new_ip):
+        """Point routes that egressed as old_ip at new_ip and tell the callbacks."""
+        log(
+            "WAN IP for {0} on {1} changed from {2} to {3}",
+            src_ip, self.name, old_ip, new_ip,
+        )
+        for route in self.rp[af].routes:
+            route.ext_ips = [
+                IPRange(new_ip, bitlen=0) if ip_norm(str(ipr[0])) == old_ip else ipr
+                for ipr in route.ext_ips
+            ]
+
+        for wan_ip_cb in list(self.wan_ip_cbs):
+            try:
+                ret = wan_ip_cb(self, af, src_ip, old_ip, new_ip)
+                if asyncio.iscoroutine(ret):
+                    create_task(ret)
+            except Exception:  # pylint: disable=broad-except
+                log_exception()
+
     async def load_nat(
         self, nat_tests=5, delta_tests=12, timeout=4
     ):
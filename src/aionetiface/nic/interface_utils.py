@@ -4,7 +4,8 @@ import re
 import socket
 import time
 from functools import lru_cache
-from ..utility.utils import fstr, log, log_exception, to_s
+from ..utility.utils import fstr, log, log_debug, log_exception, to_s
+from ..utility.error_logger import WARNING
 from ..errors import ErrorCantLoadNATInfo, InterfaceInvalidAF, InterfaceNotFound
 from ..net.net_defs import (
     BLACK_HOLE_IPS,
@@ -360,17 +361,17 @@ async def load_interfaces(
     async def load_one(if_name):
         async with sem:
             t0 = time.time()
-            log("[IFLOAD] enter nic={0} start_cap={1}s nat_cap={2}s timeout={3}s skip_nat={4}".format(
+            log_debug("[IFLOAD] enter nic={0} start_cap={1}s nat_cap={2}s timeout={3}s skip_nat={4}",
                 to_s(if_name), start_cap, nat_cap, timeout, skip_nat,
-            ))
+            )
             try:
                 nic = Interface(if_name)
 
                 # Phase 1: nic.start. Has its own budget so a slow
                 # external-IP probe cannot starve the NAT classifier.
-                log("[IFLOAD]   nic={0} calling nic.start (cap={1}s)".format(
+                log_debug("[IFLOAD]   nic={0} calling nic.start (cap={1}s)",
                     to_s(if_name), start_cap,
-                ))
+                )
                 t1 = time.time()
                 try:
                     await asyncio.wait_for(
@@ -382,13 +383,13 @@ async def load_interfaces(
                         timeout=start_cap,
                     )
                 except asyncio.TimeoutError:
-                    log("[IFLOAD] FAIL  nic={0} nic.start TIMED OUT after {1:.2f}s (cap={2}s)".format(
-                        to_s(if_name), time.time() - t1, start_cap,
-                    ))
+                    log("[IFLOAD] FAIL  nic={0} nic.start TIMED OUT after {1:.2f}s (cap={2}s)",
+                        to_s(if_name), time.time() - t1, start_cap, level=WARNING,
+                    )
                     raise
-                log("[IFLOAD]   nic={0} nic.start OK ({1:.2f}s)".format(
+                log_debug("[IFLOAD]   nic={0} nic.start OK ({1:.2f}s)",
                     to_s(if_name), time.time() - t1,
-                ))
+                )
 
                 # Phase 2: nic.load_nat. Independent budget. We DO NOT
                 # use async_wrap_errors here because that swallowed the
@@ -398,62 +399,62 @@ async def load_interfaces(
                 # exceptions we know about and log loudly instead, so
                 # an un-tested NIC is unmistakable in the log.
                 if not skip_nat:
-                    log("[IFLOAD]   nic={0} calling load_nat (cap={1}s)".format(
+                    log_debug("[IFLOAD]   nic={0} calling load_nat (cap={1}s)",
                         to_s(if_name), nat_cap,
-                    ))
+                    )
                     t2 = time.time()
                     try:
                         await asyncio.wait_for(
                             nic.load_nat(timeout=timeout),
                             timeout=nat_cap,
                         )
-                        log("[IFLOAD]   nic={0} load_nat OK ({1:.2f}s) nat={2}".format(
+                        log_debug("[IFLOAD]   nic={0} load_nat OK ({1:.2f}s) nat={2}",
                             to_s(if_name), time.time() - t2, nic.nat,
-                        ))
+                        )
                     except asyncio.TimeoutError:
-                        log("[IFLOAD] WARN  nic={0} load_nat TIMED OUT after {1:.2f}s (cap={2}s); nic.nat stays None".format(
-                            to_s(if_name), time.time() - t2, nat_cap,
-                        ))
+                        log("[IFLOAD] WARN  nic={0} load_nat TIMED OUT after {1:.2f}s (cap={2}s); nic.nat stays None",
+                            to_s(if_name), time.time() - t2, nat_cap, level=WARNING,
+                        )
                     except ErrorCantLoadNATInfo as e:
-                        log("[IFLOAD] WARN  nic={0} load_nat raised ErrorCantLoadNATInfo: {1}; nic.nat stays None".format(
-                            to_s(if_name), e,
-                        ))
+                        log("[IFLOAD] WARN  nic={0} load_nat raised ErrorCantLoadNATInfo: {1}; nic.nat stays None",
+                            to_s(if_name), e, level=WARNING,
+                        )
                     except (OSError, ConnectionError) as e:
-                        log("[IFLOAD] WARN  nic={0} load_nat raised {1}: {2}; nic.nat stays None".format(
-                            to_s(if_name), type(e).__name__, e,
-                        ))
+                        log("[IFLOAD] WARN  nic={0} load_nat raised {1}: {2}; nic.nat stays None",
+                            to_s(if_name), type(e).__name__, e, level=WARNING,
+                        )
 
-                log("[IFLOAD] OK    nic={0} dur={1:.2f}s nat_loaded={2}".format(
+                log("[IFLOAD] OK    nic={0} dur={1:.2f}s nat_loaded={2}",
                     to_s(if_name), time.time() - t0, nic.nat is not None,
-                ))
+                )
                 return nic
             except asyncio.CancelledError:  # pylint: disable=try-except-raise
-                log("[IFLOAD] CANC  nic={0} dur={1:.2f}s".format(
+                log_debug("[IFLOAD] CANC  nic={0} dur={1:.2f}s",
                     to_s(if_name), time.time() - t0,
-                ))
+                )
                 raise
             except asyncio.TimeoutError:
-                log("[IFLOAD] FAIL  nic={0} dur={1:.2f}s reason=phase_timeout(start_cap={2}s)".format(
-                    to_s(if_name), time.time() - t0, start_cap,
-                ))
+                log("[IFLOAD] FAIL  nic={0} dur={1:.2f}s reason=phase_timeout(start_cap={2}s)",
+                    to_s(if_name), time.time() - t0, start_cap, level=WARNING,
+                )
                 return None
             except (OSError, InterfaceNotFound, InterfaceInvalidAF) as e:
-                log("[IFLOAD] FAIL  nic={0} dur={1:.2f}s reason={2}: {3}".format(
-                    to_s(if_name), time.time() - t0, type(e).__name__, repr(e),
-                ))
+                log("[IFLOAD] FAIL  nic={0} dur={1:.2f}s reason={2}: {3}",
+                    to_s(if_name), time.time() - t0, type(e).__name__, repr(e), level=WARNING,
+                )
                 log_exception()
                 return None
             except Exception as e:  # pylint: disable=broad-except
-                log("[IFLOAD] FAIL  nic={0} dur={1:.2f}s reason={2}: {3}".format(
-                    to_s(if_name), time.time() - t0, type(e).__name__, repr(e),
-                ))
+                log("[IFLOAD] FAIL  nic={0} dur={1:.2f}s reason={2}: {3}",
+                    to_s(if_name), time.time() - t0, type(e).__name__, repr(e), level=WARNING,
+                )
                 log_exception()
                 return None
 
     sweep_t0 = time.time()
-    log("[IFLOAD-SWEEP] start n_names={0} concurrency={1}".format(
+    log_debug("[IFLOAD-SWEEP] start n_names={0} concurrency={1}",
         len(if_names), LOAD_CONCURRENCY,
-    ))
+    )
     results = await asyncio.gather(*[load_one(n) for n in if_names])
     loaded = [nic for nic in results if nic is not None]
 
@@ -498,9 +499,9 @@ async def load_interfaces(
             mac_to_kept_name[mac] = nic_name
         deduped.append(nic)
 
-    log("[IFLOAD-SWEEP] done dur={0:.2f}s loaded={1}/{2} unique={3}".format(
+    log_debug("[IFLOAD-SWEEP] done dur={0:.2f}s loaded={1}/{2} unique={3}",
         time.time() - sweep_t0, len(loaded), len(if_names), len(deduped),
-    ))
+    )
     return deduped
 
 
@@ -4,9 +4,15 @@ import socket
 from ..errors import InterfaceNotFound, InterfaceInvalidAF
 from ..net.net_defs import AF_ANY, DUEL_STACK, VALID_AFS, VALID_STACKS, IP4, IP6, UDP
 from ..protocol.stun.stun_defs import RFC5389
-from ..utility.utils import async_wrap_errors, fstr, log, log_exception, to_s
+from ..net.net_utils import ip_norm
+from ..utility.utils import async_wrap_errors, create_task, fstr, log, log_exception, to_s
 from .route.route_pool import RoutePool
-from .route.route_load import discover_nic_wan_ips
+from .route.route_load import (
+    discover_nic_wan_ips,
+    lookup_wan_ip_for_nic_ip,
+    run_stun_tasks_batched,
+)
+from .nat.nat_cache import network_fingerprint, wan_cache_put
 from .netifaces.netiface_fallback import load_if_info_fallback
 from .netifaces.netiface_extra import get_mac_address
 from .interface_utils import (
@@ -101,8 +107,38 @@ def load_if_info(nic):
     return nic
 
 
+async def revalidate_wan_ips(
+    nic, fingerprint, stale, min_agree, max_agree, timeout
+):
+    """Re-run STUN for WAN IPs that came from the cache and apply any changes."""
+    tasks = []
+    for af, src_ip, _, input_ipr in stale:
+        servers = get_infra(af, UDP, "STUN(see_ip)", max_agree + 5)
+        stun_clients = get_stun_clients(af, max_agree, nic, RFC5389, servs=servers)
+        tasks.append(
+            async_wrap_errors(
+                lookup_wan_ip_for_nic_ip(
+                    src_ip, min_agree, stun_clients, timeout,
+                    input_ipr=input_ipr,
+                )
+            )
+        )
+
+    results = await run_stun_tasks_batched(tasks)
+    for (af, src_ip, old_ip, _), result in zip(stale, results):
+        # No answer isn't evidence the IP moved; keep the cached one.
+        if result is None:
+            log("WAN IP revalidation for {0} got no reply.", src_ip)
+            continue
+
+        new_ip = ip_norm(str(result[1].ext_ips[0][0]))
+        wan_cache_put(fingerprint, src_ip, new_ip)
+        if new_ip != old_ip:
+            nic.wan_ip_changed(af, src_ip, old_ip, new_ip)
+
+
 async def load_interface(
-    nic, netifaces, min_agree, max_agree, timeout
+    nic, netifaces, min_agree, max_agree, timeout, wan_cache=True
 ):
     """Fully resolve a NIC object by discovering its WAN IPs via STUN and setting its routes and stack type."""
     global INFRA_BUF
@@ -139,14 +175,22 @@ async def load_interface(
     # It's only purpose is to pass in a custom netifaces for tests.
     netifaces = netifaces or nic.netifaces
 
+    # Initialize with blank RPs.
+    for af in VALID_AFS:
+        nic.rp[af] = RoutePool()
+
+    # WAN IPs found on this network before (see nat_cache.py.) Hits
+    # are listed in stale and rechecked once the load is done. The
+    # fingerprint reads the addresses netifaces has for the NIC so
+    # the empty route pools don't matter.
+    fingerprint = network_fingerprint([nic]) if wan_cache else None
+    stale = []
+
     # Get routes for AF.
     tasks = []
     for af in VALID_AFS:
         log(fstr("Attempting to resolve {0}", (af,)))
 
-        # Initialize with blank RP.
-        nic.rp[af] = RoutePool()
-
         # Used to resolve nic addresses.
         servers = get_infra(af, UDP, "STUN(see_ip)", max_agree + 5)
         stun_clients = get_stun_clients(af, max_agree, nic, RFC5389, servs=servers)
@@ -185,6 +229,8 @@ async def load_interface(
                     stun_clients,
                     netifaces,
                     timeout=timeout,
+                    fingerprint=fingerprint,
+                    stale=stale,
                 )
             )
         )
@@ -232,4 +278,15 @@ async def load_interface(
     if len(ifs) == 1:
         nic.is_default = nic.is_default_patch
 
+    # Check cached WAN IPs without holding up the caller.
+    if nic.wan_task is not None:
+        nic.wan_task.cancel()
+        nic.wan_task = None
+    if stale:
+        nic.wan_task = create_task(
+            revalidate_wan_ips(
+                nic, fingerprint, stale, min_agree, max_agree, timeout
+            )
+        )
+
     return nic
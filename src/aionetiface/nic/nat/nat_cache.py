@@ -16,13 +16,18 @@ still re-classify in the background and overwrite a stale entry -- the
 revalidation is mandatory, not optional. The fingerprint only has to be
 good enough that a genuine network change reliably misses; an occasional
 false hit is corrected by the background revalidate.
+
+The WAN IP each source address maps to is cached the same way, so
+Interface.start() can skip its STUN consensus rounds on a known
+network (see route_load.py.)
 """
 import hashlib
 import ipaddress
 import json
 import os
+import time
 
-from ...utility.utils import log, log_exception, fstr
+from ...utility.utils import log, log_debug, log_exception, fstr
 
 
 # One small JSON object in the user's home dir:
@@ -34,6 +39,18 @@ NAT_CACHE_PATH = os.path.join(
 # Cap on remembered networks so the file cannot grow without bound.
 NAT_CACHE_MAX_NETWORKS = 16
 
+# WAN IPs found by STUN per source IP, in the same shape and under the
+# same fingerprint:
+#   { fingerprint_hex: { src_ip: {"wan_ip": ..., "time": ...}, ... }, ... }
+# Same rule as the NAT entries: a hit is a hint that has to be
+# revalidated in the background.
+WAN_CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), ".aionetiface_wan_cache.json"
+)
+
+# Seconds a cached WAN IP may be served for before it's a miss.
+WAN_CACHE_MAX_AGE = 7 * 24 * 60 * 60
+
 
 def gateway_ips(nic):
     """Return a sorted, de-duplicated list of default-gateway IP strings for a NIC."""
@@ -75,43 +92,67 @@ def prefix6(addr):
         return ""
 
 
+def nic_addrs(nic, af):
+    """Return the sorted addresses netifaces lists for nic under af.
+
+    Link-local IPv6 addresses are skipped: every network has them.
+    Falls back to the NIC address of nic's routes when netifaces
+    has nothing.
+    """
+    out = set()
+    try:
+        entries = nic.netifaces.ifaddresses(nic.name).get(int(af), [])
+    except Exception:  # pylint: disable=broad-except
+        entries = []
+    for entry in entries or []:
+        addr = str(entry.get("addr", "")).split("%", 1)[0]
+        if not addr or addr.lower().startswith("fe80:"):
+            continue
+        out.add(addr)
+
+    if not out:
+        try:
+            addr = nic.nic(af)
+        except Exception:  # pylint: disable=broad-except
+            addr = None
+        if addr:
+            out.add(str(addr))
+
+    return sorted(out)
+
+
 def network_fingerprint(ifs):
     """Return a stable hex string identifying the network `ifs` are attached to.
 
-    Built from each interface's name, its primary IPv4 address, its
-    IPv6 /64 prefix and the default gateway IPs it sees. Same LAN ->
+    Built from each interface's name, its IPv4 addresses, its IPv6
+    /64 prefixes and the default gateway IPs it sees. Same LAN ->
     same fingerprint; moving networks changes the gateway and/or local
     addressing and so changes the fingerprint.
 
-    The host's full IPv6 address is deliberately NOT used -- privacy
-    extensions rotate it on a fixed network. The /64 prefix is the
-    stable part. A hint for the NAT cache only.
+    Addresses come from netifaces so the fingerprint is the same
+    before and after the NIC's routes are loaded. The host's full
+    IPv6 address is deliberately NOT used -- privacy extensions
+    rotate it on a fixed network. The /64 prefix is the stable part.
     """
     from ...net.net_defs import IP4, IP6
 
     parts = []
     for nic in sorted(ifs, key=lambda n: str(getattr(n, "name", ""))):
         name = str(getattr(nic, "name", ""))
-        ip4 = ""
-        ip6net = ""
-        try:
-            ip4 = str(nic.nic(IP4) or "")
-        except Exception:  # pylint: disable=broad-except
-            ip4 = ""
-        try:
-            ip6net = prefix6(str(nic.nic(IP6) or ""))
-        except Exception:  # pylint: disable=broad-except
-            ip6net = ""
+        ip4 = ",".join(nic_addrs(nic, IP4))
+        ip6net = ",".join(sorted(set(
+            prefix6(addr) for addr in nic_addrs(nic, IP6)
+        )))
         gws = ",".join(gateway_ips(nic))
         parts.append("|".join((name, ip4, ip6net, gws)))
     raw = "\n".join(parts).encode("utf-8")
     return hashlib.sha256(raw).hexdigest()[:32]
 
 
-def load_nat_cache():
-    """Read the whole NAT cache file; return an empty dict on any error."""
+def load_json_cache(path):
+    """Read a whole cache file; return an empty dict on any error."""
     try:
-        with open(NAT_CACHE_PATH, "r") as fh:
+        with open(path, "r") as fh:
             data = json.load(fh)
         if isinstance(data, dict):
             return data
@@ -123,6 +164,27 @@ def load_nat_cache():
     return {}
 
 
+def store_json_cache(path, cache):
+    """Write a cache file, keeping the NAT_CACHE_MAX_NETWORKS newest networks.
+
+    Atomic write via a temp file + os.replace so a crash mid-write
+    cannot leave a half-written cache for the next run to choke on.
+    """
+    # Bound the file: keep the most-recently-inserted networks.
+    if len(cache) > NAT_CACHE_MAX_NETWORKS:
+        for stale in list(cache.keys())[:-NAT_CACHE_MAX_NETWORKS]:
+            del cache[stale]
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as fh:
+        json.dump(cache, fh)
+    os.replace(tmp_path, path)
+
+
+def load_nat_cache():
+    """Read the whole NAT cache file; return an empty dict on any error."""
+    return load_json_cache(NAT_CACHE_PATH)
+
+
 def nat_cache_get(fingerprint):
     """Return the cached {nic_name: nat_dict} for this fingerprint, or None."""
     entry = load_nat_cache().get(fingerprint)
@@ -134,24 +196,13 @@ def nat_cache_get(fingerprint):
 
 
 def nat_cache_put(fingerprint, nat_by_nic):
-    """Store {nic_name: nat_dict} under this fingerprint (best-effort).
-
-    Atomic write via a temp file + os.replace so a crash mid-write
-    cannot leave a half-written cache for the next run to choke on.
-    """
+    """Store {nic_name: nat_dict} under this fingerprint (best-effort)."""
     if not fingerprint or not isinstance(nat_by_nic, dict) or not nat_by_nic:
         return
     try:
         cache = load_nat_cache()
         cache[fingerprint] = nat_by_nic
-        # Bound the file: keep the most-recently-inserted networks.
-        if len(cache) > NAT_CACHE_MAX_NETWORKS:
-            for stale in list(cache.keys())[:-NAT_CACHE_MAX_NETWORKS]:
-                del cache[stale]
-        tmp_path = NAT_CACHE_PATH + ".tmp"
-        with open(tmp_path, "w") as fh:
-            json.dump(cache, fh)
-        os.replace(tmp_path, NAT_CACHE_PATH)
+        store_json_cache(NAT_CACHE_PATH, cache)
         log(fstr(
             "[NAT-CACHE] stored fingerprint={0} nics={1}",
             (fingerprint[:12], len(nat_by_nic)),
@@ -160,3 +211,46 @@ def nat_cache_put(fingerprint, nat_by_nic):
         log_exception()
     except Exception:  # pylint: disable=broad-except
         log_exception()
+
+
+def wan_cache_get(fingerprint, src_ip, now=None):
+    """Return the cached WAN IP for src_ip on this network, or None."""
+    entry = load_json_cache(WAN_CACHE_PATH).get(fingerprint)
+    if isinstance(entry, dict):
+        info = entry.get(src_ip)
+        now = time.time() if now is None else now
+        if isinstance(info, dict) and info.get("wan_ip"):
+            if now - info.get("time", 0) < WAN_CACHE_MAX_AGE:
+                log_debug(
+                    "[WAN-CACHE] hit fingerprint={0} src_ip={1} wan_ip={2}",
+                    fingerprint[:12], src_ip, info["wan_ip"],
+                )
+                return info["wan_ip"]
+    log_debug(
+        "[WAN-CACHE] miss fingerprint={0} src_ip={1}",
+        fingerprint[:12], src_ip,
+    )
+    return None
+
+
+def wan_cache_put(fingerprint, src_ip, wan_ip, now=None):
+    """Store the WAN IP STUN found for src_ip on this network (best-effort)."""
+    if not fingerprint or not src_ip or not wan_ip:
+        return
+    try:
+        cache = load_json_cache(WAN_CACHE_PATH)
+        entry = cache.pop(fingerprint, None)
+        if not isinstance(entry, dict):
+            entry = {}
+        entry[src_ip] = {
+            "wan_ip": wan_ip,
+            "time": time.time() if now is None else now,
+        }
+
+        # Re-inserted last so this network counts as the newest.
+        cache[fingerprint] = entry
+        store_json_cache(WAN_CACHE_PATH, cache)
+    except (OSError, ValueError):
+        log_exception()
+    except Exception:  # pylint: disable=broad-except
+        log_exception()
@@ -0,0 +1,249 @@
+"""Persistent RTT / success scoreboard for STUN and NTP servers.
+
+servers.json only carries a static score from the last time the
+list was built, so get_infra() shuffles and a cold start keeps
+paying for dead or distant servers that an earlier run already
+timed out on. Probes record what they saw here and get_infra()
+orders servers by it:
+
+    cost = rtt_ms / success_rate    (lower is better)
+
+RTT and success rate are exponentially decaying averages so a
+server that recovers (or goes bad) moves within a few samples.
+A failure in the last FAIL_HOLD seconds pushes a server behind
+every unknown one. Servers without samples cost UNKNOWN_COST: a
+mediocre server, so known-fast ones go first and known-bad ones
+last. A small fraction of picks is still taken at random from the
+rest so unknown and recovering servers keep getting sampled.
+
+The board lives in a JSON file next to the NAT cache
+({ key: {"rtt", "ok", "n", "fail", "seen"} }) and is written at
+most once per SAVE_DELAY seconds. Like the NAT cache it is a
+hint: a missing or corrupt file means "no history".
+"""
+import atexit
+import ipaddress
+import json
+import os
+import time
+
+from ...utility.utils import log_exception, fstr, get_running_loop
+from ...net.net_defs import TCP
+
+__all__ = [
+    "ServerScores",
+    "SERVER_SCORES",
+    "server_key",
+    "is_scored",
+    "record_server",
+]
+
+SERVER_SCORES_PATH = os.path.join(
+    os.path.expanduser("~"), ".aionetiface_server_scores.json"
+)
+
+# Servers remembered (least recently seen are dropped.)
+SERVER_SCORES_MAX = 512
+
+# Weight of the newest sample in the decaying averages.
+SCORE_ALPHA = 0.3
+
+# Cost of a server with no history (rtt 300ms at a 50% success rate.)
+UNKNOWN_COST = 600.0
+
+# Seconds a failure keeps a server behind the unknown ones.
+FAIL_HOLD = 300
+
+# Floor for the success rate so cost stays finite.
+MIN_OK = 0.02
+
+# Fraction of picks made at random to keep exploring.
+EXPLORE = 0.2
+
+# Seconds between writes of a changed board.
+SAVE_DELAY = 5
+
+
+def dedupe_groups(groups):
+    """Drop later groups whose first server has an ip:port already seen."""
+    out = []
+    seen = set()
+    for group in groups:
+        addr = (group[0]["ip"], group[0]["port"])
+        if addr not in seen:
+            seen.add(addr)
+            out.append(group)
+
+    return out
+
+
+def server_key(proto, ip, port):
+    """Return the board key for a server ("udp:ip:port" / "tcp:ip:port")."""
+    return fstr("{0}:{1}:{2}", ("tcp" if proto == TCP else "udp", ip, port))
+
+
+class ServerScores:
+    """Decaying RTT and success-rate averages per server, saved to a JSON file."""
+
+    def __init__(self, path=SERVER_SCORES_PATH, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self.scores = None
+        self.dirty = False
+        self.save_handle = None
+
+    def load(self):
+        """Return the board, reading it from disk on first use."""
+        if self.scores is not None:
+            return self.scores
+
+        self.scores = {}
+        try:
+            with open(self.path, "r") as fh:
+                data = json.load(fh)
+            if isinstance(data, dict):
+                self.scores = data
+        except (OSError, ValueError):
+            # Missing file or corrupt JSON -- no history yet.
+            pass
+        except Exception:  # pylint: disable=broad-except
+            log_exception()
+
+        return self.scores
+
+    def get(self, key):
+        return self.load().get(key)
+
+    def record(self, key, rtt=None, ok=True):
+        """Add one probe result (rtt in seconds) for key."""
+        scores = self.load()
+        now = self.clock()
+        entry = scores.get(key)
+        if not isinstance(entry, dict):
+            entry = scores[key] = {"rtt": None, "ok": 0.5, "n": 0, "fail": 0}
+
+        entry["ok"] = entry["ok"] + SCORE_ALPHA * ((1.0 if ok else 0.0) - entry["ok"])
+        if ok and rtt is not None:
+            rtt_ms = rtt * 1000.0
+            if entry["rtt"] is None:
+                entry["rtt"] = rtt_ms
+            else:
+                entry["rtt"] += SCORE_ALPHA * (rtt_ms - entry["rtt"])
+        if not ok:
+            entry["fail"] = now
+
+        entry["n"] += 1
+        entry["seen"] = now
+        self.dirty = True
+        self.schedule_save()
+
+    def cost(self, key, now=None):
+        """Expected cost of using key; lower is better."""
+        entry = self.get(key)
+        if not isinstance(entry, dict) or not entry.get("n"):
+            return UNKNOWN_COST
+
+        now = self.clock() if now is None else now
+        rtt = entry.get("rtt")
+        if rtt is None:
+            rtt = UNKNOWN_COST / 2
+
+        cost = rtt / max(entry.get("ok", 0.5), MIN_OK)
+        if now - entry.get("fail", 0) < FAIL_HOLD:
+            cost += UNKNOWN_COST
+
+        return cost
+
+    def rank(self, groups, proto, rng, explore=EXPLORE):
+        """
+        Return groups (lists of servers.json entries) cheapest first,
+        with about `explore` of the slots swapped for a random pick
+        from the groups behind them. groups should already be
+        shuffled so servers that cost the same stay in random order.
+        """
+        # One group per ip:port. servers.json lists some servers in
+        # several groups and a fast one would otherwise fill every
+        # slot a min_agree consensus draws from.
+        if not self.load():
+            return dedupe_groups(groups)
+
+        now = self.clock()
+        costs = []
+        for group in groups:
+            info = group[0]
+            costs.append(self.cost(server_key(proto, info["ip"], info["port"]), now))
+
+        order = sorted(range(len(groups)), key=costs.__getitem__)
+        ranked = dedupe_groups([groups[i] for i in order])
+        for i in range(len(ranked) - 1):
+            if rng.random() < explore:
+                j = rng.randrange(i + 1, len(ranked))
+                ranked[i], ranked[j] = ranked[j], ranked[i]
+
+        return ranked
+
+    def schedule_save(self):
+        """Write the board within SAVE_DELAY seconds (now if there's no loop.)"""
+        if self.save_handle is not None:
+            return
+
+        loop = get_running_loop()
+        if loop is None:
+            self.save()
+            return
+
+        self.save_handle = loop.call_later(SAVE_DELAY, self.save)
+
+    def save(self):
+        """Write the board if it changed (atomic via a temp file + os.replace.)"""
+        if self.save_handle is not None:
+            self.save_handle.cancel()
+            self.save_handle = None
+
+        if not self.dirty or self.scores is None:
+            return
+
+        self.dirty = False
+        try:
+            # Bound the file: keep the most recently seen servers.
+            if len(self.scores) > SERVER_SCORES_MAX:
+                keep = sorted(
+                    self.scores.items(),
+                    key=lambda kv: kv[1].get("seen", 0),
+                    reverse=True,
+                )[:SERVER_SCORES_MAX]
+                self.scores = dict(keep)
+
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as fh:
+                json.dump(self.scores, fh)
+            os.replace(tmp_path, self.path)
+        except (OSError, ValueError):
+            log_exception()
+        except Exception:  # pylint: disable=broad-except
+            log_exception()
+
+
+SERVER_SCORES = ServerScores()
+
+# A pending delayed write still lands if the process exits first.
+atexit.register(SERVER_SCORES.save)
+
+
+def is_scored(ip):
+    """True for addresses worth scoring: public ones, not loopback or LAN."""
+    try:
+        addr = ipaddress.ip_address(ip)
+    except (ValueError, TypeError):
+        return False
+
+    return addr.is_global
+
+
+def record_server(proto, dest, rtt=None, ok=True):
+    """Record a probe of dest ((ip, port)) on the shared board."""
+    # Local test servers and LAN hosts aren't infrastructure.
+    if not is_scored(dest[0]):
+        return
+
+    SERVER_SCORES.record(server_key(proto, dest[0], dest[1]), rtt=rtt, ok=ok)
@@ -385,7 +385,8 @@ class Route(Bind):
         nic_ips = [copy.deepcopy(nic_ip) for nic_ip in self.nic_ips]
         ext_ips = [copy.deepcopy(ext_ips) for ext_ips in self.ext_ips]
 
-        route = Route(self.af, nic_ips, ext_ips, self.interface)
+        # The original passed (or skipped) the public ext IP check.
+        route = Route(self.af, nic_ips, ext_ips, self.interface, ext_check=0)
         route.set_offsets(self.route_offset, self.host_offset)
         if self.route_pool is not None:
             route.link_route_pool(self.route_pool)
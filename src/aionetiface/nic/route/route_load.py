@@ -3,7 +3,8 @@ import asyncio
 import copy
 import random
 import time
-from ...utility.utils import async_wrap_errors, fstr, log, log_exception
+from ...utility.utils import async_wrap_errors, fstr, log, log_debug, log_exception
+from ...utility.error_logger import WARNING
 from ...utility.pattern_factory import concurrent_first_agree_or_best
 from ...net.net_defs import IP4, IP6, TCP
 from ...net.ip_range import IPRange
@@ -11,7 +12,9 @@ from ...net.net_utils import determine_if_path, ip_norm
 from ...net.bind.bind import Bind
 from ...protocol.stun.stun_client import get_stun_clients
 from ...protocol.stun.stun_defs import RFC5389
+from ...protocol.stun.stun_transactions import STUNTransactionManager
 from ...servers import get_infra
+from ..nat.nat_cache import wan_cache_get, wan_cache_put
 from .route import Route
 from .route_utils import (
     get_nic_iprs,
@@ -29,6 +32,26 @@ that particular address for a bind() call.
 """
 
 
+def wan_route(af, src_ip, wan_ip, interface, input_ipr=None):
+    """Return the Route for a NIC source address that egresses as wan_ip."""
+    host_limit = 0
+    ext_ipr = IPRange(wan_ip, bitlen=host_limit)
+    nic_ipr = IPRange(src_ip, bitlen=host_limit)
+    if nic_ipr.is_private or src_ip != wan_ip:
+        nic_ipr.is_private = True
+        nic_ipr.is_public = False
+    else:
+        nic_ipr.is_private = False
+        nic_ipr.is_public = True
+    # Preserve OS-assigned subnet prefix from the original
+    # netiface-loaded IPRange. Without this, downstream
+    # same-LAN gating (select_dest_ipr) has no way to tell
+    # whether two peers actually share a link.
+    if input_ipr is not None and input_ipr.subnet is not None:
+        nic_ipr.subnet = input_ipr.subnet
+    return Route(af, [nic_ipr], [ext_ipr], interface)
+
+
 async def lookup_wan_ip_for_nic_ip(
     src_ip, min_agree, stun_clients, timeout,
     input_ipr=None,
@@ -54,80 +77,61 @@ async def lookup_wan_ip_for_nic_ip(
 
     interface = stun_clients[0].interface
     af = stun_clients[0].af
-    log("[STUN-LOOKUP] enter src_ip={0} af={1} n_clients={2} min_agree={3} timeout={4}s".format(
+    log_debug("[STUN-LOOKUP] enter src_ip={0} af={1} n_clients={2} min_agree={3} timeout={4}s",
         src_ip, af, len(stun_clients), min_agree, timeout,
-    ))
+    )
     t0 = time.time()
-    # send_recv_loop already retries 3x internally per server; one outer
-    # retry covers genuine transient packet loss without tripling latency
-    # when STUN servers are systemically unreachable.
+    # The transaction manager retransmits on the RFC 5389 schedule; one
+    # outer retry covers genuine transient packet loss without tripling
+    # latency when STUN servers are systemically unreachable.
     for attempt in range(2):
-        log("[STUN-LOOKUP]   attempt={0} src_ip={1}".format(attempt, src_ip))
+        log_debug("[STUN-LOOKUP]   attempt={0} src_ip={1}", attempt, src_ip)
+        txm = None
         try:
-            tasks = []
-            for stun_client in stun_clients:
-                try:
-                    local_addr = await asyncio.wait_for(
-                        Bind(
-                            stun_client.interface, af=stun_client.af, port=0, ips=src_ip
-                        ).res(),
-                        timeout=2.0,
-                    )
-                except asyncio.TimeoutError:
-                    log("[STUN-LOOKUP]   bind TIMEOUT src_ip={0} server={1}".format(
-                        src_ip, getattr(stun_client, "dest", None),
-                    ))
-                    continue
-                if local_addr is None:
-                    log("[STUN-LOOKUP]   bind None src_ip={0} server={1}".format(
-                        src_ip, getattr(stun_client, "dest", None),
-                    ))
-                    continue
-
-                task = async_wrap_errors(
-                    stun_client.get_wan_ip(pipe=local_addr), logging=False
+            # Every server is asked over one socket bound to src_ip.
+            try:
+                local_addr = await asyncio.wait_for(
+                    Bind(interface, af=af, port=0, ips=src_ip).res(),
+                    timeout=2.0,
                 )
-                tasks.append(task)
-
-            if not tasks:
-                log("[STUN-LOOKUP]   no tasks queued src_ip={0} (all binds failed)".format(src_ip))
+            except asyncio.TimeoutError:
+                log_debug("[STUN-LOOKUP]   bind TIMEOUT src_ip={0}", src_ip)
+                local_addr = None
+            if local_addr is None:
+                log_debug("[STUN-LOOKUP]   no tasks queued src_ip={0} (bind failed)", src_ip)
                 return None
 
-            log("[STUN-LOOKUP]   awaiting concurrent_first_agree n_tasks={0}".format(len(tasks)))
+            txm = await STUNTransactionManager.open(
+                local_addr, conf=stun_clients[0].conf
+            )
+            tasks = [
+                async_wrap_errors(stun_client.get_wan_ip(pipe=txm), logging=False)
+                for stun_client in stun_clients
+            ]
+
+            log_debug("[STUN-LOOKUP]   awaiting concurrent_first_agree n_tasks={0}", len(tasks))
             wan_ip = await concurrent_first_agree_or_best(
                 min_agree, tasks, timeout, wait_all=False
             )
-            log("[STUN-LOOKUP]   concurrent_first_agree returned wan_ip={0}".format(wan_ip))
+            log_debug("[STUN-LOOKUP]   concurrent_first_agree returned wan_ip={0}", wan_ip)
 
             if wan_ip is not None:
-                host_limit = 0
-                ext_ipr = IPRange(wan_ip, bitlen=host_limit)
-                nic_ipr = IPRange(src_ip, bitlen=host_limit)
-                if nic_ipr.is_private or src_ip != wan_ip:
-                    nic_ipr.is_private = True
-                    nic_ipr.is_public = False
-                else:
-                    nic_ipr.is_private = False
-                    nic_ipr.is_public = True
-                # Preserve OS-assigned subnet prefix from the original
-                # netiface-loaded IPRange. Without this, downstream
-                # same-LAN gating (select_dest_ipr) has no way to tell
-                # whether two peers actually share a link.
-                if input_ipr is not None and input_ipr.subnet is not None:
-                    nic_ipr.subnet = input_ipr.subnet
-                log("[STUN-LOOKUP] OK   src_ip={0} wan_ip={1} dur={2:.2f}s attempt={3}".format(
+                log("[STUN-LOOKUP] OK   src_ip={0} wan_ip={1} dur={2:.2f}s attempt={3}",
                     src_ip, wan_ip, time.time() - t0, attempt,
-                ))
-                return (src_ip, Route(af, [nic_ipr], [ext_ipr], interface))
+                )
+                return (src_ip, wan_route(af, src_ip, wan_ip, interface, input_ipr))
 
         except (OSError, ConnectionError, asyncio.TimeoutError) as e:
-            log("[STUN-LOOKUP]   attempt={0} src_ip={1} caught {2}: {3}".format(
+            log_debug("[STUN-LOOKUP]   attempt={0} src_ip={1} caught {2}: {3}",
                 attempt, src_ip, type(e).__name__, repr(e),
-            ))
+            )
             log_exception()
+        finally:
+            if txm is not None:
+                await txm.close()
 
         if attempt == 0:
-            log(fstr("WAN IP lookup for {0} failed, retrying.", (src_ip,)))
+            log("WAN IP lookup for {0} failed, retrying.", src_ip)
             await asyncio.sleep(0.5)
 
     # Last-ditch: TCP STUN. Only reached when both UDP attempts gave us
@@ -138,19 +142,19 @@ async def lookup_wan_ip_for_nic_ip(
     # single attempt so the wall-time cost on networks where UDP DOES
     # work is zero (this code path doesn't run) and on networks where
     # it doesn't, the worst case is timeout + a few RTTs.
-    log("[STUN-LOOKUP]   UDP failed; attempting TCP STUN fallback src_ip={0}".format(src_ip))
+    log_debug("[STUN-LOOKUP]   UDP failed; attempting TCP STUN fallback src_ip={0}", src_ip)
     try:
         tcp_servers = get_infra(af, TCP, "STUN(see_ip)", no=2)
         tcp_clients = get_stun_clients(af, 2, interface, RFC5389,
                                        proto=TCP, servs=tcp_servers)
     except Exception as e:  # pylint: disable=broad-except
-        log("[STUN-LOOKUP]   TCP fallback setup failed: {0}".format(repr(e)))
+        log_debug("[STUN-LOOKUP]   TCP fallback setup failed: {0}", repr(e))
         tcp_clients = []
 
     if tcp_clients:
-        log("[STUN-LOOKUP]   TCP fallback n_clients={0} src_ip={1}".format(
+        log_debug("[STUN-LOOKUP]   TCP fallback n_clients={0} src_ip={1}",
             len(tcp_clients), src_ip,
-        ))
+        )
         try:
             tcp_tasks = []
             for stun_client in tcp_clients:
@@ -162,9 +166,9 @@ async def lookup_wan_ip_for_nic_ip(
                         timeout=2.0,
                     )
                 except asyncio.TimeoutError:
-                    log("[STUN-LOOKUP]   TCP bind TIMEOUT src_ip={0} server={1}".format(
+                    log_debug("[STUN-LOOKUP]   TCP bind TIMEOUT src_ip={0} server={1}",
                         src_ip, getattr(stun_client, "dest", None),
-                    ))
+                    )
                     continue
                 if local_addr is None:
                     continue
@@ -176,7 +180,7 @@ async def lookup_wan_ip_for_nic_ip(
                 wan_ip = await concurrent_first_agree_or_best(
                     min_agree, tcp_tasks, timeout, wait_all=False,
                 )
-                log("[STUN-LOOKUP]   TCP fallback returned wan_ip={0}".format(wan_ip))
+                log_debug("[STUN-LOOKUP]   TCP fallback returned wan_ip={0}", wan_ip)
                 if wan_ip is not None:
                     host_limit = 0
                     ext_ipr = IPRange(wan_ip, bitlen=host_limit)
@@ -188,22 +192,53 @@ async def lookup_wan_ip_for_nic_ip(
                         nic_ipr.is_private = False
                         nic_ipr.is_public = True
                     log("[STUN-LOOKUP] OK   src_ip={0} wan_ip={1} dur={2:.2f}s "
-                        "(via TCP fallback)".format(src_ip, wan_ip, time.time() - t0))
+                        "(via TCP fallback)", src_ip, wan_ip, time.time() - t0)
                     return (src_ip, Route(af, [nic_ipr], [ext_ipr], interface))
         except (OSError, ConnectionError, asyncio.TimeoutError) as e:
-            log("[STUN-LOOKUP]   TCP fallback caught {0}: {1}".format(
+            log_debug("[STUN-LOOKUP]   TCP fallback caught {0}: {1}",
                 type(e).__name__, repr(e),
-            ))
+            )
 
-    log("[STUN-LOOKUP] FAIL src_ip={0} dur={1:.2f}s (UDP+TCP both failed)".format(
-        src_ip, time.time() - t0,
-    ))
+    log("[STUN-LOOKUP] FAIL src_ip={0} dur={1:.2f}s (UDP+TCP both failed)",
+        src_ip, time.time() - t0, level=WARNING,
+    )
     return None
 
 
 STUN_BATCH_SIZE = 4
 
 
+async def lookup_wan_ip_cached(
+    src_ip, min_agree, stun_clients, timeout,
+    input_ipr=None, fingerprint=None, stale=None,
+):
+    """lookup_wan_ip_for_nic_ip() with a WAN-IP cache in front of it.
+
+    With a network fingerprint (see nat_cache.py) a cached WAN IP for
+    src_ip is turned into a route straight away and (af, src_ip,
+    wan_ip, input_ipr) is appended to stale so the caller can
+    revalidate it once the interface is loaded. A miss runs the STUN
+    lookup and caches what it finds.
+    """
+    if fingerprint and stun_clients:
+        wan_ip = wan_cache_get(fingerprint, src_ip)
+        if wan_ip is not None:
+            af = stun_clients[0].af
+            if stale is not None:
+                stale.append((af, src_ip, wan_ip, input_ipr))
+            return (
+                src_ip,
+                wan_route(af, src_ip, wan_ip, stun_clients[0].interface, input_ipr),
+            )
+
+    result = await lookup_wan_ip_for_nic_ip(
+        src_ip, min_agree, stun_clients, timeout, input_ipr=input_ipr,
+    )
+    if fingerprint and result is not None:
+        wan_cache_put(fingerprint, src_ip, ip_norm(str(result[1].ext_ips[0][0])))
+    return result
+
+
 async def run_stun_tasks_batched(tasks):
     """
     Run STUN tasks in small batches with jitter between batches to avoid
@@ -297,8 +332,12 @@ async def discover_nic_wan_ips(
     stun_clients,
     netifaces,
     timeout,
+    fingerprint=None,
+    stale=None,
 ):
     # Get a list of tasks to resolve NIC addresses.
+    # fingerprint and stale turn on the WAN-IP cache (see
+    # lookup_wan_ip_cached.)
     tasks = []
     link_locals = []
     priv_iprs = []
@@ -355,9 +394,10 @@ async def discover_nic_wan_ips(
     for src_ip in pub_group_heads:
         tasks.append(
             async_wrap_errors(
-                lookup_wan_ip_for_nic_ip(
+                lookup_wan_ip_cached(
                     src_ip, min_agree, stun_clients, timeout,
                     input_ipr=pub_head_iprs.get(src_ip),
+                    fingerprint=fingerprint, stale=stale,
                 )
             )
         )
@@ -367,9 +407,10 @@ async def discover_nic_wan_ips(
         pub_group_heads[src_ip] = []
         tasks.append(
             async_wrap_errors(
-                lookup_wan_ip_for_nic_ip(
+                lookup_wan_ip_cached(
                     src_ip, min_agree, stun_clients, timeout,
                     input_ipr=ipr,
+                    fingerprint=fingerprint, stale=stale,
                 )
             )
         )
@@ -387,9 +428,10 @@ async def discover_nic_wan_ips(
                 break
         tasks.append(
             async_wrap_errors(
-                lookup_wan_ip_for_nic_ip(
+                lookup_wan_ip_cached(
                     af_default_nic_ip, min_agree, stun_clients, timeout,
                     input_ipr=default_input_ipr,
+                    fingerprint=fingerprint, stale=stale,
                 )
             )
         )
@@ -409,9 +451,10 @@ async def discover_nic_wan_ips(
         priv_src = ip_norm(str(priv_iprs[0]))
         tasks.append(
             async_wrap_errors(
-                lookup_wan_ip_for_nic_ip(
+                lookup_wan_ip_cached(
                     priv_src, min_agree, stun_clients, timeout,
                     input_ipr=priv_iprs[0],
+                    fingerprint=fingerprint, stale=stale,
                 )
             )
         )
@@ -0,0 +1,310 @@
+"""
+Retransmission queue for reliable UDP (see ack_udp.)
+
+Every reliable datagram a pipe has in flight is one InFlight
+entry keyed by its sequence number and one slot in a shared
+TimerWheel. A single loop.call_later() tick drives the wheel
+while anything is in flight -- no task, Event or wait_for()
+timer per message.
+
+Retransmission timeouts follow RFC 6298 per peer (the
+RetransmitTimer estimator from the pcap TCP stack): each ACK
+for a datagram that was only sent once is an RTT sample
+(Karn's algorithm), so LAN peers settle at a few ms and slow
+paths back off to seconds. A datagram that times out doubles
+its own RTO for the next try. It's given up on after 'tries'
+transmissions or 'timeout' seconds.
+
+InFlight entries stand in for both halves of what ack_send()
+used to return: they can be awaited (True if ACKed) and have
+the is_set() / wait() of the asyncio.Event that was set on ACK.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from ..utility.utils import get_running_loop
+from ..net.timer_wheel import TimerWheel
+from ..net.pcap.tcp.timers import RetransmitTimer, MAX_RTO, RTO_BACKOFF
+
+__all__ = [
+    "RTX_TICK",
+    "RTX_MAX_PEERS",
+    "InFlight",
+    "RetransmitQueue",
+]
+
+# Wheel resolution in seconds.
+RTX_TICK = 0.01
+
+# Peers to keep RTT estimates for.
+RTX_MAX_PEERS = 1024
+
+
+class InFlight:
+    """One reliable datagram waiting for its ACK."""
+
+    __slots__ = (
+        "seq",
+        "buf",
+        "dest_tup",
+        "peer",
+        "rto",
+        "first_sent",
+        "tries",
+        "max_tries",
+        "give_up_at",
+        "done",
+        "acked",
+        "fut",
+    )
+
+    def __init__(self, seq, buf, dest_tup, peer, rto, now, max_tries, give_up_at):
+        self.seq = seq
+        self.buf = buf
+        self.dest_tup = dest_tup
+        self.peer = peer
+        self.rto = rto
+        self.first_sent = now
+        self.tries = 0
+        self.max_tries = max_tries
+        self.give_up_at = give_up_at
+        self.done = False
+        self.acked = False
+
+        # Only made if someone waits on the entry.
+        self.fut = None
+
+    def finish(self, acked):
+        """Mark the entry done and wake anyone waiting on it."""
+        self.done = True
+        self.acked = acked
+        self.buf = None
+        fut = self.fut
+        if fut is not None and not fut.done():
+            fut.set_result(acked)
+
+    def is_set(self):
+        """True once the datagram has been ACKed."""
+        return self.acked
+
+    async def wait(self):
+        """Wait until the entry is done. Returns True if it was ACKed."""
+        if not self.done:
+            fut = self.fut
+            if fut is None or fut.cancelled():
+                fut = self.fut = get_running_loop().create_future()
+
+            # Shielded: a timed out waiter mustn't cancel the shared future.
+            await asyncio.shield(fut)
+
+        return self.acked
+
+    def __await__(self):
+        return self.wait().__await__()
+
+
+class RetransmitQueue:
+    """In-flight reliable datagrams for one pipe, retransmitted off one timer."""
+
+    def __init__(
+        self,
+        send_many,
+        tick=RTX_TICK,
+        max_peers=RTX_MAX_PEERS,
+        clock=time.monotonic,
+        on_give_up=None,
+        sendv=None,
+    ):
+        # send_many([(buf, dest_tup)]) -- a non-blocking send.
+        self.send_many = send_many
+
+        # sendv([header, payload], dest_tup) -- for entries whose buf
+        # is a list of parts (joined for send_many if it's not set.)
+        self.sendv = sendv
+
+        # on_give_up(entry) -- called when an entry runs out of tries.
+        self.on_give_up = on_give_up
+        self.clock = clock
+        self.max_peers = max_peers
+        self.wheel = TimerWheel(tick=tick, clock=clock)
+        self.tick_handle = None
+
+        # [seq] = InFlight.
+        self.inflight = {}
+
+        # [(ip, port)] = RetransmitTimer, least recently used first.
+        self.peers = OrderedDict()
+
+        # Counters.
+        self.sent = 0
+        self.retransmits = 0
+        self.acked = 0
+        self.gave_up = 0
+
+    def __len__(self):
+        return len(self.inflight)
+
+    def __contains__(self, seq):
+        return seq in self.inflight
+
+    def peer_timer(self, dest_tup):
+        """Return the RTO estimator for dest_tup."""
+        peer = (dest_tup[0], dest_tup[1])
+        timer = self.peers.get(peer)
+        if timer is None:
+            if len(self.peers) >= self.max_peers:
+                self.peers.popitem(last=False)
+
+            timer = self.peers[peer] = RetransmitTimer()
+        else:
+            self.peers.move_to_end(peer)
+
+        return timer
+
+    def rto(self, dest_tup):
+        """Return the current retransmission timeout for dest_tup."""
+        return self.peer_timer(dest_tup).rto
+
+    def add(self, seq, buf, dest_tup, tries=3, timeout=0):
+        """
+        Send buf to dest_tup and keep resending it until seq is ACKed.
+        buf can be a list of buffers sent as one message (see sendv.)
+        """
+        old = self.inflight.pop(seq, None)
+        if old is not None:
+            old.finish(False)
+
+        now = self.clock()
+        timer = self.peer_timer(dest_tup)
+        entry = InFlight(
+            seq,
+            buf,
+            dest_tup,
+            timer,
+            timer.rto,
+            now,
+            max(1, tries),
+            now + timeout if timeout else 0,
+        )
+
+        self.inflight[seq] = entry
+        self.transmit(entry)
+        self.wheel.schedule(seq, self.next_deadline(entry, now))
+        self.start_ticking()
+        return entry
+
+    def next_deadline(self, entry, now):
+        """When to next check on entry: its RTO or its overall timeout."""
+        deadline = now + entry.rto
+        if entry.give_up_at and entry.give_up_at < deadline:
+            return entry.give_up_at
+
+        return deadline
+
+    def transmit(self, entry):
+        entry.tries += 1
+        self.sent += 1
+        buf = entry.buf
+        if type(buf) is list:
+            if self.sendv is not None:
+                self.sendv(buf, entry.dest_tup)
+                return
+
+            buf = b"".join(buf)
+
+        self.send_many([(buf, entry.dest_tup)])
+
+    def ack(self, seq):
+        """Record an ACK for seq. Returns True if it was in flight."""
+        entry = self.inflight.pop(seq, None)
+        if entry is None:
+            return False
+
+        self.wheel.cancel(seq)
+
+        # Karn: an ACK for a resent datagram could be for any copy.
+        if entry.tries == 1:
+            entry.peer.update_rtt(self.clock() - entry.first_sent)
+
+        self.acked += 1
+        entry.finish(True)
+        if not self.inflight:
+            self.stop_ticking()
+
+        return True
+
+    def ack_many(self, seqs):
+        """Record ACKs for every seq in seqs. Returns how many were in flight."""
+        acked = 0
+        for seq in seqs:
+            if seq in self.inflight:
+                acked += self.ack(seq)
+
+        return acked
+
+    def expire(self, now=None):
+        """Resend or give up on every entry whose RTO has passed."""
+        now = self.clock() if now is None else now
+        for seq in self.wheel.advance(now):
+            entry = self.inflight.get(seq)
+            if entry is None:
+                continue
+
+            out_of_time = entry.give_up_at and now >= entry.give_up_at
+            if entry.tries >= entry.max_tries or out_of_time:
+                del self.inflight[seq]
+                self.gave_up += 1
+                entry.finish(False)
+                if self.on_give_up is not None:
+                    self.on_give_up(entry)
+
+                continue
+
+            entry.rto = min(MAX_RTO, entry.rto * RTO_BACKOFF)
+            self.retransmits += 1
+            self.transmit(entry)
+            self.wheel.schedule(seq, self.next_deadline(entry, now))
+
+    def on_tick(self):
+        self.tick_handle = None
+        self.expire()
+        if self.inflight:
+            self.start_ticking()
+
+    def start_ticking(self):
+        """Schedule the next wheel tick if one isn't already pending."""
+        if self.tick_handle is not None:
+            return
+
+        loop = get_running_loop()
+        if loop is None:
+            return
+
+        self.tick_handle = loop.call_later(self.wheel.tick, self.on_tick)
+
+    def stop_ticking(self):
+        """Cancel the pending wheel tick."""
+        if self.tick_handle is not None:
+            self.tick_handle.cancel()
+            self.tick_handle = None
+
+    def close(self):
+        """Stop retransmitting and fail everything in flight."""
+        self.stop_ticking()
+        entries = list(self.inflight.values())
+        self.inflight.clear()
+        self.wheel.clear()
+        for entry in entries:
+            entry.finish(False)
+
+    def stats(self):
+        """Return the queue's counters as a plain dict."""
+        return {
+            "inflight": len(self.inflight),
+            "sent": self.sent,
+            "retransmits": self.retransmits,
+            "acked": self.acked,
+            "gave_up": self.gave_up,
+            "peers": len(self.peers),
+        }
@@ -2,33 +2,110 @@
 Extended functionality to allow the UDP stream class to provide 'reliable'
 packet delivery. It uses message IDs for each message and acknowledgements.
 It doesn't guarantee ordered delivery. Inherited by udp_stream.
+Retransmissions are handled by a per-pipe RetransmitQueue (ack_retransmit.)
+
+Wire format: [seq u64][flag u8][payload]. Flag 0 is a message that
+needs an ACK and flag 1 is the ACK for seq. With rudp_sack set
+(on both ends -- older peers would route SACKs as messages) ACKs
+are held for rudp_ack_delay seconds and sent as flag 2: the lowest
+seq followed by a bitmap where bit i (MSB first) means seq + i was
+received. Senders in this mode number messages sequentially so one
+SACK covers a whole burst.
 """
 
 import asyncio
 import struct
 import random
 from struct import pack
-from ..utility.utils import async_wrap_errors, rm_done_tasks, timestamp, to_b
+from ..utility.utils import async_wrap_errors, rm_done_tasks, timestamp, get_running_loop
+from .ack_retransmit import RetransmitQueue
+from .msg_dedup import MsgDedup
 
+# Flag byte after the sequence number.
+ACK_FLAG_MSG = 0
+ACK_FLAG_ACK = 1
+ACK_FLAG_SACK = 2
 
-UDP_MAX_DICT_LEN = 1000
+# Most sequence numbers one SACK can cover.
+SACK_MAX_BITS = 256
+
+SEQ_MAX = 2 ** (8 * 8)
+
+
+def sack_bitmap(base, seqs):
+    """Bitmap where bit i (MSB first) means base + i is in seqs."""
+    if not seqs:
+        return b""
+
+    bitmap = bytearray((max(seqs) - base) // 8 + 1)
+    for seq in seqs:
+        offset = seq - base
+        bitmap[offset >> 3] |= 0x80 >> (offset & 7)
+
+    return bytes(bitmap)
+
+
+def pack_sacks(seqs):
+    """Return the SACK messages covering the sequence numbers in seqs."""
+    out = []
+    seqs = sorted(seqs)
+    i = 0
+    while i < len(seqs):
+        base = seqs[i]
+        run = []
+        while i < len(seqs) and seqs[i] - base < SACK_MAX_BITS:
+            run.append(seqs[i])
+            i += 1
+
+        out.append(pack("!QB", base, ACK_FLAG_SACK) + sack_bitmap(base, run))
+
+    return out
+
+
+def unpack_sack(base, bitmap):
+    """Return the sequence numbers a SACK bitmap (see sack_bitmap) marks as received."""
+    seqs = []
+    for byte_no, byte in enumerate(bitmap[:SACK_MAX_BITS // 8]):
+        if not byte:
+            continue
+
+        for bit in range(8):
+            if byte & (0x80 >> bit):
+                seqs.append(base + byte_no * 8 + bit)
+
+    return seqs
 
 
 class ACKUDP:
     """Mixin that adds reliable delivery over UDP via sequence numbers and acknowledgements."""
     def __init__(self):
-        self.seq = {}  # Waiting for acks.
+        # Sent messages waiting for acks.
+        self.rtx = RetransmitQueue(self.send_many, sendv=self.sendv)
+        self.seq = self.rtx.inflight  # [seq] = InFlight.
         self.ack_send_tasks = []
 
+        # Next seq for rudp_sack mode.
+        self.next_seq = random.randrange(1, SEQ_MAX // 2)
+
+        # [client_tup] = {seq, ...} waiting for a delayed SACK.
+        self.sack_pending = {}
+        self.sack_handle = None
+
     # Returns a sequence number if a message is an ack.
     def is_ack(self, data, stream):
-        """Return the sequence number from data if it is an ACK message, otherwise return None."""
+        """
+        Return the sequence number from data if it is an ACK message, a list of
+        them if it's a SACK, otherwise return None.
+        """
         if len(data) >= 9:
             (seq,) = struct.unpack("!Q", data[0:8])
             is_ack = data[8]
-            if is_ack == 1:
+            if is_ack == ACK_FLAG_ACK:
                 return seq
 
+            if is_ack == ACK_FLAG_SACK:
+                return unpack_sack(seq, data[9:])
+
         return None
 
     # Received message that needs to be acked.
@@ -42,9 +119,9 @@ class ACKUDP:
         else:
             return [None, None, None]
 
-        if is_ack == 0:
+        if is_ack == ACK_FLAG_MSG:
             # Build ack message to send in response.
-            ack = struct.pack("!Q", seq) + struct.pack("!B", 1)
+            ack = pack("!QB", seq, ACK_FLAG_ACK)
 
         return [seq, ack, data[9:]]
 
@@ -58,18 +135,27 @@ class ACKUDP:
         f_is_ack,
         f_is_ackable,
         f_send,
+        client_tup=None,
     ):
-        """Process an incoming packet for ACK or ackable content and return a status code with the stripped payload."""
+        """
+        Process an incoming packet for ACK or ackable content and return a status
+        code with the stripped payload. ACKs are sent with f_send. In rudp_sack
+        mode, ACKs from the built-in is_ackable for a known client_tup are
+        instead delayed and merged into SACKs.
+        """
         self.ack_send_tasks = rm_done_tasks(self.ack_send_tasks)
         payload = recv_seq = ack_seq = ack = None
         self.timestamp = timestamp()
 
         # If this message is an ack then record its seq no.
+        # SACKs (and custom is_ack hooks) may give a list of them.
         if f_is_ack is not None:
             ack_seq = f_is_ack(data, self)
             if ack_seq is not None:
-                if ack_seq in self.seq:
-                    self.seq[ack_seq].set()
+                if isinstance(ack_seq, (list, tuple)):
+                    self.rtx.ack_many(ack_seq)
+                else:
+                    self.rtx.ack(ack_seq)
 
                 return 0, payload
 
@@ -84,35 +170,65 @@ class ACKUDP:
                 # Seq is set when sending.
                 # If they give us back our seq take it as an ACK
                 # even if they didn't set the ACK flag.
-                if recv_seq in self.seq:
-                    # Pretend we received an ACK for our message.
-                    self.seq[recv_seq].set()
-
+                # Pretend we received an ACK for our message.
+                if self.rtx.ack(recv_seq):
                     # Don't broadcast an ACK for this.
                     ack = None
 
-        # Keep dicts from taking up too much memory.
-        # Only prune completed entries — wiping the whole dict races any
-        # concurrent ack_send worker waiting on self.seq[seq].wait().
-        if len(self.seq) > UDP_MAX_DICT_LEN:
-            done_keys = [k for k, e in self.seq.items() if e.is_set()]
-            for k in done_keys:
-                del self.seq[k]
+        if ack is None:
+            return 1, payload
+
+        # Our own ACK format: merge it into a delayed SACK.
+        if client_tup is not None and f_is_ackable == self.is_ackable:
+            if self.conf.get("rudp_sack"):
+                self.queue_sack(recv_seq, client_tup)
+                return 2, payload
 
         # The TURN client implements a custom is_ackable that wraps an ACK
         # in a channel message which allows the server to deliver the message.
-        if ack is not None:
-            task = asyncio.create_task(async_wrap_errors(f_send(ack)))
-
-            self.ack_send_tasks.append(task)
-            return 2, payload
+        task = asyncio.create_task(async_wrap_errors(f_send(ack)))
+        self.ack_send_tasks.append(task)
 
-        return 1, payload
+        return 2, payload
+
+    def queue_sack(self, seq, client_tup):
+        """Hold the ACK for seq and send it with others in one SACK shortly."""
+        pending = self.sack_pending.get(client_tup)
+        if pending is None:
+            pending = self.sack_pending[client_tup] = set()
+
+        pending.add(seq)
+        if self.sack_handle is None:
+            loop = self.loop or get_running_loop()
+            self.sack_handle = loop.call_later(
+                self.conf.get("rudp_ack_delay", 0.005), self.flush_sacks
+            )
+
+    def flush_sacks(self):
+        """Send every held ACK now: one SACK per peer per run of sequence numbers."""
+        self.sack_handle = None
+        pending, self.sack_pending = self.sack_pending, {}
+        items = []
+        for client_tup, seqs in pending.items():
+            for sack in pack_sacks(seqs):
+                items.append((sack, client_tup))
+
+        if items:
+            self.send_many(items)
+
+    def cancel_sacks(self):
+        """Drop held ACKs and the pending SACK flush."""
+        if self.sack_handle is not None:
+            self.sack_handle.cancel()
+            self.sack_handle = None
+
+        self.sack_pending = {}
 
     # Retransmits a UDP packet up to 'tries' times or 'sock_timeout' seconds.
-    # If an acknowledgement arrives before an error condition the function
-    # returns successfully. Events are used to wait on ACKs so there are no
-    # busy-loop checks.
+    # Resends are driven by the pipe's RetransmitQueue using an RTO
+    # estimated from the peer's RTT. The returned InFlight is awaitable
+    # (True if ACKed) and has the is_set() / wait() of an asyncio.Event
+    # so it's returned for both the task and event of the old API.
     async def ack_send(
         self,
         data,
@@ -121,94 +237,39 @@ class ACKUDP:
         sock_timeout=0,
         tries=3,
     ):
-        # Keep sending until max sends reached.
-        # For acks we send max transmits as they're small messages.
         if seq is None:
-            seq = random.randrange(1, (2 ** (8 * 8)))
+            if self.conf.get("rudp_sack"):
+                # Sequential so a peer's SACK bitmap covers a burst.
+                seq = self.next_seq
+                self.next_seq = seq + 1 if seq + 1 < SEQ_MAX else 1
+            else:
+                seq = random.randrange(1, SEQ_MAX)
 
         # Mark all messages we send in the same data structure clients use to
         # indicate whether they have acknowledged a message. This prevents
         # the sender from getting into loops.
-        event = asyncio.Event()
-        self.seq[seq] = event
-
-        # Do the sending concurrently so event can be returned.
-        async def worker():
-            # Record when the process started.
-            start = 0
-            if sock_timeout:
-                start = timestamp()
-
-            # Build data to send.
-            buf = bytearray().join([pack("!Q", seq), pack("!B", 0), memoryview(data)])
-
-            # Await on ACK events.
-            # Break on transmits >= tries, timeout, or success.
-            send_transmits = 0
-            while True:
-                # Initial send.
-                await self.send(buf, dest_tup)
-                send_transmits += 1
-
-                # Finish trying to send.
-                # First failure mode reached.
-                if send_transmits >= tries:
-                    break
-
-                # Recheck for ack every second.
-                try:
-                    # Will return instantly on receiving a related ACK.
-                    # Otherwise it suspends for other code to execute.
-                    if seq not in self.seq:
-                        break
-                    await asyncio.wait_for(self.seq[seq].wait(), 3)
-
-                    # No timeout error = success.
-                    break
-                except asyncio.TimeoutError:
-                    pass
-
-                # Too much time passed.
-                # Second failure mode reached.
-                if sock_timeout:
-                    elapsed = timestamp() - start
-                    if elapsed >= sock_timeout:
-                        break
-
-            # Do cleanup.
-            if seq in self.seq:
-                del self.seq[seq]
-
-        # Schedule sending task.
-        task = asyncio.create_task(worker())
-        self.ack_send_tasks.append(task)
+        # Header and payload go out as two iovecs. Mutable payloads
+        # are copied once since they're kept for resends.
+        if not isinstance(data, bytes):
+            data = bytes(data)
 
-        # Wait for ACK.
-        return task, event
+        buf = [pack("!QB", seq, ACK_FLAG_MSG), data]
+        entry = self.rtx.add(seq, buf, dest_tup, tries, sock_timeout)
+        return entry, entry
 
 
 class BaseACKProto(asyncio.Protocol):
     """Base asyncio.Protocol providing duplicate-message detection for UDP streams."""
     def __init__(self, conf):
         self.conf = conf
+        self.msg_dedup = None
 
     # Supports dropping duplicate messages.
     def is_unique_msg(self, pipe, data, client_tup):
         """Return 1 if data has not been seen before from client_tup, or 0 if it is a duplicate."""
-        # Reset seen msgs after dict fills.
-        if len(self.msg_ids) > self.conf["max_msg_ids"]:
-            self.msg_ids = {}
-
-        # Record msg -- drop if already seen.
-        # Route by client endpoint.
         # Seen messages are per client IP.
-        buf = to_b(client_tup[0]) + data
-
-        # Python's built-in hash is intentionally used here over a
-        # cryptographic hash. A secure hash (SHA-256 etc.) would be
-        # 100+ ms per message and destroy event loop performance.
-        msg_id = hash(buf)
-        if msg_id in self.msg_ids:
-            return 0
-        self.msg_ids[msg_id] = 1
-        return 1
+        # Built on first use so pipes without msg IDs don't pay for it.
+        if self.msg_dedup is None:
+            self.msg_dedup = MsgDedup.from_conf(self.conf)
+
+        return 1 if self.msg_dedup.is_unique(client_tup[0], data) else 0
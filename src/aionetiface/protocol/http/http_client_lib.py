@@ -7,6 +7,7 @@ import re
 import urllib.parse
 from ...net.net_defs import IP4, TCP, NET_CONF, FakeSocket, SUB_ALL
 from ...net.pipe.pipe import Pipe
+from ...net.pipe.pipe_pool import get_pipe_pool
 from ...net.address import resolv_dest
 from ...utility.utils import fstr, log, log_exception, to_b, to_s, async_wrap_errors
 
@@ -174,6 +175,23 @@ def Payload(f, url=None, body=b""):
     return wrapper
 
 
+async def open_web_pipe(addr, route, conf, pool):
+    """Return (pipe, reused) for a request to addr -- from pool if it's set."""
+    if pool is not None:
+        p = pool.get_idle(route, addr, conf)
+        if p is not None:
+            return p, True
+
+        return await pool.open(route, addr, conf), False
+
+    return await Pipe(TCP, addr, route, conf=conf).connect(), False
+
+
+def is_keep_alive(headers):
+    """True if a response's headers let the connection carry another request."""
+    return re.search(rb"(?im)^connection: *keep-alive\b", headers) is not None
+
+
 # Returns pipe, ParseHTTPResponse
 async def do_web_req(
     addr,
@@ -181,29 +199,54 @@ async def do_web_req(
     do_close,
     route,
     conf=None,
+    pool=None,
 ):
+    """
+    Send http_buf to addr and read the response. With a PipePool the
+    connection is taken from and handed back to the pool (and None is
+    returned for the pipe.) A reused connection that the server closed
+    before responding is retried on another one.
+    """
     if conf is None:
         conf = NET_CONF
     log(fstr("{0}", (addr,)))
 
-    # Open TCP connection to HTTP server.
-    p = None
-    try:
-        p = await Pipe(TCP, addr, route, conf=conf).connect()
-    except (OSError, ConnectionError, asyncio.TimeoutError):
-        log_exception()
+    while True:
+        # Open TCP connection to HTTP server.
         p = None
+        reused = False
+        try:
+            p, reused = await open_web_pipe(addr, route, conf, pool)
+        except (OSError, ConnectionError, asyncio.TimeoutError):
+            log_exception()
+            p = None
+
+        # Error return empty.
+        if p is None:
+            return None, None
+        try:
+            p.subscribe(SUB_ALL)
+            await p.send(http_buf, addr)
+        except (OSError, ConnectionError):
+            log_exception()
+            if pool is not None:
+                pool.checkin(p, reuse=False)
+            else:
+                await p.close()
+
+            # An idle connection the server already closed: try another.
+            if reused:
+                continue
+
+            return None, None
+
+        # Wait for the first part of the response.
+        buf = await p.recv(SUB_ALL, timeout=conf["recv_timeout"])
+        if buf or not reused or not p.on_close.is_set():
+            break
 
-    # Error return empty.
-    if p is None:
-        return None, None
-    try:
-        p.subscribe(SUB_ALL)
-        await p.send(http_buf, addr)
-    except (OSError, ConnectionError):
-        log_exception()
-        await p.close()
-        return None, None
+        # An idle connection closed under the request: try a new one.
+        pool.checkin(p, reuse=False)
 
     # Read TCP stream until headers contain Content-Length
     out = b""
@@ -211,10 +254,7 @@ async def do_web_req(
     hdr_ended = False
     headers = b""
     content = b""
-    while True:
-        buf = await p.recv(SUB_ALL, timeout=conf["recv_timeout"])
-        if not buf:
-            break
+    while buf:
         out += buf
 
         # Check if headers end and find Content-Length.
@@ -227,6 +267,8 @@ async def do_web_req(
                 content_len = int(content_len_search.group(1))
                 break
 
+        buf = await p.recv(SUB_ALL, timeout=conf["recv_timeout"])
+
     # Split raw response into header block and initial body bytes.
     if hdr_ended:
         parts = re.split(b"\r\n\r\n", out, maxsplit=1)
@@ -241,8 +283,19 @@ async def do_web_req(
                 break
             content += buf
 
+    # Pooled connections go back to the pool if the server keeps them
+    # open and the whole body was read.
+    if pool is not None:
+        pool.checkin(
+            p,
+            reuse=content_len > 0
+            and len(content) == content_len
+            and is_keep_alive(headers),
+        )
+        p = None
+
     # Some connections may be left open.
-    if do_close:
+    elif do_close:
         await p.close()
         p = None
 
@@ -269,6 +322,9 @@ class WebCurl:
         resp.pipe   # open TCP connection, if do_close=0
         resp.out    # raw response body bytes
         resp.info   # parsed ParseHTTPResponse object
+
+    With a PipePool (pool=..., or conf["pipe_pool"] for the shared
+    pool) requests ask for keep-alive and reuse idle connections.
     """
 
     def __init__(
@@ -278,6 +334,7 @@ class WebCurl:
         throttle=0,
         do_close=1,
         hdrs=None,
+        pool=None,
     ):
         self.addr = addr
         self.route = route
@@ -288,6 +345,7 @@ class WebCurl:
         self.path = self.info = None
         self.throttle = throttle
         self.do_close = do_close
+        self.pool = pool
 
     # Returns a deep copy of this client for use in concurrent requests.
     def copy(self):
@@ -303,6 +361,7 @@ class WebCurl:
         client.req_buf = self.req_buf
         client.throttle = self.throttle
         client.do_close = self.do_close
+        client.pool = self.pool
         return client
 
     def vars(
@@ -342,6 +401,13 @@ class WebCurl:
             client.body = json.dumps(client.body)
             hdrs.append([b"Content-Type", b"application/json"])
 
+        # Pooled connections are kept open by the server.
+        pool = client.pool
+        if pool is None and conf.get("pipe_pool"):
+            pool = get_pipe_pool(conf)
+        if pool is not None:
+            hdrs = hdrs + [[b"Connection", b"keep-alive"]]
+
         # Build a HTTP request to send to server.
         af = client.route.af
         nic = client.route.interface
@@ -362,7 +428,8 @@ class WebCurl:
             await asyncio.sleep(client.throttle)
 
         # Make the HTTP request to the server.
-        route = await client.route.bind()
+        await client.route.bind()
+        route = client.route
         addr = await resolv_dest(af, client.addr, nic)
         ret = await async_wrap_errors(
             do_web_req(
@@ -371,6 +438,7 @@ class WebCurl:
                 http_buf=req_buf,
                 do_close=client.do_close,
                 conf=conf,
+                pool=pool,
             )
         )
 
@@ -0,0 +1,142 @@
+"""
+Duplicate message filter for pipes with enable_msg_ids set.
+
+Seen messages are kept per peer IP so one busy peer can't push
+another peer's history out. Each peer has two generations of
+message hashes: the current one and the one before it. Time is
+cut into slots of window / 2 seconds and when a peer's slot
+changes the current generation becomes the previous one and a
+new one starts -- so a message is remembered for between half a
+window and a full window. Nothing is ever wiped all at once, so
+there's no burst of accepted duplicates after a reset.
+
+Memory is bounded two ways:
+
+    - max_ids: hashes kept per peer. A generation that fills up
+      rotates early (shortening the window for that peer only.)
+    - max_peers: peers tracked. The least recently seen peer is
+      forgotten first.
+
+Only the hash of each payload is stored and it's computed on
+the payload as received (bytes cache their own hash) -- no
+peer + payload concatenation.
+"""
+
+import time
+from collections import OrderedDict
+
+__all__ = [
+    "MsgDedup",
+]
+
+
+class PeerHistory:
+    """Two generations of message hashes for one peer."""
+
+    __slots__ = ("slot", "cur", "prev")
+
+    def __init__(self, slot):
+        self.slot = slot
+        self.cur = set()
+        self.prev = set()
+
+
+class MsgDedup:
+    """Per-peer, time-windowed set of recently seen messages."""
+
+    def __init__(self, window=30, max_ids=1000, max_peers=256, clock=time.monotonic):
+        if window <= 0:
+            raise ValueError("Message ID window must be > 0.")
+
+        self.window = window
+        self.half_window = window / 2.0
+        self.max_ids = max_ids
+        self.gen_max = max(1, max_ids // 2)
+        self.max_peers = max_peers
+        self.clock = clock
+
+        # [peer] = PeerHistory, least recently seen first.
+        self.peers = OrderedDict()
+
+        # Counters.
+        self.dups = 0
+        self.forced_rotations = 0
+        self.evicted_peers = 0
+
+    @classmethod
+    def from_conf(cls, conf):
+        """Build a filter from a NET_CONF style dict."""
+        return cls(
+            window=conf.get("msg_id_window", 30),
+            max_ids=conf.get("max_msg_ids", 1000),
+            max_peers=conf.get("max_msg_id_peers", 256),
+        )
+
+    def __len__(self):
+        return sum(len(h.cur) + len(h.prev) for h in self.peers.values())
+
+    def get_peer(self, peer, slot):
+        """Return peer's history rotated up to slot."""
+        peers = self.peers
+        history = peers.get(peer)
+        if history is None:
+            if len(peers) >= self.max_peers:
+                peers.popitem(last=False)
+                self.evicted_peers += 1
+
+            history = peers[peer] = PeerHistory(slot)
+            return history
+
+        peers.move_to_end(peer)
+        if history.slot != slot:
+            if history.slot == slot - 1:
+                history.prev = history.cur
+            else:
+                # Quiet for more than a window: forget everything.
+                history.prev = set()
+
+            history.cur = set()
+            history.slot = slot
+
+        return history
+
+    def is_unique(self, peer, data):
+        """Record data from peer. Return False if it was seen within the window."""
+        try:
+            msg_id = hash(data)
+        except TypeError:
+            # bytearray / writable memoryview.
+            msg_id = hash(bytes(data))
+
+        slot = int(self.clock() / self.half_window)
+        history = self.get_peer(peer, slot)
+        if msg_id in history.cur or msg_id in history.prev:
+            self.dups += 1
+            return False
+
+        cur = history.cur
+        if len(cur) >= self.gen_max:
+            history.prev = cur
+            cur = history.cur = set()
+            self.forced_rotations += 1
+
+        cur.add(msg_id)
+        return True
+
+    def forget(self, peer):
+        """Drop everything remembered for peer."""
+        self.peers.pop(peer, None)
+
+    def clear(self):
+        """Drop everything."""
+        self.peers.clear()
+
+    def stats(self):
+        """Return the filter's counters as a plain dict."""
+        return {
+            "peers": len(self.peers),
+            "ids": len(self),
+            "dups": self.dups,
+            "forced_rotations": self.forced_rotations,
+            "evicted_peers": self.evicted_peers,
+        }
@@ -39,7 +39,7 @@ Note 2: I've read the STUN RFC and it seems to indicate that many of the fields
 
 import asyncio
 import time
-from ...errors import ErrorFeatureDeprecated
+from ...errors import ErrorFeatureDeprecated, ErrorNoReply
 from ...utility.utils import (
     async_wrap_errors,
     cancel_tasks,
@@ -57,7 +57,9 @@ from ...net.pipe.pipe import Pipe
 from ...net.bind.bind import Bind
 from .stun_defs import RFC3489, RFC5389, STUNAttrs
 from .stun_utils import get_stun_reply
+from .stun_transactions import STUNTransactionManager
 from ...servers import get_infra
+from ...nic.nat.server_scores import record_server
 from ...nic.route.route import Route
 
 
@@ -106,20 +108,48 @@ class STUNClient:
         self.dest = await resolv_dest(self.af, self.dest, self.interface)
         return await Pipe(self.proto, self.dest, route, conf=self.conf).connect()
 
+    # Send one request and close the pipe if it was opened here.
+    async def stun_request(self, pipe, reply_addr=None, attrs=None):
+        """
+        Send a binding request and return the reply from reply_addr
+        (default: the server.) pipe may also be a
+        STUNTransactionManager shared with other clients.
+        """
+        # Plain binding requests feed the server scoreboard. Change
+        # requests don't: few servers still support them.
+        started = time.monotonic()
+        try:
+            if isinstance(pipe, STUNTransactionManager):
+                self.dest = await resolv_dest(self.af, self.dest, self.interface)
+                reply = await pipe.request(
+                    self.dest, attrs, self.mode, reply_addr or self.dest
+                )
+            else:
+                caller_pipe = pipe
+                pipe = await self.get_dest_pipe(pipe)
+                try:
+                    reply = await get_stun_reply(
+                        self.mode, self.dest, reply_addr or self.dest, pipe, attrs or []
+                    )
+                finally:
+                    if caller_pipe is None and pipe is not None:
+                        await pipe.close()
+        except (ErrorNoReply, OSError, asyncio.TimeoutError):
+            if not attrs:
+                record_server(self.proto, self.dest, ok=False)
+            raise
+
+        if not attrs:
+            record_server(self.proto, self.dest, time.monotonic() - started)
+
+        return reply
+
     # Returns a STUN reply based on how client was setup.
     async def get_stun_reply(
         self, pipe=None, attrs=None
     ):
         """Send a STUN binding request with optional attributes and return the parsed reply."""
-        if attrs is None:
-            attrs = []
-        caller_pipe = pipe
-        pipe = await self.get_dest_pipe(pipe)
-        try:
-            return await get_stun_reply(self.mode, self.dest, self.dest, pipe, attrs)
-        finally:
-            if caller_pipe is None and pipe is not None:
-                await pipe.close()
+        return await self.stun_request(pipe, attrs=attrs)
 
     # Use a different port for the reply.
     async def get_change_port_reply(
@@ -143,19 +173,9 @@ class STUNClient:
         )
 
         # Flag to make the port change request.
-        caller_pipe = pipe
-        pipe = await self.get_dest_pipe(pipe)
-        try:
-            return await get_stun_reply(
-                self.mode,
-                self.dest,
-                reply_addr,
-                pipe,
-                [[STUNAttrs.ChangeRequest, b"\0\0\0\2"]],
-            )
-        finally:
-            if caller_pipe is None and pipe is not None:
-                await pipe.close()
+        return await self.stun_request(
+            pipe, reply_addr, [[STUNAttrs.ChangeRequest, b"\0\0\0\2"]]
+        )
 
     # Use a different IP and port for the reply.
     async def get_change_tup_reply(
@@ -168,30 +188,16 @@ class STUNClient:
             raise ErrorFeatureDeprecated(error)
 
         # Flag to make the tup change request.
-        caller_pipe = pipe
-        pipe = await self.get_dest_pipe(pipe)
-        try:
-            return await get_stun_reply(
-                self.mode, self.dest, ctup, pipe, [[STUNAttrs.ChangeRequest, b"\0\0\0\6"]]
-            )
-        finally:
-            if caller_pipe is None and pipe is not None:
-                await pipe.close()
+        return await self.stun_request(
+            pipe, ctup, [[STUNAttrs.ChangeRequest, b"\0\0\0\6"]]
+        )
 
     # Return only your remote IP.
     async def get_wan_ip(self, pipe=None):
         """Return the normalised WAN IP string reported by the STUN server, or None on failure."""
-        caller_pipe = pipe
-        pipe = await self.get_dest_pipe(pipe)
-        try:
-            reply = await get_stun_reply(self.mode, self.dest, self.dest, pipe)
-
-            if hasattr(reply, "rtup"):
-                return ip_norm(reply.rtup[0])
-        finally:
-            # Only close the pipe if we opened it ourselves.
-            if caller_pipe is None and pipe is not None:
-                await pipe.close()
+        reply = await self.stun_request(pipe)
+        if hasattr(reply, "rtup"):
+            return ip_norm(reply.rtup[0])
 
     # Return information on your local + remote port.
     # On success the pipe is intentionally left open and returned to the
@@ -304,11 +310,13 @@ async def get_n_stun_clients(
                     (af, stun.dest,
                      int((time.monotonic() - probe_t0) * 1000)),
                 ))
+                record_server(proto, stun.dest, time.monotonic() - probe_t0)
                 return stun
         except asyncio.CancelledError:
             raise
         except (OSError, ConnectionError, asyncio.TimeoutError):
             log_exception()
+        record_server(proto, stun.dest, ok=False)
         log(fstr(
             "[STUN-PROBE] af={0} dest={1} t={2}ms FAIL",
             (af, stun.dest, int((time.monotonic() - probe_t0) * 1000)),
@@ -361,8 +369,11 @@ async def get_n_stun_clients(
     try:
         await asyncio.wait_for(collect(), timeout=STUN_CAP)
     except asyncio.TimeoutError:
-        # Cap hit -- take whatever connected so far.
-        pass
+        # Cap hit -- take whatever connected so far. Servers that
+        # didn't answer within the cap count as failures.
+        for stun, task in zip(candidates, tasks):
+            if not task.done():
+                record_server(proto, stun.dest, ok=False)
     finally:
         # Cancel the still-pending probes (laggards / dead servers).
         for t in tasks:
@@ -1,9 +1,19 @@
-"""STUN message types, attribute codes, and encoding helpers."""
-from struct import pack
+"""
+STUN message types, attribute codes, and encoding helpers.
+
+The codec reads with precompiled Structs and unpack_from() over
+one memoryview of the message. Decoding a message indexes every
+attribute in one pass (STUNMsg.attrs() -- an offset table) so
+attribute data is sliced out of the original buffer rather than
+copied. Requests with the same mode and attributes only differ by
+transaction ID: stun_req_buf() copies a cached template and
+patches the 12 ID bytes in.
+"""
+from struct import pack, Struct
 import hmac
 import socket
 import hashlib
-from ...utility.utils import b_and, b_or, b_to_i, rand_b, xor_bufs
+from ...utility.utils import b_to_i, rand_b, xor_bufs
 from ...net.net_defs import IP4, IP6
 
 __all__ = [
@@ -20,6 +30,8 @@ __all__ = [
     "STUNMsgCodes",
     "STUNAddrTup",
     "STUNMsg",
+    "unpack_addr",
+    "stun_req_buf",
 ]
 
 STUN_CHANGE_NONE = 1
@@ -31,6 +43,19 @@ RFC3489 = 1
 RFC5389 = 2
 RFC8489 = 3
 
+# Type, length, magic cookie, transaction ID.
+STUN_HDR = Struct("!HH4s12s")
+
+# Type, length.
+ATTR_HDR = Struct("!HH")
+
+# Reserved, family, port (the IP follows.)
+ADDR_HDR = Struct("!xBH")
+
+# [(mode, attrs)] = request bytes with a zero transaction ID.
+REQ_TEMPLATES = {}
+REQ_TEMPLATES_MAX = 256
+
 
 def get_const_name(cls, val, type_):
     """Return the attribute name in cls whose value equals val and whose type matches type_, or an empty string."""
@@ -289,6 +314,61 @@ class STUNAddrTup:
         return "{}:{}".format(self.ip, self.port)
 
 
+def unpack_addr(data, port_mask=0, ip_mask=None):
+    """
+    Return (ip, port) from an address attribute's data. The family
+    comes from the attribute (see STUNAddrTup.get_attr_family.) For
+    XOR-* attributes port_mask is XORed into the port and ip_mask
+    (magic cookie + transaction ID) into the IP.
+    """
+    family, port = ADDR_HDR.unpack_from(data)
+    if family == 2:
+        af, ip_len = IP6, 16
+    else:
+        af, ip_len = IP4, 4
+
+    if len(data) < 4 + ip_len:
+        raise ValueError(
+            "STUN address attribute too short: need {} bytes, got {}".format(
+                4 + ip_len, len(data)
+            )
+        )
+
+    ip_buf = data[4:4 + ip_len]
+    if ip_mask is not None:
+        ip_buf = (
+            int.from_bytes(ip_buf, "big") ^ int.from_bytes(ip_mask[:ip_len], "big")
+        ).to_bytes(ip_len, "big")
+
+    return socket.inet_ntop(af, ip_buf), port ^ port_mask
+
+
+def stun_req_buf(mode, attrs=None, txn_id=None):
+    """
+    Return (txn_id, buf) for a Binding request with attrs (a list of
+    [attr_code, attr_data]) and a transaction counter of 1. The
+    message is built once per (mode, attrs) and copied after that.
+    """
+    key = (mode, tuple((bytes(code), bytes(data)) for code, data in attrs or ()))
+    template = REQ_TEMPLATES.get(key)
+    if template is None:
+        msg = STUNMsg(mode=mode)
+        for attr_code, attr_data in key[1]:
+            msg.write_attr(attr_code, attr_data)
+
+        msg.write_transaction_counter(1)
+        msg.txn_id = bytes(12)
+        if len(REQ_TEMPLATES) >= REQ_TEMPLATES_MAX:
+            REQ_TEMPLATES.clear()
+
+        template = REQ_TEMPLATES[key] = msg.pack()
+
+    txn_id = rand_b(12) if txn_id is None else txn_id
+    buf = bytearray(template)
+    buf[8:20] = txn_id
+    return txn_id, buf
+
+
 class STUNMsg:
     """Build, pack, decode, and iterate over attributes of a STUN protocol message."""
     def __init__(
@@ -303,6 +383,7 @@ class STUNMsg:
         self.txn_id = rand_b(12)  # type: bytes
         self.msg = bytearray()
         self.attr_cursor = 0  # type: int
+        self.attr_table = None
         self.mode = mode
 
         # To enable RFC 3489 compatibility the magic cookie is
@@ -316,6 +397,19 @@ class STUNMsg:
         """Clear all previously written attributes and reset the message length to zero."""
         self.msg_len = 0
         self.msg = bytearray()
+        self.attr_table = None
+
+    def own_msg(self):
+        """Return self.msg as a bytearray this message owns.
+
+        decode() leaves self.msg as a view into the caller's receive
+        buffer; it's copied the first time the message is changed or
+        packed so the buffer can be released.
+        """
+        if not isinstance(self.msg, bytearray):
+            self.msg = bytearray(self.msg)
+
+        return self.msg
 
     def write_attr(self, attr, *data, fmt=None):
         """Append a STUN attribute with the given code and data (optionally struct-formatted) to the message buffer."""
@@ -333,17 +427,16 @@ class STUNMsg:
         if len(data) % 4 != 0:
             padding = b"\x00" * (4 - len(data) % 4)
 
-        buf = bytearray().join(
-            [
-                memoryview(attr),
-                memoryview(pack("!H", len(data))),
-                memoryview(data),
-                memoryview(padding),
-            ]
-        )
-
-        self.msg_len += len(buf)
-        self.msg += buf
+        # Appended in place: no per-attribute buffer.
+        msg = self.own_msg()
+        before = len(msg)
+        msg += attr
+        msg += pack("!H", len(data))
+        msg += data
+        msg += padding
+        self.msg = msg
+        self.msg_len += len(msg) - before
+        self.attr_table = None
 
     def write_credential(self, username, realm, nonce=b""):
         """Write Username, Realm, and Nonce attributes into the message for long-term credential authentication."""
@@ -407,41 +500,78 @@ class STUNMsg:
     def __bytes__(self):
         return b""
 
-    def pack(self):
-        """Serialise the message header and all written attributes into a complete STUN wire-format byte string."""
+    def attrs(self):
+        """
+        Return [(attr_type, offset, length)] for every attribute in
+        the message body -- offsets into self.msg. Built in one pass
+        on first use.
+        """
+        table = self.attr_table
+        if table is not None:
+            return table
+
+        table = []
+        body = self.msg
+        body_len = len(body)
+        offset = 0
+        while offset + 4 <= body_len:
+            attr_type, attr_len = ATTR_HDR.unpack_from(body, offset)
+            offset += 4
+            if offset + attr_len > body_len:
+                raise Exception("TURN attribute len invalid.")
+
+            table.append((attr_type, offset, attr_len))
+
+            # Rule of block 4.
+            offset += (attr_len + 3) & ~3
+
+        self.attr_table = table
+        return table
+
+    def get_attr(self, attr):
+        """Return the data of the first attr (code bytes or int) or None."""
+        if not isinstance(attr, int):
+            attr = int.from_bytes(attr, "big")
+
+        for attr_type, offset, attr_len in self.attrs():
+            if attr_type == attr:
+                return memoryview(self.msg)[offset:offset + attr_len]
+
+        return None
+
+    def pack_iov(self):
+        """Return [header, attributes] for sendv() -- the wire format without joining them."""
         # Starting with RFC 5389 and on a more complex
         # bit scheme is used for the message type.
+        msg_type = int.from_bytes(self.msg_type, "big")
         if self.mode != RFC3489:
-            msg_type = b_and(b_or(self.msg_type, self.msg_code), b"\x3f\xff")
-        else:
-            msg_type = self.msg_type
-
-        return bytes().join(
-            [
-                msg_type,
-                pack("!H", self.msg_len),
-                self.magic_cookie,
-                self.txn_id,
-                self.msg,
-            ]
+            msg_type = (msg_type | int.from_bytes(self.msg_code, "big")) & 0x3FFF
+
+        hdr = STUN_HDR.pack(
+            msg_type, self.msg_len, bytes(self.magic_cookie), bytes(self.txn_id)
         )
+        return [hdr, self.own_msg()]
+
+    def pack(self):
+        """Serialise the message header and all written attributes into a complete STUN wire-format byte string."""
+        return b"".join(self.pack_iov())
 
     def decode(self, msg):
         """Populate this instance's fields from a raw STUN byte buffer and return any trailing bytes."""
-        # Unpack data from buffer using memory views.
-        msg_len = len(msg)
+        # Attribute data is sliced from this view -- not copied.
+        view = memoryview(msg)
+        msg_len = len(view)
         self.attr_cursor = 0
+        self.attr_table = None
         if msg_len >= 20:
             # Unpack message fields.
-            self.msg_type = msg[0:2]
-            self.msg_len = b_to_i(msg[2:4], "big")
-            self.magic_cookie = msg[4:8]
-            self.txn_id = msg[8:20]
+            msg_type, self.msg_len, self.magic_cookie, self.txn_id = STUN_HDR.unpack_from(view)
+            self.msg_type = msg_type.to_bytes(2, "big")
 
             # Make sure message len accurately reflects size.
             if self.msg_len:
-                if 20 + (self.msg_len - 1) <= msg_len - 1:
-                    self.msg = msg[20 : 20 + self.msg_len]
+                if 20 + self.msg_len <= msg_len:
+                    self.msg = view[20 : 20 + self.msg_len]
 
                     # ret data left in buffer, usually NULL
                     return msg[20 + self.msg_len :]
@@ -0,0 +1,278 @@
+"""
+In-process STUN server for local NAT tests and benchmarks.
+
+Answers Binding requests on UDP and TCP in both RFC 3489 mode
+(no magic cookie: MAPPED-ADDRESS, SOURCE-ADDRESS, CHANGED-ADDRESS)
+and RFC 5389 mode (XOR-MAPPED-ADDRESS.) Point STUNClient,
+fast_nat_test or delta_test at it instead of the public servers
+in servers.json:
+
+    serv = STUNServer()
+    await serv.listen_stun(nic, ips=["127.0.0.1", "127.0.0.2"], ports=[0, 0])
+    dest = serv.addrs[(0, 0)]
+
+With two IPs and two ports the server listens on all four
+combinations and honours CHANGE-REQUEST: the reply is sent from
+the socket with the other IP and/or port. A change that can't be
+honoured (no second IP or port, or a TCP connection) gets no
+reply -- the client's reply address check would reject it anyway.
+
+Replies are built straight from the request bytes by a sync
+message callback: no task or STUNMsg per transaction.
+"""
+
+import socket
+from struct import Struct
+from ...net.net_defs import IP4, IP6, TCP, UDP
+from ...net.daemon import Daemon, DAEMON_CONF
+from .stun_defs import STUN_MAGIC_COOKIE
+
+__all__ = [
+    "STUNServer",
+]
+
+# Type, length.
+STUN_HDR = Struct("!HH")
+ATTR_HDR = Struct("!HH")
+
+# Reserved, family, port, IP.
+ADDR_V4 = Struct("!BBH4s")
+ADDR_V6 = Struct("!BBH16s")
+
+BINDING_REQUEST = 0x0001
+BINDING_SUCCESS = 0x0101
+
+ATTR_MAPPED_ADDRESS = 0x0001
+ATTR_CHANGE_REQUEST = 0x0003
+ATTR_SOURCE_ADDRESS = 0x0004
+ATTR_CHANGED_ADDRESS = 0x0005
+ATTR_XOR_MAPPED_ADDRESS = 0x0020
+
+# CHANGE-REQUEST flags.
+CHANGE_IP = 0x04
+CHANGE_PORT = 0x02
+
+# Largest partial message held per TCP connection.
+MAX_TCP_BUF = 2**16
+
+
+def addr_attr(attr, ip_b, port, mask=None):
+    """
+    Return an encoded address attribute. For XOR-* attributes mask
+    is the magic cookie and transaction ID.
+    """
+    if mask is not None:
+        port ^= 0x2112
+        ip_len = len(ip_b)
+        ip_b = (
+            int.from_bytes(ip_b, "big") ^ int.from_bytes(mask[:ip_len], "big")
+        ).to_bytes(ip_len, "big")
+
+    if len(ip_b) == 4:
+        body = ADDR_V4.pack(0, 1, port, ip_b)
+    else:
+        body = ADDR_V6.pack(0, 2, port, ip_b)
+
+    return ATTR_HDR.pack(attr, len(body)) + body
+
+
+def ip_bytes(ip):
+    """Return ip as packed bytes (v4 mapped v6 addresses as v4.)"""
+    if ip.startswith("::ffff:") and "." in ip:
+        ip = ip[7:]
+
+    if ":" in ip:
+        return socket.inet_pton(socket.AF_INET6, ip.split("%")[0])
+
+    return socket.inet_pton(socket.AF_INET, ip)
+
+
+def get_change_flags(buf, msg_end):
+    """Return the CHANGE-REQUEST flags in a request's attributes (0 if none.)"""
+    offset = 20
+    while offset + 4 <= msg_end:
+        attr, attr_len = ATTR_HDR.unpack_from(buf, offset)
+        offset += 4
+        if attr == ATTR_CHANGE_REQUEST and attr_len >= 4:
+            return buf[offset + 3]
+
+        offset += (attr_len + 3) & ~3
+
+    return 0
+
+
+class STUNServer(Daemon):
+    """Daemon answering STUN Binding requests with CHANGE-REQUEST support."""
+
+    def __init__(self, conf=DAEMON_CONF):
+        super().__init__(conf)
+
+        # [(ip_index, port_index)] = (ip, port) for listening sockets.
+        self.addrs = {}
+
+        # [(ip_index, port_index)] = UDP server PipeEvents.
+        self.slots = {}
+
+        # [UDP server PipeEvents] = (ip_index, port_index).
+        self.slot_of = {}
+
+        # [client PipeEvents] = partial TCP message.
+        self.tcp_bufs = {}
+
+        # Counters.
+        self.replies = 0
+        self.changed = 0
+        self.unsupported = 0
+        self.invalid = 0
+
+    async def listen_stun(self, nic, ips, ports=(3478, 3479), protos=(UDP, TCP)):
+        """
+        Listen on every combination of ips and ports (one or two of
+        each) for each proto. A port of 0 picks a free port for the
+        first IP that's reused for the second. Returns self.addrs.
+        """
+        ips = list(ips)[:2]
+        ports = list(ports)[:2]
+        for port_index in range(len(ports)):
+            for ip_index, ip in enumerate(ips):
+                port = ports[port_index]
+                for proto in protos:
+                    pipe = await self.listen_stun_addr(nic, proto, ip, port)
+                    port = ports[port_index] = pipe.sock.getsockname()[1]
+                    if proto == UDP:
+                        self.slots[(ip_index, port_index)] = pipe.pipe_events
+                        self.slot_of[pipe.pipe_events] = (ip_index, port_index)
+
+                self.addrs[(ip_index, port_index)] = (ip, port)
+
+        return self.addrs
+
+    async def listen_stun_addr(self, nic, proto, ip, port):
+        """Start one listening pipe on (ip, port.)"""
+        af = IP6 if ":" in ip else IP4
+        route = nic.route(af)
+        await route.bind(ips=ip, port=port)
+        _, pipe = await self.add_listener(proto, route)
+        if proto == TCP:
+            pipe.add_end_cb(self.end_cb)
+
+        return pipe
+
+    def end_cb(self, msg, client_tup, pipe):
+        """Forget a closed TCP connection's partial message."""
+        self.tcp_bufs.pop(pipe, None)
+
+    def msg_cb(self, msg, client_tup, pipe):
+        """Answer every complete Binding request in msg."""
+        if pipe.proto == UDP:
+            self.reply(msg, client_tup, pipe, UDP)
+            return
+
+        # TCP: messages may be split or joined by the stream.
+        buf = self.tcp_bufs.pop(pipe, b"")
+        buf = buf + msg if buf else msg
+        offset = 0
+        buf_len = len(buf)
+        while buf_len - offset >= 20:
+            msg_len = 20 + STUN_HDR.unpack_from(buf, offset)[1]
+            if buf_len - offset < msg_len:
+                break
+
+            self.reply(buf[offset:offset + msg_len], client_tup, pipe, TCP)
+            offset += msg_len
+
+        if offset < buf_len:
+            if buf_len - offset > MAX_TCP_BUF:
+                self.invalid += 1
+                return
+
+            self.tcp_bufs[pipe] = buf[offset:]
+
+    def reply(self, buf, client_tup, pipe, proto):
+        """Send the response for one request."""
+        if len(buf) < 20:
+            self.invalid += 1
+            return
+
+        msg_type, msg_len = STUN_HDR.unpack_from(buf)
+        msg_end = 20 + msg_len
+        if msg_type != BINDING_REQUEST or msg_len & 3 or len(buf) < msg_end:
+            self.invalid += 1
+            return
+
+        # Which socket answers.
+        flags = get_change_flags(buf, msg_end) & (CHANGE_IP | CHANGE_PORT)
+        out_pipe = pipe
+        slot = None
+        if proto == UDP:
+            slot = self.slot_of.get(pipe)
+        elif pipe.sock is not None:
+            # A TCP connection answers from its server's address.
+            slot = self.slot_of_addr(pipe.sock.getsockname())
+
+        if flags:
+            if proto != UDP or slot is None:
+                self.unsupported += 1
+                return
+
+            ip_index, port_index = slot
+            if flags & CHANGE_IP:
+                ip_index ^= 1
+            if flags & CHANGE_PORT:
+                port_index ^= 1
+
+            out_pipe = self.slots.get((ip_index, port_index))
+            if out_pipe is None:
+                self.unsupported += 1
+                return
+
+            slot = (ip_index, port_index)
+            self.changed += 1
+
+        # Cookie and transaction ID are echoed back as they are.
+        txn = buf[4:20]
+        try:
+            ip_b = ip_bytes(client_tup[0])
+        except (OSError, ValueError):
+            self.invalid += 1
+            return
+
+        if txn[:4] == STUN_MAGIC_COOKIE:
+            attrs = [addr_attr(ATTR_XOR_MAPPED_ADDRESS, ip_b, client_tup[1], txn)]
+        else:
+            attrs = [addr_attr(ATTR_MAPPED_ADDRESS, ip_b, client_tup[1])]
+            if slot is not None:
+                ip_index, port_index = slot
+                attrs.append(self.slot_attr(ATTR_SOURCE_ADDRESS, slot))
+                other = (ip_index ^ 1, port_index ^ 1)
+                if other in self.addrs:
+                    attrs.append(self.slot_attr(ATTR_CHANGED_ADDRESS, other))
+
+        body = b"".join(attrs)
+        hdr = STUN_HDR.pack(BINDING_SUCCESS, len(body)) + bytes(txn)
+        if out_pipe.sendv([hdr, body], client_tup):
+            self.replies += 1
+
+    def slot_attr(self, attr, slot):
+        ip, port = self.addrs[slot]
+        return addr_attr(attr, ip_bytes(ip), port)
+
+    def slot_of_addr(self, sock_tup):
+        for slot, addr in self.addrs.items():
+            if addr[1] == sock_tup[1] and ip_bytes(addr[0]) == ip_bytes(sock_tup[0]):
+                return slot
+
+        return None
+
+    def stats(self):
+        """Daemon stats plus the server's transaction counters."""
+        out = super().stats()
+        out.update(
+            {
+                "replies": self.replies,
+                "changed": self.changed,
+                "unsupported": self.unsupported,
+                "invalid": self.invalid,
+            }
+        )
+        return out
@@ -0,0 +1,320 @@
+"""
+Many STUN transactions over one UDP pipe.
+
+get_stun_reply() subscribes a regex on the transaction ID for every
+request and retries with send_recv_loop(), so each reply is
+matched against every pending subscription and each request needs
+its own wait_for() timer. A STUNTransactionManager owns one pipe
+and keeps pending requests in a dict keyed by the 12-byte
+transaction ID. The reply callback does one lookup.
+
+Retransmissions follow RFC 5389 section 7.2.1: the first resend is
+after RTO, the gap doubles each time, at most Rc requests are
+sent, and the transaction fails Rm * RTO after the last one. With
+the defaults (0.5s, 7, 16) requests go out at 0, 0.5, 1.5, 3.5,
+7.5, 15.5 and 31.5s, and the transaction fails at 39.5s. A
+request can also be given an overall timeout. Every transaction
+runs off one TimerWheel and one loop.call_later() tick, like
+RetransmitQueue.
+
+    txm = await get_stun_txm(route)
+    replies = await asyncio.gather(
+        *[txm.request(dest, mode=RFC5389) for dest in servers]
+    )
+
+Replies look like get_stun_reply()'s: a decoded STUNMsg with rtup,
+ctup, pipe and stup set. CHANGE-REQUEST transactions pass the
+address the reply has to come from as reply_addr. Replies from
+anywhere else are dropped, as they are with the subscription.
+"""
+
+import time
+from ...errors import ErrorNoReply
+from ...utility.utils import fstr, log_exception, get_running_loop
+from ...net.net_defs import NET_CONF, UDP
+from ...net.timer_wheel import TimerWheel
+from ...net.pipe.pipe import Pipe
+from ...net.pipe.pipe_utils import norm_client_tup
+from .stun_defs import RFC5389, stun_req_buf
+from .stun_utils import stun_proto
+
+__all__ = [
+    "STUNTransaction",
+    "STUNTransactionManager",
+    "get_stun_txm",
+    "close_stun_txms",
+]
+
+# [(af, bind_tup, nic name)] = STUNTransactionManager.
+STUN_TXMS = {}
+
+
+class STUNTransaction:
+    """One request waiting for its reply."""
+
+    __slots__ = (
+        "txn_id",
+        "buf",
+        "dest",
+        "reply_addr",
+        "rto",
+        "tries",
+        "give_up_at",
+        "fut",
+    )
+
+    def __init__(self, txn_id, buf, dest, reply_addr, rto, give_up_at, fut):
+        self.txn_id = txn_id
+        self.buf = buf
+        self.dest = dest
+        self.reply_addr = reply_addr
+        self.rto = rto
+        self.tries = 0
+        self.give_up_at = give_up_at
+        self.fut = fut
+
+
+class STUNTransactionManager:
+    """Pending STUN requests on one UDP pipe, matched to replies by transaction ID."""
+
+    def __init__(self, pipe=None, rto=0.5, rc=7, rm=16, tick=0.01, clock=time.monotonic):
+        self.rto = rto
+        self.rc = max(1, rc)
+        self.rm = rm
+        self.clock = clock
+        self.wheel = TimerWheel(tick=tick, clock=clock)
+        self.tick_handle = None
+        self.owns_pipe = False
+
+        # [txn_id] = STUNTransaction.
+        self.pending = {}
+
+        # Counters.
+        self.sent = 0
+        self.retransmits = 0
+        self.replies = 0
+        self.timeouts = 0
+        self.stray = 0
+
+        # Replies to an existing pipe also reach its subscriptions.
+        self.pipe = pipe
+        if pipe is not None:
+            pipe.add_msg_cb(self.msg_cb)
+
+    @classmethod
+    def from_conf(cls, pipe=None, conf=None):
+        """Build a manager with the stun_rto, stun_rc and stun_rm settings in conf."""
+        conf = conf if conf is not None else NET_CONF
+        return cls(
+            pipe,
+            rto=conf.get("stun_rto", 0.5),
+            rc=conf.get("stun_rc", 7),
+            rm=conf.get("stun_rm", 16),
+        )
+
+    @classmethod
+    async def open(cls, route, conf=None):
+        """Return a manager on a new UDP pipe bound to route."""
+        txm = cls.from_conf(conf=conf)
+        pipe = Pipe(UDP, None, route, conf=conf)
+        txm.pipe = await pipe.connect(txm.msg_cb)
+        txm.owns_pipe = True
+        return txm
+
+    def __len__(self):
+        return len(self.pending)
+
+    def is_open(self):
+        """True while the pipe can carry requests."""
+        pipe_events = getattr(self.pipe, "pipe_events", None)
+        return pipe_events is not None and pipe_events.is_running
+
+    async def request(self, dest, attrs=None, mode=RFC5389, reply_addr=None, timeout=0):
+        """
+        Send a Binding request with attrs to dest and return the
+        decoded reply. reply_addr is where the reply must come from
+        (default: dest.) Raises ErrorNoReply if none arrives.
+        """
+        if not self.is_open():
+            raise ErrorNoReply("STUN transaction pipe is closed.")
+
+        txn_id, buf = stun_req_buf(mode, attrs)
+        reply_addr = norm_client_tup(reply_addr or dest)
+        now = self.clock()
+        entry = STUNTransaction(
+            txn_id,
+            buf,
+            dest,
+            reply_addr,
+            self.rto,
+            now + timeout if timeout else 0,
+            get_running_loop().create_future(),
+        )
+
+        self.pending[txn_id] = entry
+        self.pipe.send_many([self.next_send(entry)])
+        self.wheel.schedule(txn_id, self.next_deadline(entry, now))
+        self.start_ticking()
+        try:
+            return await entry.fut
+        finally:
+            # Cancelled: stop resending.
+            if self.pending.get(txn_id) is entry:
+                self.finish(entry)
+
+    def next_send(self, entry):
+        """Count a send of entry and return its (buf, dest) for send_many()."""
+        entry.tries += 1
+        self.sent += 1
+
+        # stun_req_buf() ends with TRANSACTION_TRANSMIT_COUNTER.
+        entry.buf[-3] = entry.tries & 0xFF
+        return (entry.buf, entry.dest)
+
+    def next_deadline(self, entry, now):
+        """After a send: when to resend, or when to give up after the last send."""
+        if entry.tries >= self.rc:
+            deadline = now + self.rm * self.rto
+        else:
+            deadline = now + entry.rto
+            entry.rto *= 2
+
+        if entry.give_up_at and entry.give_up_at < deadline:
+            return entry.give_up_at
+
+        return deadline
+
+    def finish(self, entry):
+        del self.pending[entry.txn_id]
+        self.wheel.cancel(entry.txn_id)
+        if not self.pending:
+            self.stop_ticking()
+
+    def msg_cb(self, msg, client_tup, pipe):
+        """Hand a reply to the request with its transaction ID."""
+        if len(msg) < 20:
+            return
+
+        entry = self.pending.get(bytes(msg[8:20]))
+        if entry is None:
+            self.stray += 1
+            return
+
+        # Change requests: only a reply from the changed address counts.
+        if client_tup != entry.reply_addr:
+            if norm_client_tup(client_tup) != entry.reply_addr:
+                self.stray += 1
+                return
+
+        try:
+            reply, _ = stun_proto(msg, self.pipe.route.af)
+        except Exception:
+            log_exception()
+            self.stray += 1
+            return
+
+        reply.pipe = self.pipe
+        reply.stup = entry.reply_addr
+        self.replies += 1
+        self.finish(entry)
+        if not entry.fut.done():
+            entry.fut.set_result(reply)
+
+    def expire(self, now=None):
+        """Resend or fail every transaction whose timer has run out."""
+        now = self.clock() if now is None else now
+        resends = []
+        for txn_id in self.wheel.advance(now):
+            entry = self.pending.get(txn_id)
+            if entry is None:
+                continue
+
+            out_of_time = entry.give_up_at and now >= entry.give_up_at
+            if entry.tries >= self.rc or out_of_time:
+                self.timeouts += 1
+                self.finish(entry)
+                if not entry.fut.done():
+                    entry.fut.set_exception(
+                        ErrorNoReply(fstr("STUN {0} got no reply.", (entry.dest,)))
+                    )
+
+                continue
+
+            self.retransmits += 1
+            resends.append(self.next_send(entry))
+            self.wheel.schedule(txn_id, self.next_deadline(entry, now))
+
+        # Everything due this tick goes out in one pass.
+        if resends:
+            self.pipe.send_many(resends)
+
+    def on_tick(self):
+        self.tick_handle = None
+        self.expire()
+        if self.pending:
+            self.start_ticking()
+
+    def start_ticking(self):
+        """Schedule the next wheel tick if one isn't already pending."""
+        if self.tick_handle is not None:
+            return
+
+        loop = get_running_loop()
+        if loop is None:
+            return
+
+        self.tick_handle = loop.call_later(self.wheel.tick, self.on_tick)
+
+    def stop_ticking(self):
+        """Cancel the pending wheel tick."""
+        if self.tick_handle is not None:
+            self.tick_handle.cancel()
+            self.tick_handle = None
+
+    async def close(self):
+        """Fail every pending request and close the pipe if the manager opened it."""
+        self.stop_ticking()
+        entries = list(self.pending.values())
+        self.pending.clear()
+        self.wheel.clear()
+        for entry in entries:
+            if not entry.fut.done():
+                entry.fut.set_exception(ErrorNoReply("STUN transaction manager closed."))
+
+        if self.pipe is not None:
+            self.pipe.del_msg_cb(self.msg_cb)
+            if self.owns_pipe:
+                await self.pipe.close()
+
+    def stats(self):
+        """Return the manager's counters as a plain dict."""
+        return {
+            "pending": len(self.pending),
+            "sent": self.sent,
+            "retransmits": self.retransmits,
+            "replies": self.replies,
+            "timeouts": self.timeouts,
+            "stray": self.stray,
+        }
+
+
+async def get_stun_txm(route, conf=None):
+    """Return the shared manager for route's bind address, opening it if needed."""
+    key = (
+        route.af,
+        tuple(route.bind_tup()),
+        getattr(route.interface, "name", None),
+    )
+    txm = STUN_TXMS.get(key)
+    if txm is None or not txm.is_open():
+        txm = STUN_TXMS[key] = await STUNTransactionManager.open(route, conf)
+
+    return txm
+
+
+async def close_stun_txms():
+    """Close every shared manager."""
+    txms = list(STUN_TXMS.values())
+    STUN_TXMS.clear()
+    for txm in txms:
+        await txm.close()
@@ -9,42 +9,50 @@ and returns the parsed reply with address fields attached.
 import re
 from ...utility.utils import async_test, fstr, log, to_h, valid_port
 from ...errors import ErrorNoReply
-from .stun_defs import RFC3489, STUNAddrTup, STUNAttrs, STUNMsg
+from .stun_defs import RFC3489, STUNAttrs, STUNMsg, stun_req_buf, unpack_addr
 from ...net.ip_range import IPRange
 from ...net.net_patterns import send_recv_loop
 
 
+XOR_MAPPED_ADDRESS = int.from_bytes(STUNAttrs.XorMappedAddress, "big")
+XOR_MAPPED_ADDRESS_X = int.from_bytes(STUNAttrs.XorMappedAddressX, "big")
+MAPPED_ADDRESS = int.from_bytes(STUNAttrs.MappedAddress, "big")
+CHANGED_ADDRESS = int.from_bytes(STUNAttrs.ChangedAddress, "big")
+
+
 def stun_proc_attrs(af, attr_code, attr_data, msg):
     """Decode a single STUN attribute and attach the resulting address tuple to msg as rtup or ctup."""
+    if not isinstance(attr_code, int):
+        attr_code = int.from_bytes(attr_code, "big")
+
     # Set our remote IP and port.
     if not hasattr(msg, "rtup"):
-        xor_addr_attrs = [STUNAttrs.XorMappedAddressX, STUNAttrs.XorMappedAddress]
-        if attr_code in xor_addr_attrs:
-            stun_addr_field = STUNAddrTup(
-                af=af,
-                txid=msg.txn_id,
-                magic_cookie=msg.magic_cookie,
-            ).unpack(attr_code, attr_data)
-            msg.rtup = stun_addr_field.tup
-
-        if attr_code == STUNAttrs.MappedAddress:
-            stun_addr_field = STUNAddrTup(af=af).unpack(attr_code, attr_data)
-            msg.rtup = stun_addr_field.tup
+        if attr_code == XOR_MAPPED_ADDRESS:
+            mask = msg.magic_cookie + msg.txn_id
+            msg.rtup = unpack_addr(attr_data, 0x2112, mask)
+
+        # Port XORed with the message's own cookie.
+        if attr_code == XOR_MAPPED_ADDRESS_X:
+            mask = msg.magic_cookie + msg.txn_id
+            port_mask = int.from_bytes(msg.magic_cookie[:2], "big")
+            msg.rtup = unpack_addr(attr_data, port_mask, mask)
+
+        if attr_code == MAPPED_ADDRESS:
+            msg.rtup = unpack_addr(attr_data)
 
     # Set the additional IP and port for this server.
     if not hasattr(msg, "ctup"):
-        if attr_code == STUNAttrs.ChangedAddress:
-            stun_addr_field = STUNAddrTup(af=af).unpack(attr_code, attr_data)
-            msg.ctup = stun_addr_field.tup
+        if attr_code == CHANGED_ADDRESS:
+            msg.ctup = unpack_addr(attr_data)
 
 
 def stun_proto(buf, af):
     """Unpack a raw STUN buffer, process all its attributes, and return (STUNMsg, remaining_bytes)."""
     msg, buf = STUNMsg.unpack(buf)
     msg.af = af
-    while not msg.eof():
-        attr_code, _, attr_data = msg.read_attr()
-        stun_proc_attrs(af, attr_code, attr_data, msg)
+    body = memoryview(msg.msg)
+    for attr_code, offset, attr_len in msg.attrs():
+        stun_proc_attrs(af, attr_code, body[offset:offset + attr_len], msg)
 
     return msg, buf
 
@@ -67,21 +75,18 @@ async def get_stun_reply(
     """
     if attrs is None:
         attrs = []
-    # Build the STUN message.
-    msg = STUNMsg(mode=mode)
-    for attr in attrs:
-        attr_code, attr_data = attr
-        msg.write_attr(attr_code, attr_data)
-    # RFC 8489 §14.7 TRANSACTION_TRANSMIT_COUNTER: marks the first (and only)
-    # transmission so firewalls can distinguish a compliant client from a
-    # DDoS amplification tool that never retransmits the same TXID.
-    msg.write_transaction_counter(1)
+    # Build the STUN message from the cached template for these attrs.
+    # It ends with an RFC 8489 §14.7 TRANSACTION_TRANSMIT_COUNTER marking
+    # the first (and only) transmission so firewalls can distinguish a
+    # compliant client from a DDoS amplification tool that never
+    # retransmits the same TXID.
+    txn_id, send_buf = stun_req_buf(mode, attrs)
+
     # Subscribe to replies that match the req tran ID.
-    sub = (re.escape(msg.txn_id), reply_addr)
+    sub = (re.escape(txn_id), reply_addr)
     pipe.subscribe(sub)
 
     # Send the req and get a matching reply.
-    send_buf = msg.pack()
     try:
         recv_buf = await send_recv_loop(dest_addr, pipe, send_buf, sub)
     finally:
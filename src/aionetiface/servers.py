@@ -8,6 +8,7 @@ from functools import reduce
 
 from .net.net_defs import IP4, UDP
 from .utility.utils import rand_b, to_b
+from .nic.nat.server_scores import SERVER_SCORES
 
 __all__ = ["INFRA", "INFRA_SEED", "rng_for_attempt", "filter_by_score", "get_infra"]
 
@@ -44,7 +45,11 @@ def filter_by_score(
 def get_infra(
     af, proto, name, no=1, attempt=0, sample=False
 ):
-    """Look up infrastructure server entries by address family, protocol, and name."""
+    """
+    Look up infrastructure server entries by address family, protocol,
+    and name. Servers with a good record on the scoreboard (see
+    server_scores.py) come first.
+    """
     af_str = ".IPv4" if af == IP4 else ".IPv6"
     proto_str = ".UDP" if proto == UDP else ".TCP"
     name = name + af_str + proto_str
@@ -55,4 +60,5 @@ def get_infra(
         return rng.sample(parent, min(no, len(parent)))
     parent = list(parent)
     rng.shuffle(parent)
+    parent = SERVER_SCORES.rank(parent, proto, rng)
     return parent[:no]
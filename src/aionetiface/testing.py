@@ -9,6 +9,8 @@ Provides:
   FakeInterfaceFactory    — builds a pool of FakeInterface objects from live
                             routes, falling back to probed 127.0.0.x loopback.
   probe_loopback_ips      — return which 127.0.0.x IPs are actually bindable.
+  FakeClock               — callable clock for code that takes clock=;
+                            tests move time by setting .now.
 
 Typical test pattern:
 
@@ -303,6 +305,23 @@ class FakeInterface(object):
         return self.id
 
 
+# ─────────────────────────────────────────────────────────────
+# FakeClock
+# ─────────────────────────────────────────────────────────────
+
+class FakeClock(object):
+    """Stand-in for time.monotonic / time.time that only moves when told.
+
+    Pass it as the clock= argument and set .now to advance time.
+    """
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
 # ─────────────────────────────────────────────────────────────
 # FakeInterfaceFactory
 # ─────────────────────────────────────────────────────────────
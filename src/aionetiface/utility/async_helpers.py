@@ -307,6 +307,24 @@ def handler_done_builder(
     return on_done
 
 
+def add_handler_error(pipe):
+    """Bump the pipe's handler_errors counter if it keeps counters."""
+    counters = getattr(pipe, "counters", None)
+    if counters is not None:
+        counters.handler_errors += 1
+
+
+async def count_handler_errors(pipe, coro):
+    """Await a handler coroutine, counting any exception it raises on pipe."""
+    try:
+        return await coro
+    except asyncio.CancelledError:  # pylint: disable=try-except-raise
+        raise
+    except Exception:
+        add_handler_error(pipe)
+        raise
+
+
 def run_handler(
     pipe,
     handler,
@@ -324,14 +342,20 @@ def run_handler(
     # has been observed to misclassify nested async-def callbacks on Python
     # 3.5.0 — leaving the returned coroutine unawaited.
     if asyncio.iscoroutinefunction(handler):
-        task = create_task(async_wrap_errors(handler(data, client_tup, pipe)))
+        coro = count_handler_errors(pipe, handler(data, client_tup, pipe))
+        task = create_task(async_wrap_errors(coro))
         task.add_done_callback(handler_done_builder(pipe, handler, task))
         pipe.handler_tasks.append(task)
         return
 
-    result = handler(data, client_tup, pipe)
+    try:
+        result = handler(data, client_tup, pipe)
+    except Exception:
+        add_handler_error(pipe)
+        raise
+
     if asyncio.iscoroutine(result):
-        task = create_task(async_wrap_errors(result))
+        task = create_task(async_wrap_errors(count_handler_errors(pipe, result)))
         task.add_done_callback(handler_done_builder(pipe, handler, task))
         pipe.handler_tasks.append(task)
         return
@@ -2,6 +2,20 @@
 Write log messages to per-thread log files under ~/aionetiface/logs.
 
 If that directory does not exist, all log calls are silently ignored.
+
+Records have a level and anything below the current level
+(AIONETIFACE_LOG_LEVEL, default INFO) is dropped before any work
+is done. Extra args are only formatted into the message once a
+record is known to be written so hot paths can log like this
+and pay next to nothing when debug logging is off:
+
+    log_debug("Discarded {0} = {1}", client_tup, data)
+
+log() never touches the disk. Records go into a bounded in-memory
+buffer and a background thread writes them out in batches -- one
+os.write per log file per batch. If the buffer is full new records
+are dropped and counted (see log_stats()) rather than blocking the
+caller. The buffer is flushed at exit and by flush_logs().
 """
 
 import atexit
@@ -9,7 +23,9 @@ import os
 import re
 import sys
 import threading
+import time
 import traceback
+from collections import deque
 from .fstr import fstr
 
 LOGS_ROOT_PATH = os.path.join(os.path.expanduser("~"), "aionetiface", "logs")
@@ -22,6 +38,31 @@ LOGS_ROOT_PATH = os.path.join(os.path.expanduser("~"), "aionetiface", "logs")
 LOG_TAG_ENV = "AIONETIFACE_LOG_TAG"
 LOG_TAG_SLUG_RE = re.compile(r"[^A-Za-z0-9._-]+")
 
+# Log levels.
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LOG_LEVEL_NAMES = {
+    "DEBUG": DEBUG,
+    "INFO": INFO,
+    "WARNING": WARNING,
+    "ERROR": ERROR,
+}
+
+# Minimum level to write -- a level name or number.
+LOG_LEVEL_ENV = "AIONETIFACE_LOG_LEVEL"
+
+# Max records waiting to be written before new ones are dropped.
+LOG_BUFFER_MAX = 10000
+
+# Seconds between writes and the backlog that triggers one early.
+LOG_FLUSH_INTERVAL = 0.1
+LOG_FLUSH_BATCH = 256
+
+# Seconds to trust a check for the logs directory.
+LOG_ROOT_CHECK_INTERVAL = 5
+
 
 def log_tag_slug():
     """Return the sanitised value of AIONETIFACE_LOG_TAG, or '' if unset."""
@@ -32,11 +73,60 @@ def log_tag_slug():
     return slug[:80]  # cap so we don't blow past path-length limits on Windows
 
 
+def parse_log_level(level):
+    """Return the numeric level for a level name or number (INFO if unknown.)"""
+    if isinstance(level, int):
+        return level
+
+    level = str(level).strip().upper()
+    if level.isdigit():
+        return int(level)
+
+    return LOG_LEVEL_NAMES.get(level, INFO)
+
+
+log_level = parse_log_level(os.environ.get(LOG_LEVEL_ENV, INFO))
+
+
+def set_log_level(level):
+    """Set the minimum level to write. Returns the old level."""
+    global log_level
+    old = log_level
+    log_level = parse_log_level(level)
+    return old
+
+
+def get_log_level():
+    """Return the minimum level that's written."""
+    return log_level
+
+
+# [path, checked_at, exists] for the logs directory.
+log_root_check = [None, 0, False]
+
+
+def logs_enabled():
+    """Return True if the logs directory exists. Rechecked every few seconds."""
+    now = time.monotonic()
+    path, checked_at, exists = log_root_check
+    if path != LOGS_ROOT_PATH or now - checked_at >= LOG_ROOT_CHECK_INTERVAL:
+        path = LOGS_ROOT_PATH
+        exists = os.path.exists(path)
+        log_root_check[:] = [path, now, exists]
+
+    return exists
+
+
+def log_enabled(level=DEBUG):
+    """Return True if a record at level would be written."""
+    return level >= log_level and logs_enabled()
+
+
 log_fds = {}
 
 
 def close_log_fds():
-    """Close all open log file descriptors at interpreter shutdown."""
+    """Close all open log file descriptors."""
     for fd in list(log_fds.values()):
         try:
             os.close(fd)
@@ -45,9 +135,6 @@ def close_log_fds():
     log_fds.clear()
 
 
-atexit.register(close_log_fds)
-
-
 def open_log_fd(tid):
     """Open (or reuse) the per-thread log file and return its OS-level file descriptor."""
     if tid not in log_fds:
@@ -63,29 +150,189 @@ def open_log_fd(tid):
     return log_fds[tid]
 
 
-def log(msg):
-    """Write msg to the per-thread log file; silently no-ops if the logs directory is absent."""
-    if not os.path.exists(LOGS_ROOT_PATH):
+def write_all(fd, buf):
+    """os.write until all of buf is written."""
+    view = memoryview(buf)
+    while len(view):
+        view = view[os.write(fd, view):]
+
+
+class LogWriter:
+    """Bounded record buffer drained by a background thread."""
+
+    def __init__(
+        self,
+        max_records=LOG_BUFFER_MAX,
+        flush_interval=LOG_FLUSH_INTERVAL,
+        flush_batch=LOG_FLUSH_BATCH,
+    ):
+        self.max_records = max_records
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+
+        # (tid, encoded line) -- deque append / popleft are thread-safe.
+        self.buf = deque()
+        self.wake = threading.Event()
+        self.flush_lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+        self.stopping = False
+
+        # Counters.
+        self.written = 0
+        self.dropped = 0
+        self.write_errors = 0
+
+    def put(self, tid, line):
+        """Queue one encoded line. Returns False if it was dropped."""
+        if self.pid != os.getpid():
+            self.start()
+
+        buf = self.buf
+        if len(buf) >= self.max_records:
+            self.dropped += 1
+            return False
+
+        buf.append((tid, line))
+        if len(buf) >= self.flush_batch:
+            self.wake.set()
+
+        return True
+
+    def start(self):
+        """Start the writer thread (again after a fork.)"""
+        if self.pid is not None:
+            # Forked: the parent writes its own records and the log
+            # file names include the pid so reopen them.
+            self.buf.clear()
+            close_log_fds()
+            self.flush_lock = threading.Lock()
+
+        self.pid = os.getpid()
+        self.stopping = False
+        self.thread = threading.Thread(
+            target=self.run, name="aionetiface-log", daemon=True
+        )
+        self.thread.start()
+
+    def run(self):
+        while not self.stopping:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Write every buffered record: one write per log file."""
+        with self.flush_lock:
+            buf = self.buf
+            batches = {}
+            while buf:
+                try:
+                    tid, line = buf.popleft()
+                except IndexError:
+                    break
+
+                batch = batches.get(tid)
+                if batch is None:
+                    batch = batches[tid] = []
+                batch.append(line)
+
+            for tid, lines in batches.items():
+                try:
+                    write_all(open_log_fd(tid), b"".join(lines))
+                    self.written += len(lines)
+                except OSError:
+                    self.write_errors += 1
+                    self.dropped += len(lines)
+
+    def stop(self):
+        """Stop the writer thread and write what's left."""
+        self.stopping = True
+        self.wake.set()
+        thread = self.thread
+        if thread is not None and self.pid == os.getpid():
+            if thread is not threading.current_thread():
+                thread.join(1)
+
+        self.thread = None
+        self.pid = None
+        self.flush()
+
+    def stats(self):
+        """Return the writer's counters as a plain dict."""
+        return {
+            "written": self.written,
+            "dropped": self.dropped,
+            "buffered": len(self.buf),
+            "write_errors": self.write_errors,
+        }
+
+
+log_writer = LogWriter()
+
+
+def flush_logs():
+    """Write out every buffered record now."""
+    log_writer.flush()
+
+
+def log_stats():
+    """Return written / dropped / buffered record counts."""
+    return log_writer.stats()
+
+
+def close_logs():
+    """Flush buffered records and close all log files at interpreter shutdown."""
+    log_writer.stop()
+    close_log_fds()
+
+
+atexit.register(close_logs)
+
+
+def log(msg, *args, level=INFO):
+    """
+    Queue msg for the per-thread log file. With args, msg is a format
+    string that's only expanded if the record will be written.
+    """
+    if level < log_level or not logs_enabled():
         return
 
     if not isinstance(msg, (str, bytes)):
         return
 
-    tid = threading.get_ident()
-    fd = open_log_fd(tid)
+    if isinstance(msg, str):
+        if args:
+            try:
+                msg = msg.format(*args)
+            except (IndexError, KeyError, ValueError):
+                msg = msg + " " + repr(args)
+
+        msg = msg.encode("utf-8")
 
-    if isinstance(msg, bytes):
-        os.write(fd, msg + b"\n")
-    else:
-        os.write(fd, msg.encode("utf-8") + b"\n")
+    log_writer.put(threading.get_ident(), msg + b"\n")
+
+
+def log_debug(msg, *args):
+    """log() at DEBUG level."""
+    if DEBUG < log_level:
+        return
+
+    log(msg, *args, level=DEBUG)
 
 
 def log_exception():
     """Log the current exception's traceback to the per-thread log file."""
+    if ERROR < log_level or not logs_enabled():
+        return
+
     exc = "".join(traceback.format_exception(*sys.exc_info()))
-    log("EXCEPTION: " + exc.strip())
+    log("EXCEPTION: " + exc.strip(), level=ERROR)
 
 
 def log_p2p(msg, node_id):
     """Log a p2p message prefixed with the node_id tag."""
+    if log_level > INFO or not logs_enabled():
+        return
+
     log(fstr("p2p <{0}>: {1}", (node_id, msg)))
@@ -24,6 +24,7 @@ from ..vendor.ntp_client import NTPClient
 from ..net.net_defs import UDP, IP4, IP6
 from .utils import log, log_exception, async_test, fstr
 from ..servers import get_infra
+from ..nic.nat.server_scores import record_server
 
 
 NTP_RETRY = 2
@@ -146,12 +147,15 @@ async def get_ntp_from_dest(
             monotonic_at_sample = time.monotonic()
             corrected_ntp = response.dest_time + response.offset
             rtt = response.delay
+            record_server(UDP, dest, rtt)
             return (corrected_ntp, rtt, monotonic_at_sample)
     except asyncio.CancelledError:  # pylint: disable=try-except-raise
         raise
     except (OSError, ConnectionError, asyncio.TimeoutError):
         log_exception()
-        return None
+
+    record_server(UDP, dest, ok=False)
+    return None
 
 
 class SysClock:
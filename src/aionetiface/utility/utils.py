@@ -26,7 +26,7 @@ from ecdsa.curves import NIST192p
 import ecdsa
 
 from .fstr import fstr
-from .error_logger import log, log_exception, log_p2p
+from .error_logger import log, log_debug, log_enabled, log_exception, log_p2p
 
 # Re-exported submodules.
 from .type_conv import (  # noqa: F401
@@ -168,6 +168,8 @@ __all__ = [
     "ensure_resolved",
     "fstr",
     "log",
+    "log_debug",
+    "log_enabled",
     "log_exception",
     "log_p2p",
     "cancel_task",
@@ -4,3 +4,13 @@ import sys
 # Ensure the tests directory is on sys.path so port_helpers is importable
 # when test files are run directly or via python -m unittest discover.
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Keep the tests off the user's real scoreboard and NAT / WAN caches
+# so results don't depend on earlier runs.
+import tempfile
+from aionetiface.nic.nat import nat_cache, server_scores
+
+_cache_dir = tempfile.mkdtemp()
+server_scores.SERVER_SCORES.path = os.path.join(_cache_dir, "server_scores.json")
+nat_cache.NAT_CACHE_PATH = os.path.join(_cache_dir, "nat_cache.json")
+nat_cache.WAN_CACHE_PATH = os.path.join(_cache_dir, "wan_cache.json")
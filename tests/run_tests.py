@@ -796,13 +796,17 @@ def run_single_test(python_exe, tests_dir, module_name, out_path):
     # Tag any aionetiface runtime logs ( log() / log_exception() outputs in
     # ~/aionetiface/logs/ ) with the test module name so they can be
     # correlated back to the test that produced them. Without this, logs
-    # are only identifiable by the opaque (pid, tid) suffix.
+    # are only identifiable by the opaque (pid, tid) suffix. Debug level
+    # keeps the [IFLOAD] / [STUN-LOOKUP] traces in the test logs.
     rc, _ = run_cmd(
         [python_exe, "-W", "ignore::ResourceWarning", "-m", "unittest", module_name, "-v"],
         cwd=tests_dir,
         log_path=out_path,
         timeout=TEST_TIMEOUT,
-        env_extra={"AIONETIFACE_LOG_TAG": module_name},
+        env_extra={
+            "AIONETIFACE_LOG_TAG": module_name,
+            "AIONETIFACE_LOG_LEVEL": "DEBUG",
+        },
     )
     duration = time.time() - t0
     timeout_killed = (rc == -1)
@@ -0,0 +1,200 @@
+"""
+Tests for the RUDP retransmission queue and per-peer RTO.
+"""
+
+import asyncio
+import struct
+import unittest
+
+from aionetiface.testing import AsyncTestCase, FakeClock, FakeInterface
+from aionetiface.net.net_defs import NET_CONF, RUDP, IP4, SUB_ALL
+from aionetiface.net.pipe.pipe import Pipe
+from aionetiface.net.pcap.tcp.timers import INITIAL_RTO, MIN_RTO
+from aionetiface.protocol.ack_retransmit import RetransmitQueue
+from aionetiface.protocol.ack_udp import SACK_MAX_BITS, pack_sacks, unpack_sack
+
+PEER = ("127.0.0.1", 1337)
+
+
+def pack_msg(seq, payload):
+    return struct.pack("!QB", seq, 0) + payload
+
+
+class TestRetransmitQueue(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(1000.0)
+        self.sent = []
+        self.rtx = RetransmitQueue(self.sent.extend, clock=self.clock)
+
+    def test_ack_samples_rtt(self):
+        entry = self.rtx.add(1, b"x", PEER)
+        self.assertEqual(len(self.sent), 1)
+        self.assertIn(1, self.rtx)
+        self.assertEqual(self.rtx.rto(PEER), INITIAL_RTO)
+
+        self.clock.now += 0.002
+        self.assertTrue(self.rtx.ack(1))
+        self.assertFalse(self.rtx.ack(1))
+        self.assertTrue(entry.done)
+        self.assertTrue(entry.is_set())
+        self.assertNotIn(1, self.rtx)
+
+        # A LAN sized RTT drops the RTO to the floor.
+        self.assertEqual(self.rtx.rto(PEER), MIN_RTO)
+
+    def test_backoff_and_give_up(self):
+        entry = self.rtx.add(1, b"x", PEER, tries=3)
+
+        # Nothing due before the RTO.
+        self.rtx.expire(self.clock.now + INITIAL_RTO / 2)
+        self.assertEqual(len(self.sent), 1)
+
+        self.clock.now += INITIAL_RTO + 0.1
+        self.rtx.expire()
+        self.assertEqual(len(self.sent), 2)
+        self.assertEqual(entry.rto, INITIAL_RTO * 2)
+
+        self.clock.now += INITIAL_RTO * 2 + 0.1
+        self.rtx.expire()
+        self.assertEqual(len(self.sent), 3)
+
+        # Tries used up: the last RTO passing gives up.
+        self.clock.now += INITIAL_RTO * 4 + 0.1
+        self.rtx.expire()
+        self.assertEqual(len(self.sent), 3)
+        self.assertTrue(entry.done)
+        self.assertFalse(entry.is_set())
+        self.assertEqual(self.rtx.stats()["gave_up"], 1)
+
+        # Karn: no RTT sample from an ACK that may be for a resend.
+        entry = self.rtx.add(2, b"y", PEER)
+        self.clock.now += INITIAL_RTO + 0.1
+        self.rtx.expire()
+        self.rtx.ack(2)
+        self.assertEqual(self.rtx.rto(PEER), INITIAL_RTO)
+
+    def test_timeout(self):
+        entry = self.rtx.add(1, b"x", PEER, tries=10, timeout=0.5)
+        self.clock.now += 0.6
+        self.rtx.expire()
+        self.assertTrue(entry.done)
+        self.assertEqual(len(self.sent), 1)
+
+    def test_many_inflight(self):
+        for seq in range(1, 5001):
+            self.rtx.add(seq, b"x", PEER)
+
+        self.assertEqual(len(self.rtx), 5000)
+        for seq in range(1, 5001):
+            self.rtx.ack(seq)
+
+        self.assertEqual(len(self.rtx), 0)
+        self.assertEqual(len(self.rtx.wheel), 0)
+
+
+class TestSACK(unittest.TestCase):
+    def test_pack_unpack(self):
+        seqs = [5, 6, 7, 12, 5 + SACK_MAX_BITS - 1, 5 + SACK_MAX_BITS, 10**6]
+        sacks = pack_sacks(seqs)
+        self.assertEqual(len(sacks), 3)
+
+        out = []
+        for sack in sacks:
+            self.assertEqual(sack[8], 2)
+            out += unpack_sack(int.from_bytes(sack[:8], "big"), sack[9:])
+
+        self.assertEqual(out, seqs)
+
+        # One byte of bitmap for a short run.
+        self.assertEqual(len(pack_sacks([1, 2, 3])[0]), 10)
+
+
+class TestRUDPRetransmit(AsyncTestCase):
+    conf = dict(NET_CONF)
+
+    async def asyncSetUp(self):
+        self.nic = FakeInterface("lo", 0, IP4, "127.0.0.1", None)
+        self.pipes = []
+        for _ in range(2):
+            route = await self.nic.route(IP4).bind()
+            pipe = await Pipe(RUDP, None, route, conf=self.conf).connect()
+            self.pipes.append(pipe)
+
+    async def asyncTearDown(self):
+        for pipe in self.pipes:
+            await pipe.close()
+
+    async def test_ack_send(self):
+        sender, receiver = self.pipes
+        dest = ("127.0.0.1", receiver.sock.getsockname()[1])
+        receiver.subscribe(SUB_ALL)
+        task, event = await sender.stream.ack_send(b"hello", dest)
+        self.assertTrue(await asyncio.wait_for(task, 2))
+        self.assertTrue(event.is_set())
+        self.assertEqual(await receiver.recv(SUB_ALL, timeout=2), b"hello")
+
+        # The ACK gave an RTT sample far below the initial RTO.
+        self.assertLess(sender.stream.rtx.rto(dest), INITIAL_RTO)
+        self.assertEqual(sender.stats()["retransmit"]["acked"], 1)
+
+        # No ACK from a closed port: close() fails what's in flight.
+        entry, _ = await sender.stream.ack_send(b"lost", ("127.0.0.1", 9))
+        await sender.close()
+        self.assertFalse(await entry)
+
+
+    async def test_ack_uses_f_send(self):
+        stream = self.pipes[0].stream
+        sent = []
+
+        async def f_send(buf):
+            sent.append(buf)
+
+        msg = pack_msg(7, b"hi")
+        did_ack, payload = stream.handle_ack(
+            msg, stream.is_ack, stream.is_ackable, f_send, ("127.0.0.1", 9)
+        )
+        self.assertEqual((did_ack, payload), (2, b"hi"))
+        await asyncio.gather(*stream.ack_send_tasks)
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(stream.is_ack(sent[0], stream), 7)
+
+
+class TestRUDPSACK(TestRUDPRetransmit):
+    conf = dict(NET_CONF, rudp_sack=True)
+
+    async def test_coalesced_acks(self):
+        sender, receiver = self.pipes
+        dest = ("127.0.0.1", receiver.sock.getsockname()[1])
+        receiver.subscribe(SUB_ALL)
+
+        entries = []
+        for i in range(100):
+            entry, _ = await sender.stream.ack_send(str(i).encode("ascii"), dest)
+            entries.append(entry)
+
+        # Sequential seqs.
+        seqs = [entry.seq for entry in entries]
+        self.assertEqual(seqs, list(range(seqs[0], seqs[0] + 100)))
+
+        acked = await asyncio.wait_for(asyncio.gather(*entries), 2)
+        self.assertTrue(all(acked))
+
+        # Far fewer ACK packets than messages.
+        self.assertLess(sender.counters.msgs_in, 20)
+        self.assertEqual(sender.stats()["retransmit"]["acked"], 100)
+
+    async def test_ack_uses_f_send(self):
+        # Held for a SACK instead.
+        stream = self.pipes[0].stream
+        did_ack, _ = stream.handle_ack(
+            pack_msg(7, b"hi"), stream.is_ack, stream.is_ackable, None, ("127.0.0.1", 9)
+        )
+        self.assertEqual(did_ack, 2)
+        self.assertEqual(stream.sack_pending, {("127.0.0.1", 9): {7}})
+        self.assertEqual(stream.ack_send_tasks, [])
+        stream.cancel_sacks()
+
+
+if __name__ == "__main__":
+    unittest.main()
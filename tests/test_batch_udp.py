@@ -0,0 +1,76 @@
+"""
+Tests for batched UDP receive (conf["udp_batch"]) on Linux.
+"""
+
+import asyncio
+import socket
+import unittest
+
+from aionetiface.testing import AsyncTestCase, FakeInterface
+from aionetiface.net.net_defs import NET_CONF, SUB_ALL, UDP, IP4
+from aionetiface.net.pipe.pipe import Pipe
+from aionetiface.net.asyncio.batch_udp import (
+    BATCH_UDP_SUPPORTED,
+    create_batch_datagram_endpoint,
+)
+
+
+class BatchCounter(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.batches = []
+
+    def batch_received(self, batch):
+        self.batches.append([(bytes(view), addr) for view, addr in batch])
+
+
+@unittest.skipUnless(BATCH_UDP_SUPPORTED, "batched UDP receive is Linux-only")
+class TestBatchUDP(AsyncTestCase):
+    async def test_batch_callback(self):
+        loop = asyncio.get_event_loop()
+        if not isinstance(loop, asyncio.SelectorEventLoop):
+            self.skipTest("needs a selector event loop")
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(("127.0.0.1", 0))
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        transport, proto = await create_batch_datagram_endpoint(
+            loop, BatchCounter, sock, batch_size=16
+        )
+        try:
+            msgs = [bytes([i]) * (i + 1) for i in range(40)]
+            for msg in msgs:
+                sender.sendto(msg, sock.getsockname())
+
+            for _ in range(0, 50):
+                if sum(len(b) for b in proto.batches) == len(msgs):
+                    break
+                await asyncio.sleep(0.01)
+
+            got = [data for batch in proto.batches for data, _ in batch]
+            self.assertEqual(got, msgs)
+            self.assertLess(len(proto.batches), len(msgs))
+            self.assertTrue(all(len(b) <= 16 for b in proto.batches))
+        finally:
+            sender.close()
+            transport.close()
+
+    async def test_pipe_udp_batch(self):
+        conf = dict(NET_CONF, udp_batch=32)
+        nic = FakeInterface("lo", 0, IP4, "127.0.0.1", None)
+        pipe = await Pipe(UDP, None, await nic.route(IP4).bind(), conf=conf).connect()
+        pipe.subscribe(SUB_ALL)
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            dest = ("127.0.0.1", pipe.sock.getsockname()[1])
+            for i in range(100):
+                sender.sendto(b"pkt" + str(i).encode(), dest)
+
+            for i in range(100):
+                self.assertEqual(await pipe.recv(SUB_ALL), b"pkt" + str(i).encode())
+        finally:
+            sender.close()
+            await pipe.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+"""
+Tests for running a Daemon across worker processes with SO_REUSEPORT.
+"""
+
+import asyncio
+import functools
+import multiprocessing
+import time
+import unittest
+
+from aionetiface.testing import AsyncTestCase, FakeInterface
+from aionetiface.net.net_defs import SUB_ALL, TCP, IP4
+from aionetiface.net.pipe.pipe import Pipe
+from aionetiface.net.daemon_shards import SHARDING_SUPPORTED, DaemonShards, shard_recv
+from aionetiface.protocol.echo.echo_server import EchoServer
+from port_helpers import xdist_port_base
+
+SHARD_PORT = xdist_port_base(34900)
+
+
+async def echo_setup(port, daemon):
+    nic = FakeInterface("lo", 0, IP4, "127.0.0.1", None)
+    route = await nic.route(IP4).bind(ips="127.0.0.1", port=port)
+    await daemon.add_listener(TCP, route)
+
+
+@unittest.skipUnless(SHARDING_SUPPORTED, "daemon sharding is Linux-only")
+class TestDaemonShards(AsyncTestCase):
+    async def test_shards_serve_same_port(self):
+        nic = FakeInterface("lo", 0, IP4, "127.0.0.1", None)
+        setup = functools.partial(echo_setup, SHARD_PORT)
+        shards = await DaemonShards(EchoServer, setup, workers=2).start()
+        pipes = []
+        try:
+            self.assertEqual(shards.health(), {0: True, 1: True})
+            for i in range(8):
+                pipe = await Pipe(
+                    TCP, ("127.0.0.1", SHARD_PORT), await nic.route(IP4).bind()
+                ).connect()
+                pipes.append(pipe)
+                pipe.subscribe(SUB_ALL)
+                msg = b"echo " + str(i).encode()
+                await pipe.send(msg)
+                self.assertEqual(await asyncio.wait_for(pipe.recv(SUB_ALL), 5), msg)
+
+            stats = await shards.stats()
+            self.assertEqual(stats["alive"], 2)
+            self.assertEqual(stats["totals"]["servers"], 2)
+            self.assertEqual(stats["totals"]["tcp_clients"], 8)
+        finally:
+            for pipe in pipes:
+                await pipe.close()
+            await shards.close()
+
+        self.assertEqual(shards.health(), {})
+
+
+@unittest.skipUnless(SHARDING_SUPPORTED, "daemon sharding is Linux-only")
+class TestShardRecv(AsyncTestCase):
+    async def test_wakes_on_message(self):
+        parent, child = multiprocessing.Pipe()
+        try:
+            loop = asyncio.get_running_loop()
+            loop.call_later(0.05, child.send, ("ready", 0, 1))
+            start = time.monotonic()
+            self.assertEqual(await shard_recv(parent, 5), ("ready", 0, 1))
+            self.assertLess(time.monotonic() - start, 1)
+
+            # Nothing sent, then the worker goes away.
+            self.assertIsNone(await shard_recv(parent, 0.05))
+            child.close()
+            self.assertIsNone(await shard_recv(parent, 5))
+        finally:
+            parent.close()
@@ -0,0 +1,153 @@
+"""
+Tests for log levels, lazy formatting and the buffered log writer.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from aionetiface.utility import error_logger
+from aionetiface.utility.error_logger import (
+    DEBUG,
+    ERROR,
+    INFO,
+    WARNING,
+    LogWriter,
+    flush_logs,
+    log,
+    log_debug,
+    log_enabled,
+    log_stats,
+    parse_log_level,
+    set_log_level,
+)
+
+
+class CountFormat:
+    """Counts how many times it gets formatted into a message."""
+
+    def __init__(self):
+        self.formatted = 0
+
+    def __format__(self, spec):
+        self.formatted += 1
+        return "counted"
+
+
+class TestErrorLogger(unittest.TestCase):
+    def setUp(self):
+        self.old_root = error_logger.LOGS_ROOT_PATH
+        self.old_level = set_log_level(INFO)
+        flush_logs()
+        error_logger.close_log_fds()
+        self.root = tempfile.mkdtemp()
+        error_logger.LOGS_ROOT_PATH = self.root
+
+    def tearDown(self):
+        flush_logs()
+        error_logger.close_log_fds()
+        error_logger.LOGS_ROOT_PATH = self.old_root
+        set_log_level(self.old_level)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def read_log(self):
+        flush_logs()
+        out = b""
+        for name in sorted(os.listdir(self.root)):
+            with open(os.path.join(self.root, name), "rb") as fp:
+                out += fp.read()
+
+        return out.decode("utf-8")
+
+    def test_levels(self):
+        self.assertEqual(parse_log_level("debug"), DEBUG)
+        self.assertEqual(parse_log_level("30"), WARNING)
+        self.assertEqual(parse_log_level("nonsense"), INFO)
+        self.assertFalse(log_enabled(DEBUG))
+        self.assertTrue(log_enabled(INFO))
+
+        log("plain message")
+        log_debug("debug message")
+        log("warning message", level=WARNING)
+        out = self.read_log()
+        self.assertIn("plain message\n", out)
+        self.assertIn("warning message\n", out)
+        self.assertNotIn("debug message", out)
+
+        set_log_level(DEBUG)
+        log_debug("debug {0}", 2)
+        self.assertIn("debug 2\n", self.read_log())
+
+    def test_lazy_format(self):
+        arg = CountFormat()
+        log_debug("skipped {0}", arg)
+        self.assertEqual(arg.formatted, 0)
+
+        log("kept {0} {1:.2f}", arg, 1.5)
+        self.assertEqual(arg.formatted, 1)
+        self.assertIn("kept counted 1.50\n", self.read_log())
+
+        # Bad format strings don't raise.
+        log("missing {3}", 1)
+        self.assertIn("missing {3} (1,)", self.read_log())
+
+    def test_no_logs_dir(self):
+        error_logger.LOGS_ROOT_PATH = os.path.join(self.root, "missing")
+        arg = CountFormat()
+        log("nothing {0}", arg)
+        self.assertEqual(arg.formatted, 0)
+        self.assertFalse(log_enabled(ERROR))
+
+    def test_per_thread_files(self):
+        log("main thread")
+
+        def worker():
+            log("worker thread")
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        flush_logs()
+        self.assertEqual(len(os.listdir(self.root)), 2)
+        out = self.read_log()
+        self.assertIn("main thread\n", out)
+        self.assertIn("worker thread\n", out)
+        self.assertGreaterEqual(log_stats()["written"], 2)
+
+    def test_writer_batches_and_drops(self):
+        writer = LogWriter(max_records=3, flush_interval=60, flush_batch=100)
+        try:
+            tid = threading.get_ident()
+            for i in range(5):
+                writer.put(tid, str(i).encode("ascii") + b"\n")
+
+            stats = writer.stats()
+            self.assertEqual(stats["buffered"], 3)
+            self.assertEqual(stats["dropped"], 2)
+
+            writer.flush()
+            self.assertEqual(writer.stats()["written"], 3)
+            self.assertEqual(writer.stats()["buffered"], 0)
+            self.assertEqual(self.read_log(), "0\n1\n2\n")
+        finally:
+            writer.stop()
+
+    def test_background_flush(self):
+        writer = LogWriter(flush_interval=0.01)
+        try:
+            writer.put(threading.get_ident(), b"background\n")
+            for _ in range(100):
+                if writer.stats()["written"]:
+                    break
+                time.sleep(0.01)
+
+            self.assertEqual(writer.stats()["written"], 1)
+        finally:
+            writer.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+"""
+Tests for the opt-in event loop instrumentation.
+"""
+
+import asyncio
+import socket
+import time
+import unittest
+
+from aionetiface.net.asyncio.event_loop import CustomEventLoop
+from aionetiface.net.asyncio.loop_stats import Histogram, TimedReadyQueue
+
+
+def slow_callback():
+    time.sleep(0.03)
+
+
+class TestHistogram(unittest.TestCase):
+    def test_buckets(self):
+        hist = Histogram((1, 10, 100))
+        for value in (0, 1, 5, 50, 500, 1000):
+            hist.add(value)
+
+        self.assertEqual(hist.counts, [2, 1, 1, 2])
+        self.assertEqual(hist.max, 1000)
+        self.assertEqual(hist.percentile(50), 10)
+        self.assertEqual(hist.percentile(100), 1000)
+        self.assertEqual(hist.snapshot()["buckets"][-1], ("inf", 2))
+
+
+class TestLoopStats(unittest.TestCase):
+    def setUp(self):
+        self.loop = CustomEventLoop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(self.loop.stats)
+        self.assertNotIsInstance(self.loop._ready, TimedReadyQueue)
+
+    def test_records_loop_health(self):
+        loop = self.loop
+        stats = loop.enable_stats(top_n=3)
+        self.assertIs(loop.enable_stats(), stats)
+
+        a, b = socket.socketpair()
+        got = []
+        loop.add_reader(a.fileno(), lambda: got.append(a.recv(10)))
+
+        async def main():
+            b.send(b"x")
+            loop.call_soon(slow_callback)
+
+            # Runs late because slow_callback holds the loop.
+            fired = loop.create_future()
+            loop.call_later(0.001, fired.set_result, None)
+            await fired
+            await asyncio.sleep(0.02)
+
+        try:
+            loop.run_until_complete(main())
+        finally:
+            loop.remove_reader(a.fileno())
+            a.close()
+            b.close()
+
+        snap = stats.snapshot()
+        self.assertEqual(got, [b"x"])
+        self.assertGreater(snap["iterations"], 2)
+        self.assertGreaterEqual(snap["ready_fds"]["max"], 1)
+        self.assertGreater(snap["select_wait"]["total"], 0.01)
+        self.assertGreaterEqual(snap["callback_time"]["max"], 0.03)
+        self.assertGreater(snap["loop_lag"]["max"], 0.02)
+        self.assertIn("slow_callback", snap["slowest"][0]["callback"])
+        self.assertLessEqual(len(snap["slowest"]), 3)
+        self.assertTrue(0 < snap["busy_ratio"] < 1)
+
+        loop.disable_stats()
+        self.assertIsNone(loop.stats)
+        self.assertNotIsInstance(loop._ready, TimedReadyQueue)
+
+
+if __name__ == "__main__":
+    unittest.main()
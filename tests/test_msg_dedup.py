@@ -0,0 +1,78 @@
+"""
+Tests for the per-peer, time-windowed duplicate message filter.
+"""
+
+import socket
+import unittest
+
+from aionetiface.testing import FakeClock
+from aionetiface.net.net_defs import NET_CONF
+from aionetiface.net.pipe.pipe_events import PipeEvents
+from aionetiface.protocol.msg_dedup import MsgDedup
+
+
+class TestMsgDedup(unittest.TestCase):
+    def test_dups_per_peer(self):
+        dedup = MsgDedup(window=10, clock=FakeClock(1000.0))
+        self.assertTrue(dedup.is_unique("1.1.1.1", b"hello"))
+        self.assertFalse(dedup.is_unique("1.1.1.1", b"hello"))
+
+        # Same payload from another peer isn't a duplicate.
+        self.assertTrue(dedup.is_unique("2.2.2.2", b"hello"))
+
+        # Unhashable buffers are hashed by value.
+        self.assertFalse(dedup.is_unique("2.2.2.2", bytearray(b"hello")))
+        self.assertEqual(dedup.stats()["dups"], 2)
+
+    def test_window(self):
+        clock = FakeClock(1000.0)
+        dedup = MsgDedup(window=10, clock=clock)
+        dedup.is_unique("1.1.1.1", b"a")
+
+        # Still remembered one slot (half a window) later.
+        clock.now += 5
+        self.assertFalse(dedup.is_unique("1.1.1.1", b"a"))
+        dedup.is_unique("1.1.1.1", b"b")
+
+        # Two slots on 'a' has rotated out but 'b' hasn't.
+        clock.now += 5
+        self.assertTrue(dedup.is_unique("1.1.1.1", b"a"))
+        self.assertFalse(dedup.is_unique("1.1.1.1", b"b"))
+
+        # Quiet for longer than the window: everything is forgotten.
+        clock.now += 30
+        self.assertTrue(dedup.is_unique("1.1.1.1", b"b"))
+
+    def test_memory_ceilings(self):
+        dedup = MsgDedup(window=10, max_ids=10, max_peers=2, clock=FakeClock(1000.0))
+        for i in range(100):
+            self.assertTrue(dedup.is_unique("1.1.1.1", str(i).encode("ascii")))
+
+        # Full generations rotate early instead of growing or resetting:
+        # the most recent messages are still caught.
+        self.assertLessEqual(len(dedup), 10)
+        self.assertFalse(dedup.is_unique("1.1.1.1", b"99"))
+        self.assertGreater(dedup.stats()["forced_rotations"], 0)
+
+        dedup.is_unique("2.2.2.2", b"x")
+        dedup.is_unique("3.3.3.3", b"x")
+        self.assertEqual(len(dedup.peers), 2)
+        self.assertNotIn("1.1.1.1", dedup.peers)
+        self.assertEqual(dedup.stats()["evicted_peers"], 1)
+
+    def test_pipe_events(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            conf = dict(NET_CONF, enable_msg_ids=1, max_msg_ids=4)
+            pipe_events = PipeEvents(sock=sock, conf=conf)
+            client_tup = ("127.0.0.1", 1337)
+            self.assertEqual(pipe_events.is_unique_msg(None, b"x", client_tup), 1)
+            self.assertEqual(pipe_events.is_unique_msg(None, b"x", client_tup), 0)
+            self.assertEqual(pipe_events.msg_dedup.max_ids, 4)
+            self.assertEqual(pipe_events.stats()["dedup"]["dups"], 1)
+        finally:
+            sock.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
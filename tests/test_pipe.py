@@ -17,7 +17,7 @@ so far. Hopefully it works well on other OSes, too.
 """
 
 from aionetiface import *
-from aionetiface.testing import AsyncTestCase
+from aionetiface.testing import AsyncTestCase, FakeInterface
 
 
 class MinReader(asyncio.StreamReaderProtocol):
@@ -133,6 +133,20 @@ class TestPipe(AsyncTestCase):
         server.close()
         await server.wait_closed()
 
+    # close() wakes recv() calls instead of leaving them to time out.
+    async def test_close_wakes_recv(self):
+        nic = FakeInterface("lo", 0, IP4, "127.0.0.1", None)
+        route = await nic.route(IP4).bind()
+        pipe = await Pipe(UDP, None, route).connect()
+        pipe.subscribe(SUB_ALL)
+        waiter = asyncio.ensure_future(pipe.recv(SUB_ALL, timeout=5))
+        await asyncio.sleep(0.05)
+
+        start = time.monotonic()
+        await pipe.close()
+        self.assertIsNone(await asyncio.wait_for(waiter, 1))
+        self.assertLess(time.monotonic() - start, 1)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,149 @@
+"""
+Tests for the TCP server accept queue.
+"""
+
+import asyncio
+
+from aionetiface.testing import AsyncTestCase, FakeInterface
+from aionetiface.net.net_defs import NET_CONF, TCP, IP4
+from aionetiface.net.pipe.pipe import Pipe
+from aionetiface.net.pipe.pipe_accept import AcceptQueue
+
+
+class StubClient:
+    def __init__(self):
+        self.on_close = asyncio.Event()
+
+
+class TestAcceptQueue(AsyncTestCase):
+    async def test_backlog_callbacks(self):
+        events = []
+        queue = AcceptQueue(
+            4, on_full=lambda: events.append("full"), on_space=lambda: events.append("space")
+        )
+        clients = [StubClient() for _ in range(4)]
+        for client in clients:
+            queue.put(client)
+        self.assertEqual(events, ["full"])
+
+        # Resumes at half the backlog.
+        self.assertIs(await queue.get(), clients[0])
+        self.assertEqual(events, ["full"])
+        self.assertIs(await queue.get(), clients[1])
+        self.assertEqual(events, ["full", "space"])
+
+    async def test_skips_closed_and_close(self):
+        queue = AcceptQueue()
+        clients = [StubClient() for _ in range(3)]
+        for client in clients:
+            queue.put(client)
+
+        clients[0].on_close.set()
+        queue.note_closed(clients[0])
+        clients[1].on_close.set()
+        queue.note_closed(clients[1])
+        self.assertEqual(len(queue), 1)
+        self.assertIs(await queue.get(), clients[2])
+
+        # Closing a client that was already accepted doesn't count.
+        clients[2].on_close.set()
+        queue.note_closed(clients[2])
+        self.assertEqual(queue.dead, 0)
+
+        waiter = asyncio.ensure_future(queue.get())
+        await asyncio.sleep(0)
+        queue.close()
+        self.assertIsNone(await waiter)
+
+
+    async def test_closed_after_accept(self):
+        queue = AcceptQueue()
+        clients = [StubClient() for _ in range(4)]
+        for client in clients:
+            queue.put(client)
+        self.assertIs(await queue.get(), clients[0])
+        clients[0].on_close.set()
+        queue.note_closed(clients[0])
+        self.assertEqual(queue.dead, 0)
+
+        # Only queued clients are counted as dead.
+        clients[1].on_close.set()
+        queue.note_closed(clients[1])
+        self.assertEqual(queue.dead, 1)
+        self.assertEqual(len(queue), 3)
+        self.assertIs(await queue.get(), clients[2])
+        self.assertEqual(queue.dead, 0)
+
+
+class TestAcceptLoopback(AsyncTestCase):
+    async def asyncSetUp(self):
+        self.nic = FakeInterface("lo", 0, IP4, "127.0.0.1", None)
+
+    async def test_async_for(self):
+        server = await Pipe(TCP, None, await self.nic.route(IP4).bind()).connect()
+        dest = ("127.0.0.1", server.sock.getsockname()[1])
+        clients = []
+        try:
+            for _ in range(3):
+                clients.append(await Pipe(TCP, dest, await self.nic.route(IP4).bind()).connect())
+
+            ports = set(c.sock.getsockname()[1] for c in clients)
+            accepted = set()
+            async for conn in server:
+                accepted.add(conn.stream.dest_tup[1])
+                if len(accepted) == 3:
+                    break
+
+            self.assertEqual(accepted, ports)
+        finally:
+            for client in clients:
+                await client.close()
+            await server.close()
+
+    async def test_backlog_pauses_server(self):
+        conf = dict(NET_CONF, accept_backlog=2)
+        server = await Pipe(TCP, None, await self.nic.route(IP4).bind(), conf=conf).connect()
+        dest = ("127.0.0.1", server.sock.getsockname()[1])
+        clients = []
+        try:
+            for _ in range(4):
+                clients.append(await Pipe(TCP, dest, await self.nic.route(IP4).bind()).connect())
+
+            await asyncio.sleep(0.1)
+            self.assertTrue(server.accepting_paused)
+            self.assertEqual(len(server.accept_queue), 2)
+
+            # The rest come off the listen backlog once accept() drains it.
+            for _ in range(4):
+                conn = await asyncio.wait_for(server.accept(), 2)
+                self.assertIsNotNone(conn)
+
+            self.assertFalse(server.accepting_paused)
+        finally:
+            for client in clients:
+                await client.close()
+            await server.close()
+
+    async def test_backlog_unsupported_loop(self):
+        conf = dict(NET_CONF, accept_backlog=1)
+        server = await Pipe(TCP, None, await self.nic.route(IP4).bind(), conf=conf).connect()
+        loop = asyncio.get_running_loop()
+
+        # Like the Proactor loop: no readers to remove.
+        def remove_reader(fd):
+            raise NotImplementedError
+
+        loop.remove_reader = remove_reader
+        try:
+            server.pause_accepting()
+            self.assertFalse(server.accepting_paused)
+        finally:
+            del loop.remove_reader
+            await server.close()
+
+    async def test_accept_after_close(self):
+        server = await Pipe(TCP, None, await self.nic.route(IP4).bind()).connect()
+        waiter = asyncio.ensure_future(server.accept())
+        await asyncio.sleep(0)
+        await server.close()
+        self.assertIsNone(await asyncio.wait_for(waiter, 2))
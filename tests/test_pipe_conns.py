@@ -0,0 +1,157 @@
+"""
+Tests for the timer wheel and the TCP server connection table.
+"""
+
+import asyncio
+
+from aionetiface.testing import AsyncTestCase, FakeClock, FakeInterface
+from aionetiface.net.net_defs import NET_CONF, TCP, IP4
+from aionetiface.net.pipe.pipe import Pipe
+from aionetiface.net.pipe.pipe_conns import ConnTable, CONN_EVICT
+from aionetiface.net.timer_wheel import TimerWheel
+
+
+class StubTransport:
+    def __init__(self):
+        self.aborted = False
+
+    def abort(self):
+        self.aborted = True
+
+
+class StubClient:
+    def __init__(self):
+        self.transport = StubTransport()
+
+
+class TestTimerWheel(AsyncTestCase):
+    async def test_expiry_order_and_cancel(self):
+        clock = FakeClock(100.0)
+        wheel = TimerWheel(tick=0.1, slots=8, clock=clock)
+        wheel.schedule_in("a", 0.25)
+        wheel.schedule_in("b", 0.05)
+        wheel.schedule_in("c", 5.0)
+        wheel.schedule_in("d", 0.3)
+        wheel.cancel("d")
+
+        # Never early, at most a tick late.
+        self.assertEqual(wheel.advance(clock.now + 0.04), [])
+        self.assertEqual(wheel.advance(clock.now + 0.2), ["b"])
+        self.assertEqual(wheel.advance(clock.now + 0.35), ["a"])
+
+        # Due on a later lap of the 8 slot wheel.
+        self.assertEqual(wheel.advance(clock.now + 1.0), [])
+        self.assertEqual(wheel.advance(clock.now + 5.1), ["c"])
+        self.assertEqual(len(wheel), 0)
+
+    async def test_reschedule_replaces(self):
+        clock = FakeClock(100.0)
+        wheel = TimerWheel(tick=0.1, clock=clock)
+        wheel.schedule_in("a", 0.1)
+        wheel.schedule_in("a", 1.0)
+        self.assertEqual(wheel.advance(clock.now + 0.5), [])
+        self.assertEqual(wheel.advance(clock.now + 1.1), ["a"])
+
+
+class TestConnTable(AsyncTestCase):
+    async def test_reject_and_evict(self):
+        table = ConnTable(max_conns=2)
+        a, b = StubClient(), StubClient()
+        table.add(("1.1.1.1", 1), a)
+        table.add(("1.1.1.1", 2), b)
+        self.assertFalse(table.admit())
+        self.assertEqual(table.rejected, 1)
+
+        table = ConnTable(max_conns=2, overflow=CONN_EVICT)
+        table.add(("1.1.1.1", 1), a)
+        table.add(("1.1.1.1", 2), b)
+        table.touch(("1.1.1.1", 1))
+
+        # b is now the least recently active.
+        self.assertTrue(table.admit())
+        self.assertTrue(b.transport.aborted)
+        self.assertEqual(list(table), [a])
+
+    async def test_idle_reaper(self):
+        clock = FakeClock(100.0)
+        table = ConnTable(idle_timeout=10, tick=1, clock=clock)
+        a, b = StubClient(), StubClient()
+        table.add(("a", 1), a)
+        table.add(("b", 1), b)
+
+        clock.now += 6
+        table.touch(("a", 1))
+        clock.now += 5
+        self.assertEqual(table.reap(), 1)
+        self.assertTrue(b.transport.aborted)
+        self.assertFalse(a.transport.aborted)
+
+        clock.now += 6
+        self.assertEqual(table.reap(), 1)
+        self.assertEqual(len(table), 0)
+        table.clear()
+
+    async def test_remove_checks_identity(self):
+        table = ConnTable()
+        a, b = StubClient(), StubClient()
+        table.add(("a", 1), a)
+        self.assertIsNone(table.remove(("a", 1), b))
+        self.assertIs(table.remove(("a", 1), a), a)
+
+
+class TestConnTableLoopback(AsyncTestCase):
+    async def asyncSetUp(self):
+        self.nic = FakeInterface("lo", 0, IP4, "127.0.0.1", None)
+
+    async def connect(self, dest):
+        return await Pipe(TCP, dest, await self.nic.route(IP4).bind()).connect()
+
+    async def test_churn_does_not_leak(self):
+        server = await Pipe(TCP, None, await self.nic.route(IP4).bind()).connect()
+        dest = ("127.0.0.1", server.sock.getsockname()[1])
+        try:
+            for _ in range(5):
+                client = await self.connect(dest)
+                await server.accept()
+                await client.close()
+
+            for _ in range(50):
+                if not len(server.tcp_clients):
+                    break
+                await asyncio.sleep(0.01)
+
+            self.assertEqual(len(server.tcp_clients), 0)
+        finally:
+            await server.close()
+
+    async def test_max_connections_reject(self):
+        conf = dict(NET_CONF, max_connections=1)
+        server = await Pipe(TCP, None, await self.nic.route(IP4).bind(), conf=conf).connect()
+        dest = ("127.0.0.1", server.sock.getsockname()[1])
+        first = await self.connect(dest)
+        second = await self.connect(dest)
+        try:
+            await server.accept()
+            await asyncio.sleep(0.1)
+            self.assertEqual(len(server.tcp_clients), 1)
+            self.assertEqual(server.tcp_clients.rejected, 1)
+            [conn] = list(server.tcp_clients)
+            self.assertEqual(conn.stream.dest_tup[1], first.sock.getsockname()[1])
+        finally:
+            await first.close()
+            await second.close()
+            await server.close()
+
+    async def test_idle_timeout(self):
+        conf = dict(NET_CONF, idle_timeout=0.2)
+        server = await Pipe(TCP, None, await self.nic.route(IP4).bind(), conf=conf).connect()
+        dest = ("127.0.0.1", server.sock.getsockname()[1])
+        client = await self.connect(dest)
+        try:
+            conn = await server.accept()
+            await asyncio.wait_for(conn.on_close.wait(), 2)
+            self.assertEqual(server.tcp_clients.reaped, 1)
+            self.assertEqual(len(server.tcp_clients), 0)
+        finally:
+            await client.close()
+            await server.close()
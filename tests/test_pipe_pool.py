@@ -0,0 +1,115 @@
+"""
+Tests for pooled TCP pipes.
+"""
+
+import asyncio
+
+from aionetiface.testing import AsyncTestCase, FakeClock, FakeInterface
+from aionetiface.net.net_defs import NET_CONF, IP4
+from aionetiface.net.pipe.pipe_pool import PipePool
+from aionetiface.protocol.http.http_client_lib import WebCurl
+
+
+class TestPipePool(AsyncTestCase):
+    async def asyncSetUp(self):
+        self.conns = []
+        self.server = await asyncio.start_server(self.serve, "127.0.0.1", 0)
+        self.dest = self.server.sockets[0].getsockname()[:2]
+        self.nic = FakeInterface("lo", 0, IP4, "127.0.0.1", None)
+        self.clock = FakeClock()
+        self.pool = PipePool(max_idle=2, idle_timeout=10, clock=self.clock)
+
+    async def asyncTearDown(self):
+        await self.pool.close()
+        for writer in self.conns:
+            writer.close()
+
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def checkout(self):
+        # A route per pipe: pipes overwrite their route's loopback port.
+        route = await self.nic.route(IP4).bind()
+        return await self.pool.checkout(route, self.dest)
+
+    async def serve(self, reader, writer):
+        """Minimal keep-alive HTTP server."""
+        self.conns.append(writer)
+        while True:
+            try:
+                await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+
+            body = b"conn %d" % (len(self.conns),)
+            writer.write(
+                b"HTTP/1.0 200 OK\r\nConnection: keep-alive\r\n"
+                b"Content-Length: %d\r\n\r\n%s" % (len(body), body)
+            )
+
+    async def test_reuse(self):
+        pipe = await self.checkout()
+        self.assertTrue(self.pool.checkin(pipe))
+        self.assertEqual(len(self.pool), 1)
+
+        self.assertIs(await self.checkout(), pipe)
+        self.assertEqual(len(self.pool), 0)
+
+        # Checked out: a second caller gets its own pipe.
+        other = await self.checkout()
+        self.assertIsNot(other, pipe)
+
+        # Not kept if the caller says it's unusable.
+        self.assertFalse(self.pool.checkin(other, reuse=False))
+        self.pool.checkin(pipe)
+        stats = self.pool.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["idle"]), (1, 2, 1))
+
+    async def test_stale(self):
+        pipe = await self.checkout()
+        self.pool.checkin(pipe)
+
+        # The server drops the idle connection.
+        await asyncio.sleep(0.05)
+        self.conns[0].close()
+        await asyncio.sleep(0.1)
+
+        fresh = await self.checkout()
+        self.assertIsNot(fresh, pipe)
+        self.assertEqual(self.pool.stats()["stale"], 1)
+        self.pool.checkin(fresh)
+
+    async def test_limits(self):
+        pipes = [await self.checkout() for _ in range(3)]
+        for pipe in pipes:
+            self.pool.checkin(pipe)
+
+        # Two kept per key: the oldest is closed.
+        self.assertEqual(len(self.pool), 2)
+        self.assertEqual(self.pool.stats()["overflow"], 1)
+
+        self.clock.now = 5
+        pipe = await self.checkout()
+        self.pool.checkin(pipe)
+
+        # Only the pipe idle since 0 times out.
+        self.clock.now = 12
+        self.pool.expire()
+        self.assertEqual(len(self.pool), 1)
+        self.assertEqual(self.pool.stats()["expired"], 1)
+
+    async def test_web_curl(self):
+        route = await self.nic.route(IP4).bind()
+        curl = WebCurl(self.dest, route, pool=self.pool)
+        for _ in range(3):
+            resp = await curl.vars().get("/")
+            self.assertEqual(resp.out, b"conn 1")
+            self.assertIsNone(resp.pipe)
+
+        self.assertEqual(len(self.conns), 1)
+        self.assertEqual(self.pool.stats()["hits"], 2)
+
+        # Opt-in through the conf uses the shared pool.
+        conf = dict(NET_CONF, pipe_pool=True)
+        resp = await WebCurl(self.dest, route).vars().get("/", conf=conf)
+        self.assertEqual(resp.out, b"conn 2")
@@ -0,0 +1,91 @@
+"""
+Tests for the TCP stream reader (readexactly / readuntil / read_into).
+"""
+
+import asyncio
+import struct
+
+from aionetiface.testing import AsyncTestCase, FakeInterface
+from aionetiface.net.net_defs import TCP, IP4
+from aionetiface.net.pipe.pipe import Pipe
+from aionetiface.net.pipe.pipe_reader import PipeReader
+
+
+class StubEvents:
+    def __init__(self):
+        self.paused = False
+
+    def pause_reading(self, reason="app"):
+        self.paused = True
+
+    def resume_reading(self, reason="app"):
+        self.paused = False
+
+
+class TestPipeReader(AsyncTestCase):
+    async def test_readexactly_across_chunks(self):
+        reader = PipeReader()
+        for chunk in (b"ab", b"cde", b"f"):
+            reader.feed_data(chunk)
+
+        self.assertEqual(await reader.readexactly(4), b"abcd")
+        task = asyncio.ensure_future(reader.readexactly(3))
+        await asyncio.sleep(0)
+        reader.feed_data(b"gh")
+        self.assertEqual(await task, b"efg")
+        self.assertEqual(len(reader), 1)
+
+    async def test_readuntil_and_eof(self):
+        reader = PipeReader()
+        reader.feed_data(b"GET / HTTP/1.1\r\nHost: x\r")
+        self.assertEqual(await reader.readuntil(b"\r\n"), b"GET / HTTP/1.1\r\n")
+        reader.feed_data(b"\n\r\n")
+        self.assertEqual(await reader.readuntil(b"\r\n"), b"Host: x\r\n")
+        self.assertEqual(await reader.readuntil(b"\r\n"), b"\r\n")
+
+        reader.feed_data(b"partial")
+        reader.feed_eof()
+        with self.assertRaises(asyncio.IncompleteReadError) as cm:
+            await reader.readexactly(10)
+        self.assertEqual(cm.exception.partial, b"partial")
+        self.assertTrue(reader.at_eof())
+
+    async def test_read_into_and_flow_control(self):
+        events = StubEvents()
+        reader = PipeReader(events, limit=4)
+        reader.feed_data(b"0123456789")
+        self.assertTrue(events.paused)
+
+        buf = bytearray(8)
+        n = await reader.read_into(buf)
+        self.assertEqual(n, 8)
+        self.assertEqual(bytes(buf), b"01234567")
+        self.assertFalse(events.paused)
+        self.assertEqual(await reader.read(), b"89")
+
+
+class TestPipeReaderLoopback(AsyncTestCase):
+    async def test_length_prefixed_frames(self):
+        nic = FakeInterface("lo", 0, IP4, "127.0.0.1", None)
+        server = await Pipe(TCP, None, await nic.route(IP4).bind()).connect()
+        dest = ("127.0.0.1", server.sock.getsockname()[1])
+        client = await Pipe(TCP, dest, await nic.route(IP4).bind()).connect()
+        try:
+            # Accepted pipes have no subscriptions, so open the
+            # reader before data can arrive.
+            conn = await server.accept()
+            conn.open_reader()
+            frames = [b"x" * i for i in (1, 300, 70000)]
+            for frame in frames:
+                await client.send(struct.pack("!I", len(frame)) + frame)
+
+            for frame in frames:
+                (size,) = struct.unpack("!I", await conn.readexactly(4))
+                self.assertEqual(await conn.readexactly(size), frame)
+
+            await client.send(b"line one\nline two\n")
+            self.assertEqual(await conn.readuntil(b"\n"), b"line one\n")
+            self.assertEqual(await conn.readuntil(b"\n"), b"line two\n")
+        finally:
+            await client.close()
+            await server.close()
@@ -0,0 +1,83 @@
+"""
+Tests for direct (task-free) relays between pipes.
+"""
+
+import asyncio
+import socket
+
+from aionetiface.testing import AsyncTestCase, FakeInterface
+from aionetiface.net.net_defs import UDP, IP4
+from aionetiface.net.pipe.pipe import Pipe
+
+
+async def wait_relayed(pipe, n):
+    for _ in range(100):
+        [(_, stats)] = pipe.relay_stats()
+        if stats["msgs"] >= n:
+            return stats
+        await asyncio.sleep(0.01)
+
+    return stats
+
+
+class TestPipeRelay(AsyncTestCase):
+    async def asyncSetUp(self):
+        self.nic = FakeInterface("lo", 0, IP4, "127.0.0.1", None)
+        self.sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sink.bind(("127.0.0.1", 0))
+        self.sink.settimeout(2)
+        self.sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+        route = await self.nic.route(IP4).bind()
+        self.source = await Pipe(UDP, None, route).connect()
+        route = await self.nic.route(IP4).bind()
+        self.target = await Pipe(UDP, self.sink.getsockname(), route).connect()
+        self.source.add_pipe(self.target, relay=True)
+
+    async def asyncTearDown(self):
+        self.sink.close()
+        self.sender.close()
+        await self.source.close()
+        await self.target.close()
+
+    async def test_relay_without_tasks(self):
+        dest = ("127.0.0.1", self.source.sock.getsockname()[1])
+        for i in range(20):
+            self.sender.sendto(b"msg" + str(i).encode(), dest)
+
+        stats = await wait_relayed(self.source, 20)
+        for i in range(20):
+            data, addr = self.sink.recvfrom(100)
+            self.assertEqual(data, b"msg" + str(i).encode())
+            self.assertEqual(addr[1], self.target.sock.getsockname()[1])
+
+        self.assertEqual(self.source.pipe_events.tasks, [])
+        self.assertEqual(stats["msgs"], 20)
+        self.assertEqual(stats["drops"], 0)
+
+    async def test_backpressure_pauses_source(self):
+        source = self.source.pipe_events
+        target = self.target.pipe_events
+
+        # Simulate the target transport crossing its high-water mark.
+        target.pause_writing()
+        dest = ("127.0.0.1", self.source.sock.getsockname()[1])
+        self.sender.sendto(b"first", dest)
+        await wait_relayed(self.source, 1)
+        self.assertEqual(self.sink.recv(100), b"first")
+        self.assertTrue(source.reading_paused)
+
+        # Nothing is read while paused.
+        self.sender.sendto(b"second", dest)
+        await asyncio.sleep(0.05)
+        [(_, stats)] = self.source.relay_stats()
+        self.assertEqual(stats["msgs"], 1)
+
+        target.resume_writing()
+        self.assertFalse(source.reading_paused)
+        await wait_relayed(self.source, 2)
+        self.assertEqual(self.sink.recv(100), b"second")
+
+    async def test_del_pipe(self):
+        self.source.del_pipe(self.target)
+        self.assertEqual(self.source.relay_stats(), [])
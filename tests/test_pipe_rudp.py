@@ -0,0 +1,206 @@
+"""
+Tests for ordered, flow-controlled RUDP streams.
+"""
+
+import asyncio
+import os
+import unittest
+
+from aionetiface.testing import AsyncTestCase, FakeInterface
+from aionetiface.net.net_defs import NET_CONF, RUDP, UDP, IP4
+from aionetiface.net.pipe.pipe import Pipe
+from aionetiface.net.pipe.pipe_rudp import (
+    ACK_HDR,
+    DATA_HDR,
+    STREAM_ACK,
+    STREAM_DATA,
+    RUDPStream,
+    RUDPStreamMux,
+)
+
+PEER = ("127.0.0.1", 1337)
+
+
+class FakeMux:
+    """Collects what a stream sends instead of putting it on the wire."""
+
+    def __init__(self):
+        self.sent = []
+        self.removed = []
+
+    def send_many(self, items):
+        self.sent.extend(items)
+        return [1] * len(items)
+
+    def sendv(self, bufs, dest_tup):
+        self.sent.append((b"".join(bufs), dest_tup))
+        return 1
+
+    def remove(self, stream):
+        self.removed.append(stream)
+
+    def segments(self):
+        out = []
+        for buf, _ in self.sent:
+            if buf[8] != STREAM_ACK:
+                seq, flag, _ = DATA_HDR.unpack_from(buf)
+                out.append((seq, flag, buf[DATA_HDR.size:]))
+
+        self.sent.clear()
+        return out
+
+    def acks(self):
+        out = []
+        for buf, _ in self.sent:
+            if buf[8] == STREAM_ACK:
+                next_seq, _, _, window = ACK_HDR.unpack_from(buf)
+                out.append((next_seq, window, buf[ACK_HDR.size:]))
+
+        self.sent.clear()
+        return out
+
+
+class TestRUDPStream(AsyncTestCase):
+    conf = dict(NET_CONF, rudp_mss=4, rudp_window=4)
+
+    async def test_window(self):
+        mux = FakeMux()
+        stream = RUDPStream(mux, PEER, 1, self.conf)
+        stream.write(b"x" * 40)
+
+        # Only a window of segments goes out.
+        self.assertEqual([seq for seq, _, _ in mux.segments()], [1, 2, 3, 4])
+        self.assertEqual(stream.unsent(), 24)
+
+        # The peer took two and has room for three from seq 3.
+        stream.on_ack(3, 3, b"")
+        self.assertEqual([seq for seq, _, _ in mux.segments()], [5])
+
+        # Zero window with nothing in flight: one probe segment.
+        stream.on_ack(6, 0, b"")
+        self.assertEqual([seq for seq, _, _ in mux.segments()], [6])
+
+        # Stale ACKs are ignored.
+        stream.on_ack(4, 4, b"")
+        self.assertEqual(mux.segments(), [])
+        stream.on_ack(7, 2, b"")
+        self.assertEqual([seq for seq, _, _ in mux.segments()], [7, 8])
+        stream.abort()
+
+    async def test_reorder(self):
+        mux = FakeMux()
+        stream = RUDPStream(mux, PEER, 1, self.conf)
+        stream.on_data(2, STREAM_DATA, b"bbbb")
+        stream.on_data(3, STREAM_DATA, b"cccc")
+        stream.on_data(3, STREAM_DATA, b"cccc")
+        await asyncio.sleep(0)
+
+        # Missing seq 1: 2 and 3 are held and selectively ACKed.
+        self.assertEqual(len(stream.reader), 0)
+        next_seq, window, bitmap = mux.acks()[-1]
+        self.assertEqual((next_seq, window), (1, 2))
+        self.assertEqual(bitmap, b"\xc0")
+
+        stream.on_data(1, STREAM_DATA, b"aaaa")
+        await asyncio.sleep(0)
+        self.assertEqual(mux.acks()[-1][0], 4)
+        self.assertEqual(await stream.readexactly(12), b"aaaabbbbcccc")
+
+        # Outside the window: dropped.
+        stream.on_data(100, STREAM_DATA, b"zzzz")
+        self.assertEqual(stream.ooo, {})
+        stream.abort()
+
+
+class TestRUDPStreamMux(AsyncTestCase):
+    async def test_claims_only_streams(self):
+        conf = dict(NET_CONF, rudp_window=4)
+        mux = RUDPStreamMux(FakeMux(), conf)
+        opener = DATA_HDR.pack(1, STREAM_DATA, 7) + b"x"
+
+        # Not accepting: plain RUDP messages that look like segments.
+        self.assertFalse(mux.handle(opener, PEER))
+        self.assertFalse(mux.handle(ACK_HDR.pack(1, STREAM_ACK, 7, 4), PEER))
+        self.assertEqual(len(mux), 0)
+
+        # Accepting: still only the start of a stream opens one.
+        mux.accepting = True
+        self.assertFalse(mux.handle(DATA_HDR.pack(2**40, STREAM_DATA, 7), PEER))
+        self.assertTrue(mux.handle(opener, PEER))
+        self.assertEqual(len(mux), 1)
+        self.assertTrue(mux.handle(ACK_HDR.pack(1, STREAM_ACK, 7, 4), PEER))
+        mux.close()
+
+
+class RUDPPipes(AsyncTestCase):
+    conf = dict(NET_CONF, rudp_stream=True)
+
+    async def asyncSetUp(self):
+        self.nic = FakeInterface("lo", 0, IP4, "127.0.0.1", None)
+        self.pipes = []
+        for _ in range(2):
+            route = await self.nic.route(IP4).bind()
+            pipe = await Pipe(RUDP, None, route, conf=self.conf).connect()
+            self.pipes.append(pipe)
+
+    async def asyncTearDown(self):
+        for pipe in self.pipes:
+            await pipe.close()
+
+    def dest(self, pipe):
+        return ("127.0.0.1", pipe.sock.getsockname()[1])
+
+
+class TestRUDPStreamPipe(RUDPPipes):
+    async def test_transfer(self):
+        client, server = self.pipes
+        payload = os.urandom(500000)
+        stream = client.open_stream(self.dest(server))
+        stream.write(payload)
+        stream.close()
+
+        peer = await asyncio.wait_for(server.accept_stream(), 2)
+        self.assertEqual(await asyncio.wait_for(peer.readexactly(len(payload)), 10), payload)
+        self.assertEqual(await asyncio.wait_for(peer.read(), 2), b"")
+        self.assertTrue(peer.at_eof())
+
+        peer.close()
+        await asyncio.wait_for(stream.wait_closed(), 5)
+        await asyncio.wait_for(peer.wait_closed(), 5)
+        self.assertEqual(client.stats()["rudp_streams"], 0)
+
+        # Nothing leaked into the datagram subscriptions.
+        self.assertEqual(server.stats()["queue_depth"], 0)
+
+    async def test_needs_rudp(self):
+        route = await self.nic.route(IP4).bind()
+        pipe = await Pipe(UDP, None, route, conf=self.conf).connect()
+        try:
+            with self.assertRaises(TypeError):
+                pipe.open_stream(self.dest(self.pipes[0]))
+        finally:
+            await pipe.close()
+
+
+
+class TestRUDPStreamFlow(RUDPPipes):
+    conf = dict(NET_CONF, rudp_stream=True, rudp_window=8, rudp_mss=100)
+
+    async def test_flow_control(self):
+        client, server = self.pipes
+        stream = client.open_stream(self.dest(server))
+        stream.write(b"x" * 10000)
+        peer = await asyncio.wait_for(server.accept_stream(), 2)
+        await asyncio.sleep(0.2)
+
+        # The receiver isn't reading: the sender stalls at its window.
+        self.assertLessEqual(len(peer.reader), 800)
+        self.assertGreater(stream.unsent(), 9000)
+
+        data = await asyncio.wait_for(peer.readexactly(10000), 10)
+        self.assertEqual(data, b"x" * 10000)
+        self.assertEqual(stream.unsent(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+"""
+Loopback tests for the pipe send paths (send_many / send_soon / drain).
+"""
+
+import asyncio
+import socket
+
+from aionetiface.testing import AsyncTestCase, FakeInterface
+from aionetiface.net.net_defs import NET_CONF, UDP, TCP, IP4
+from aionetiface.net.pipe.pipe import Pipe
+
+
+def udp_receiver():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(2)
+    return sock
+
+
+class TestPipeSend(AsyncTestCase):
+    async def asyncSetUp(self):
+        self.nic = FakeInterface("lo", 0, IP4, "127.0.0.1", None)
+        route = await self.nic.route(IP4).bind()
+        self.pipe = await Pipe(UDP, None, route).connect()
+        self.receivers = [udp_receiver() for _ in range(3)]
+
+    async def asyncTearDown(self):
+        for sock in self.receivers:
+            sock.close()
+        await self.pipe.close()
+
+    async def test_send_many(self):
+        items = []
+        for i, sock in enumerate(self.receivers):
+            items.append((b"hello " + bytes([48 + i]), sock.getsockname()))
+
+        # Not bytes-like: fails without stopping the batch.
+        items.insert(1, ("not bytes", self.receivers[0].getsockname()))
+        results = self.pipe.send_many(items)
+        self.assertEqual(results, [1, 0, 1, 1])
+
+        for i, sock in enumerate(self.receivers):
+            self.assertEqual(sock.recv(100), b"hello " + bytes([48 + i]))
+
+        # Normalised once per unique destination.
+        self.assertEqual(len(self.pipe.stream.dest_cache), 3)
+
+    async def test_send_soon_coalesces(self):
+        sock = self.receivers[0]
+        sock.setblocking(False)
+        for i in range(5):
+            self.pipe.send_soon(bytes([i]), sock.getsockname())
+
+        # Nothing sent until the loop gets a turn.
+        with self.assertRaises(BlockingIOError):
+            sock.recv(100)
+        self.assertEqual(len(self.pipe.stream.send_queue), 5)
+
+        await asyncio.sleep(0)
+        await asyncio.sleep(0.05)
+        sock.settimeout(2)
+        self.assertEqual([sock.recv(100) for _ in range(5)], [bytes([i]) for i in range(5)])
+        self.assertEqual(self.pipe.stream.send_queue, [])
+
+    async def test_sendv(self):
+        sock = self.receivers[0]
+        payload = memoryview(b"payload")
+        self.assertEqual(self.pipe.sendv([b"hdr:", payload, b"!"], sock.getsockname()), 1)
+        self.assertEqual(self.pipe.sendv([b"two"], sock.getsockname()), 1)
+
+        # One datagram per call.
+        self.assertEqual(sock.recv(100), b"hdr:payload!")
+        self.assertEqual(sock.recv(100), b"two")
+        counters = self.pipe.counters
+        self.assertEqual((counters.msgs_out, counters.bytes_out), (2, 15))
+
+    async def test_drain(self):
+        # Not paused: returns at once.
+        await asyncio.wait_for(self.pipe.drain(), 1)
+
+        self.pipe.pause_writing()
+        task = asyncio.ensure_future(self.pipe.drain())
+        await asyncio.sleep(0.05)
+        self.assertFalse(task.done())
+        self.pipe.resume_writing()
+        await asyncio.wait_for(task, 1)
+
+        # Closing wakes a blocked drain() with an error.
+        self.pipe.pause_writing()
+        task = asyncio.ensure_future(self.pipe.drain())
+        await asyncio.sleep(0)
+        await self.pipe.close()
+        with self.assertRaises(ConnectionError):
+            await asyncio.wait_for(task, 1)
+
+
+class TestPipeSendDrain(AsyncTestCase):
+    async def test_tcp_backpressure(self):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(1)
+        nic = FakeInterface("lo", 0, IP4, "127.0.0.1", None)
+        conf = dict(
+            NET_CONF, write_high_water=2**14, write_low_water=2**12, send_drain=True
+        )
+        route = await nic.route(IP4).bind()
+        pipe = await Pipe(TCP, listener.getsockname(), route, conf=conf).connect()
+        conn, _ = listener.accept()
+        conn.setblocking(False)
+        total = 2**16 * 64
+        chunk = b"x" * 2**16
+
+        async def produce():
+            for _ in range(total // len(chunk)):
+                await pipe.send(chunk)
+
+        try:
+            producer = asyncio.ensure_future(produce())
+            await asyncio.sleep(0.2)
+
+            # The peer isn't reading: send() blocks instead of buffering.
+            self.assertFalse(producer.done())
+            self.assertTrue(pipe.write_paused)
+            self.assertLess(pipe.transport.get_write_buffer_size(), 2**16 + 2**14)
+
+            loop = asyncio.get_running_loop()
+            got = 0
+            while got < total:
+                got += len(await asyncio.wait_for(loop.sock_recv(conn, 2**16), 5))
+
+            await asyncio.wait_for(producer, 5)
+        finally:
+            conn.close()
+            listener.close()
+            await pipe.close()
+
+    async def test_tcp_sendv(self):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(1)
+        nic = FakeInterface("lo", 0, IP4, "127.0.0.1", None)
+        route = await nic.route(IP4).bind()
+        pipe = await Pipe(TCP, listener.getsockname(), route).connect()
+        conn, _ = listener.accept()
+        conn.settimeout(2)
+        try:
+            self.assertEqual(pipe.sendv([b"len:", b"5", b"\n", b"hello"]), 1)
+            got = b""
+            while len(got) < 11:
+                got += conn.recv(100)
+
+            self.assertEqual(got, b"len:5\nhello")
+        finally:
+            conn.close()
+            listener.close()
+            await pipe.close()
@@ -0,0 +1,86 @@
+"""
+Tests for the pre-bound UDP socket pool.
+"""
+
+import asyncio
+import socket
+
+from aionetiface.testing import AsyncTestCase, FakeInterface
+from aionetiface.net.net_defs import NET_CONF, UDP, TCP, IP4, LOOPBACK_BIND
+from aionetiface.net.pipe.pipe import Pipe
+from aionetiface.net.pipe.pipe_sock_pool import (
+    SOCK_POOLS,
+    close_sock_pools,
+    get_sock_pool,
+)
+
+
+class TestSockPool(AsyncTestCase):
+    conf = dict(NET_CONF, sock_pool_size=4)
+
+    async def asyncSetUp(self):
+        close_sock_pools()
+        self.nic = FakeInterface("lo", 0, IP4, "127.0.0.1", None)
+        self.route = await self.nic.route(IP4).bind()
+        self.receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.receiver.bind(("127.0.0.1", 0))
+        self.receiver.settimeout(2)
+
+    async def asyncTearDown(self):
+        self.receiver.close()
+        close_sock_pools()
+
+    async def test_pooled_pipes(self):
+        pool = get_sock_pool(self.route, self.conf, LOOPBACK_BIND)
+        await pool.warm()
+        self.assertEqual(len(pool), 4)
+
+        dest = self.receiver.getsockname()
+        pipes = []
+        for i in range(6):
+            pipe = await Pipe(UDP, dest, self.route, conf=self.conf, pooled=True).connect()
+            pipes.append(pipe)
+            await pipe.send(b"msg" + bytes([48 + i]))
+
+        try:
+            got = sorted(self.receiver.recv(100) for _ in range(6))
+            self.assertEqual(got, [b"msg" + bytes([48 + i]) for i in range(6)])
+
+            # Every pipe got its own socket.
+            ports = set(pipe.sock.getsockname()[1] for pipe in pipes)
+            self.assertEqual(len(ports), 6)
+
+            stats = pool.stats()
+            self.assertGreaterEqual(stats["hits"], 4)
+            self.assertEqual(stats["hits"] + stats["misses"], 6)
+        finally:
+            for pipe in pipes:
+                await pipe.close()
+
+        # Refilled in the background.
+        await asyncio.sleep(0.05)
+        self.assertEqual(len(pool), 4)
+
+    async def test_fixed_port_not_pooled(self):
+        self.assertIsNotNone(get_sock_pool(self.route, self.conf))
+        fixed = await self.nic.route(IP4).bind(port=5555)
+        self.assertIsNone(get_sock_pool(fixed, self.conf))
+
+        # Same address and options: one shared pool.
+        other = await self.nic.route(IP4).bind()
+        self.assertIs(get_sock_pool(other, self.conf), get_sock_pool(self.route, self.conf))
+
+    async def test_tcp_ignores_pool(self):
+        server = await Pipe(TCP, None, self.route, conf=self.conf, pooled=True).connect()
+        try:
+            self.assertEqual(len(SOCK_POOLS), 0)
+        finally:
+            await server.close()
+
+    async def test_close(self):
+        pool = get_sock_pool(self.route, self.conf, LOOPBACK_BIND)
+        await pool.warm()
+        socks = list(pool.socks)
+        close_sock_pools()
+        self.assertTrue(all(sock.fileno() == -1 for sock in socks))
+        self.assertEqual(SOCK_POOLS, {})
@@ -0,0 +1,71 @@
+"""
+Tests for pipe traffic counters and the live pipe registry.
+"""
+
+import asyncio
+import socket
+
+from aionetiface.testing import AsyncTestCase, FakeInterface
+from aionetiface.net.net_defs import NET_CONF, UDP, IP4
+from aionetiface.net.pipe.pipe import Pipe
+from aionetiface.net.pipe.pipe_stats import live_pipes, pipes_snapshot
+
+
+class TestPipeStats(AsyncTestCase):
+    async def asyncSetUp(self):
+        self.nic = FakeInterface("lo", 0, IP4, "127.0.0.1", None)
+        self.sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sender.bind(("127.0.0.1", 0))
+        self.sender.settimeout(2)
+        conf = dict(NET_CONF, max_qsize=2)
+        route = await self.nic.route(IP4).bind()
+        self.pipe = await Pipe(UDP, None, route, conf=conf).connect()
+        self.dest = ("127.0.0.1", self.pipe.sock.getsockname()[1])
+
+    async def asyncTearDown(self):
+        self.sender.close()
+        await self.pipe.close()
+
+    async def wait_in(self, n):
+        for _ in range(100):
+            if self.pipe.counters.msgs_in >= n:
+                return
+            await asyncio.sleep(0.01)
+
+    async def test_counters(self):
+        self.pipe.subscribe((b"keep", None))
+
+        def bad_handler(msg, client_tup, pipe):
+            raise ValueError("boom")
+
+        self.pipe.subscribe((b"crash", None), bad_handler)
+        for msg in (b"keep 1", b"keep 2", b"keep 3", b"other", b"crash"):
+            self.sender.sendto(msg, self.dest)
+
+        await self.wait_in(5)
+        await self.pipe.send(b"reply", self.sender.getsockname())
+        self.assertEqual(self.sender.recv(100), b"reply")
+
+        counters = self.pipe.counters.as_dict()
+        self.assertEqual(counters["msgs_in"], 5)
+        self.assertEqual(counters["bytes_in"], 6 * 3 + 5 + 5)
+        self.assertEqual(counters["msgs_out"], 1)
+        self.assertEqual(counters["bytes_out"], 5)
+        self.assertEqual(counters["unmatched"], 1)
+        self.assertEqual(counters["evicted"], 1)
+        self.assertEqual(counters["handler_errors"], 1)
+
+        stats = self.pipe.stats()
+        [keep] = [s for s in stats["subs"] if s["sub"][0] == b"keep"]
+        self.assertEqual(keep["depth"], 2)
+        self.assertEqual(keep["evicted"], 1)
+        self.assertEqual(stats["queue_depth"], 2)
+
+    async def test_registry(self):
+        self.assertIn(self.pipe.pipe_events, live_pipes())
+        locals_ = [s["local"] for s in pipes_snapshot()]
+        self.assertIn(self.pipe.sock.getsockname(), locals_)
+
+        pipe_events = self.pipe.pipe_events
+        await self.pipe.close()
+        self.assertNotIn(pipe_events, live_pipes())
@@ -0,0 +1,209 @@
+"""
+Offline tests for the subscription dispatch index used by
+PipeClient.add_msg. Run without network access.
+"""
+
+import asyncio
+import re
+import socket
+import unittest
+
+from aionetiface.testing import AsyncTestCase, FakeInterface
+from aionetiface.net.net_defs import NET_CONF, SUB_ALL, UDP, IP4
+from aionetiface.net.pipe.pipe import Pipe
+from aionetiface.net.pipe.pipe_client import PipeClient
+from aionetiface.net.pipe.pipe_subs import SUB_INDEX_MIN, SubIndex, literal_from_pattern
+from aionetiface.net.pipe.pipe_stats import PipeCounters
+
+
+class StubEvents:
+    route = None
+
+    def __init__(self):
+        self.paused = False
+        self.counters = PipeCounters()
+
+    def pause_reading(self, reason="app"):
+        self.paused = True
+
+    def resume_reading(self, reason="app"):
+        self.paused = False
+
+
+def make_client(**conf):
+    return PipeClient(StubEvents(), conf=dict(NET_CONF, **conf))
+
+
+def queued(client, sub):
+    q = client.subs[client.hash_sub(sub)][1]
+    out = []
+    while not q.empty():
+        out.append(q.get_nowait()[1])
+
+    return out
+
+
+class TestLiteralFromPattern(unittest.TestCase):
+    def test_escaped_binary_is_literal(self):
+        for raw in (b"\x00\x01*+?", b"abc.def", b"(x)[y]{z}|$^\\"):
+            self.assertEqual(literal_from_pattern(re.escape(raw)), (False, raw))
+
+    def test_anchor(self):
+        self.assertEqual(literal_from_pattern(b"^HELLO"), (True, b"HELLO"))
+
+    def test_regex_is_not_literal(self):
+        for p in (b"a.b", b"\\d+", b"x|y", b"[ab]", b"ab\\"):
+            self.assertIsNone(literal_from_pattern(p))
+
+
+class TestSubIndex(unittest.TestCase):
+    def test_address_buckets(self):
+        index = SubIndex()
+        index.add(1, (None, None))
+        index.add(2, (None, ("127.0.0.1", 0)))
+        index.add(3, (None, ("127.0.0.1", 1000)))
+        index.add(4, (None, ("127.0.0.2", 1000)))
+
+        self.assertEqual(list(index.match(b"x", ("127.0.0.1", 1000))), [1, 2, 3])
+        self.assertEqual(list(index.match(b"x", ("127.0.0.1", 5))), [1, 2])
+        self.assertEqual(list(index.match(b"x", ("10.0.0.1", 5))), [1])
+
+        index.remove(3)
+        index.remove(4)
+        self.assertEqual(index.by_tup, {})
+
+    def test_many_literals_window_scan(self):
+        index = SubIndex()
+        ids = [bytes([i]) * 12 for i in range(64)]
+        for i, txn_id in enumerate(ids):
+            index.add(i, (re.escape(txn_id), None))
+
+        msg = b"\x01\x01\x00\x00" + ids[42] + b"tail"
+        self.assertEqual(list(index.match(msg, ("1.1.1.1", 1))), [42])
+
+
+class TestPipeClientDispatch(unittest.TestCase):
+    def test_literal_prefix_and_regex_subs(self):
+        client = make_client()
+        lit = (re.escape(b"txn*1"), None)
+        pre = (b"^GET ", None)
+        rex = (b"[0-9]{3}", None)
+        for sub in (lit, pre, rex):
+            client.subscribe(sub)
+
+        client.add_msg(b"GET /txn*1", ("127.0.0.1", 80))
+        client.add_msg(b"HTTP/1.1 200 OK", ("127.0.0.1", 80))
+        client.add_msg(b"xGET txn1", ("127.0.0.1", 80))
+
+        self.assertEqual(queued(client, lit), [b"GET /txn*1"])
+        self.assertEqual(queued(client, pre), [b"GET /txn*1"])
+        self.assertEqual(queued(client, rex), [b"HTTP/1.1 200 OK"])
+
+    def test_walk_and_index_agree(self):
+        # Below SUB_INDEX_MIN add_msg walks the subs, above it uses the index.
+        for fillers in (0, SUB_INDEX_MIN):
+            client = make_client()
+            for i in range(fillers):
+                client.subscribe((re.escape(b"filler%d" % i), ("10.0.0.1", 0)))
+
+            near = (b"^pi", ("127.0.0.1", 0))
+            exact = (b"ng", ("127.0.0.1", 5))
+            client.subscribe(near)
+            client.subscribe(exact)
+            client.add_msg(b"ping", ("127.0.0.1", 5))
+            client.add_msg(b"ping", ("127.0.0.1", 6))
+            client.add_msg(b"pong", ("127.0.0.2", 5))
+
+            self.assertEqual(queued(client, near), [b"ping", b"ping"])
+            self.assertEqual(queued(client, exact), [b"ping"])
+
+    def test_replaced_sub_is_reindexed(self):
+        client = make_client()
+        for i in range(SUB_INDEX_MIN):
+            client.subscribe((re.escape(b"filler%d" % i), None))
+
+        # Same offset and count, different pattern.
+        offset = client.subscribe((b"old", None))
+        q = client.subs[offset][1]
+        client.subs[offset] = [(b"new", None), q, None]
+        client.add_msg(b"old", ("127.0.0.1", 1))
+        client.add_msg(b"new", ("127.0.0.1", 1))
+        self.assertEqual(q.get_nowait()[1], b"new")
+        self.assertTrue(q.empty())
+
+        client.subs.pop(offset)
+        self.assertEqual(len(client.sub_index), SUB_INDEX_MIN)
+
+    def test_unsubscribe_and_reset(self):
+        client = make_client()
+        sub = (b"ping", ("127.0.0.1", 0))
+        client.subscribe(sub)
+        client.unsubscribe(sub)
+        self.assertEqual(len(client.sub_index), 0)
+
+        client.subscribe(sub)
+        client.subs = {}
+        self.assertEqual(len(client.sub_index), 0)
+        client.add_msg(b"ping", ("127.0.0.1", 1))
+
+
+class TestSubQueueBudgets(unittest.TestCase):
+    def test_byte_budget_evicts_oldest(self):
+        client = make_client(max_qbytes=10)
+        client.subscribe(SUB_ALL)
+        for msg in (b"aaaa", b"bbbb", b"cccc"):
+            client.add_msg(msg, ("127.0.0.1", 1))
+
+        self.assertEqual(queued(client, SUB_ALL), [b"bbbb", b"cccc"])
+
+    def test_backpressure_pauses_then_resumes(self):
+        client = make_client(max_qsize=4, sub_backpressure=True)
+        client.subscribe(SUB_ALL)
+        for i in range(6):
+            client.add_msg(to_msg(i), ("127.0.0.1", 1))
+
+        # Nothing evicted and the pipe was told to stop reading.
+        q = client.subs[client.hash_sub(SUB_ALL)][1]
+        self.assertEqual(q.qsize(), 6)
+        self.assertTrue(client.pipe_events.paused)
+
+        # Draining to half the budget resumes.
+        for i in range(3):
+            self.assertEqual(q.get_nowait()[1], to_msg(i))
+        self.assertTrue(client.pipe_events.paused)
+        q.get_nowait()
+        self.assertFalse(client.pipe_events.paused)
+
+
+def to_msg(i):
+    return b"msg" + bytes([i])
+
+
+class TestBackpressureLoopback(AsyncTestCase):
+    async def test_udp_backpressure_no_loss(self):
+        conf = dict(NET_CONF, max_qsize=2, sub_backpressure=True)
+        nic = FakeInterface("lo", 0, IP4, "127.0.0.1", None)
+        route = await nic.route(IP4).bind()
+        pipe = await Pipe(UDP, None, route, conf=conf).connect()
+        pipe.subscribe(SUB_ALL)
+        dest = ("127.0.0.1", pipe.sock.getsockname()[1])
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            for i in range(20):
+                sender.sendto(to_msg(i), dest)
+
+            await asyncio.sleep(0.1)
+            self.assertTrue(pipe.pipe_events.reading_paused)
+
+            got = []
+            for _ in range(20):
+                got.append(await pipe.recv(SUB_ALL, timeout=2))
+
+            self.assertEqual(got, [to_msg(i) for i in range(20)])
+        finally:
+            sender.close()
+            await pipe.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+"""
+Tests for the persistent STUN / NTP server scoreboard.
+"""
+
+import os
+import random
+import tempfile
+import unittest
+
+from aionetiface import servers
+from aionetiface.testing import FakeClock
+from aionetiface.net.net_defs import IP4, UDP
+from aionetiface.nic.nat import server_scores
+from aionetiface.nic.nat.server_scores import ServerScores, record_server, server_key
+
+
+def group(ip):
+    return [{"ip": ip, "port": 3478, "score": 1}]
+
+
+class TestServerScores(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "scores.json")
+        self.clock = FakeClock(1000.0)
+        self.scores = ServerScores(self.path, clock=self.clock)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_rank(self):
+        groups = [group(ip) for ip in ("192.0.2.1", "192.0.2.2", "192.0.2.3", "192.0.2.4")]
+        for _ in range(3):
+            self.scores.record(server_key(UDP, "192.0.2.3", 3478), 0.02)
+            self.scores.record(server_key(UDP, "192.0.2.2", 3478), 0.2)
+        self.scores.record(server_key(UDP, "192.0.2.1", 3478), ok=False)
+
+        # Fast, slower, unknown, failed.
+        ranked = self.scores.rank(groups, UDP, random.Random(1), explore=0)
+        ips = [g[0]["ip"] for g in ranked]
+        self.assertEqual(ips, ["192.0.2.3", "192.0.2.2", "192.0.2.4", "192.0.2.1"])
+
+        # A failure fades once it's old and the server answers again.
+        self.clock.now += 3600
+        for _ in range(10):
+            self.scores.record(server_key(UDP, "192.0.2.1", 3478), 0.01)
+        ranked = self.scores.rank(groups, UDP, random.Random(1), explore=0)
+        self.assertEqual(ranked[0][0]["ip"], "192.0.2.1")
+
+        # Exploration still gives the others a turn.
+        firsts = set()
+        for seed in range(50):
+            firsts.add(self.scores.rank(groups, UDP, random.Random(seed))[0][0]["ip"])
+        self.assertGreater(len(firsts), 1)
+
+    def test_persist(self):
+        key = server_key(UDP, "192.0.2.1", 123)
+        self.scores.record(key, 0.05)
+        self.scores.record(key, 0.15)
+        self.scores.save()
+
+        loaded = ServerScores(self.path, clock=self.clock).get(key)
+        self.assertAlmostEqual(loaded["rtt"], 80.0)
+        self.assertEqual(loaded["n"], 2)
+
+        # A corrupt file is no history, not an error.
+        with open(self.path, "w") as fh:
+            fh.write("{nope")
+        self.assertIsNone(ServerScores(self.path).get(key))
+
+    def test_get_infra_prefers_fast(self):
+        # INFRA_SEED is random per process; pin it so exploration
+        # picks are the same every run.
+        old_seed = servers.INFRA_SEED
+        old = servers.SERVER_SCORES
+        servers.INFRA_SEED = b"scores"
+        try:
+            groups = servers.get_infra(IP4, UDP, "STUN(see_ip)", no=100)
+            fast = groups[-1][0]
+            scores = ServerScores(self.path, clock=self.clock)
+            scores.record(server_key(UDP, fast["ip"], fast["port"]), 0.01)
+
+            servers.SERVER_SCORES = scores
+            firsts = [
+                servers.get_infra(IP4, UDP, "STUN(see_ip)", no=1, attempt=i)[0][0]
+                for i in range(20)
+            ]
+        finally:
+            servers.SERVER_SCORES = old
+            servers.INFRA_SEED = old_seed
+
+        # servers.json lists some servers in several groups so
+        # compare addresses, not entries.
+        addr = (fast["ip"], fast["port"])
+        hits = sum(1 for s in firsts if (s["ip"], s["port"]) == addr)
+        self.assertGreaterEqual(hits, 12)
+
+    def test_rank_dedupes(self):
+        groups = [group("192.0.2.1"), group("192.0.2.2"), group("192.0.2.1")]
+        self.scores.record(server_key(UDP, "192.0.2.1", 3478), 0.01)
+        for scores in (self.scores, ServerScores(self.path + ".empty")):
+            ranked = scores.rank(groups, UDP, random.Random(1), explore=0)
+            ips = sorted(g[0]["ip"] for g in ranked)
+            self.assertEqual(ips, ["192.0.2.1", "192.0.2.2"])
+
+    def test_skip_local(self):
+        old = server_scores.SERVER_SCORES
+        server_scores.SERVER_SCORES = self.scores
+        try:
+            record_server(UDP, ("127.0.0.1", 3478), 0.01)
+            record_server(UDP, ("192.168.1.1", 3478), 0.01)
+            record_server(UDP, ("8.8.8.8", 3478), 0.01)
+        finally:
+            server_scores.SERVER_SCORES = old
+
+        self.assertIsNone(self.scores.get(server_key(UDP, "127.0.0.1", 3478)))
+        self.assertIsNone(self.scores.get(server_key(UDP, "192.168.1.1", 3478)))
+        self.assertIsNotNone(self.scores.get(server_key(UDP, "8.8.8.8", 3478)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+"""
+Tests for the STUN codec: offset tables, address decoding and
+request templates.
+"""
+
+import unittest
+
+from aionetiface.net.net_defs import IP4, IP6
+from aionetiface.protocol.stun.stun_defs import (
+    RFC3489,
+    RFC5389,
+    STUNAddrTup,
+    STUNAttrs,
+    STUNMsg,
+    STUNMsgCodes,
+    stun_req_buf,
+    unpack_addr,
+)
+from aionetiface.protocol.stun.stun_utils import stun_proto
+
+
+def reply_buf(mode, attrs):
+    msg = STUNMsg(msg_code=STUNMsgCodes.SuccessResp, mode=mode)
+    for attr_code, attr_data in attrs:
+        msg.write_attr(attr_code, attr_data)
+
+    return msg.txn_id, msg.pack()
+
+
+class TestSTUNCodec(unittest.TestCase):
+    def test_templates(self):
+        attrs = [[STUNAttrs.ChangeRequest, b"\0\0\0\6"]]
+        for mode in (RFC3489, RFC5389):
+            msg = STUNMsg(mode=mode)
+            msg.write_attr(*attrs[0])
+            msg.write_transaction_counter(1)
+
+            # Same bytes as building the message attribute by attribute.
+            txn_id, buf = stun_req_buf(mode, attrs, txn_id=msg.txn_id)
+            self.assertEqual(bytes(buf), msg.pack())
+
+            # Only the transaction ID differs between requests.
+            other_id, other = stun_req_buf(mode, attrs)
+            self.assertNotEqual(other_id, txn_id)
+            self.assertEqual(other[:8] + other[20:], buf[:8] + buf[20:])
+            self.assertEqual(bytes(other[8:20]), other_id)
+
+    def test_offset_table(self):
+        _, buf = reply_buf(
+            RFC3489,
+            [[STUNAttrs.Software, b"abc"], [STUNAttrs.ChangeRequest, b"\0\0\0\2"]],
+        )
+        msg, rest = STUNMsg.unpack(buf + b"xy")
+        self.assertEqual(rest, b"xy")
+        self.assertEqual(msg.attrs(), [(0x8022, 4, 3), (0x0003, 12, 4)])
+        self.assertEqual(bytes(msg.get_attr(STUNAttrs.Software)), b"abc")
+        self.assertIsNone(msg.get_attr(STUNAttrs.Realm))
+
+        # Attribute overruns the body.
+        bad = bytearray(buf)
+        bad[22:24] = b"\x00\x40"
+        with self.assertRaises(Exception):
+            STUNMsg.unpack(bytes(bad))[0].attrs()
+
+    def test_decode_then_write(self):
+        _, buf = reply_buf(RFC5389, [[STUNAttrs.Software, b"abc"]])
+        recv_buf = bytearray(buf)
+        msg, _ = STUNMsg.unpack(recv_buf, mode=RFC5389)
+        msg.write_attr(STUNAttrs.ChangeRequest, b"\0\0\0\2")
+
+        # The message has its own copy of the body.
+        recv_buf[20:] = b"\0" * (len(recv_buf) - 20)
+        self.assertIsInstance(msg.msg, bytearray)
+        self.assertEqual(bytes(msg.get_attr(STUNAttrs.Software)), b"abc")
+        self.assertEqual(bytes(msg.get_attr(STUNAttrs.ChangeRequest)), b"\0\0\0\2")
+
+        # Round trips through pack().
+        again, _ = STUNMsg.unpack(msg.pack(), mode=RFC5389)
+        self.assertEqual(again.attrs(), msg.attrs())
+
+    def test_addrs_match_legacy_decoder(self):
+        cases = [(IP4, "203.0.113.7", 40000), (IP6, "2001:db8::1", 3478)]
+        for af, ip, port in cases:
+            for mode in (RFC3489, RFC5389):
+                for code in (
+                    STUNAttrs.MappedAddress,
+                    STUNAttrs.XorMappedAddress,
+                    STUNAttrs.XorMappedAddressX,
+                ):
+                    msg = STUNMsg(mode=mode)
+                    legacy = STUNAddrTup(
+                        ip=ip,
+                        port=port,
+                        af=af,
+                        txid=msg.txn_id,
+                        magic_cookie=msg.magic_cookie,
+                    )
+                    data = legacy.encode(code)
+                    expect = legacy.unpack(code, data).tup
+
+                    msg.write_attr(code, data)
+                    reply, _ = stun_proto(msg.pack(), af)
+                    self.assertEqual(reply.rtup, expect)
+
+        self.assertEqual(unpack_addr(b"\0\1\0\x50\x7f\0\0\1"), ("127.0.0.1", 80))
+
+
+if __name__ == "__main__":
+    unittest.main()
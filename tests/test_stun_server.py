@@ -0,0 +1,89 @@
+"""
+Tests for the in-process STUN server.
+"""
+
+import asyncio
+import socket
+
+from aionetiface.testing import AsyncTestCase, FakeInterface
+from aionetiface.net.net_defs import IP4, TCP, UDP
+from aionetiface.protocol.stun.stun_client import STUNClient
+from aionetiface.protocol.stun.stun_defs import RFC3489, RFC5389, STUNMsg
+from aionetiface.protocol.stun.stun_server import STUNServer
+from aionetiface.protocol.stun.stun_utils import stun_proto
+
+
+class TestSTUNServer(AsyncTestCase):
+    async def asyncSetUp(self):
+        self.nic = FakeInterface("lo", 0, IP4, "127.0.0.1", None)
+        self.serv = STUNServer()
+        await self.serv.listen_stun(self.nic, ["127.0.0.1", "127.0.0.2"], [0, 0])
+        self.dest = self.serv.addrs[(0, 0)]
+
+    async def asyncTearDown(self):
+        await self.serv.close()
+
+    def client(self, mode, proto=UDP):
+        return STUNClient(IP4, self.dest, self.nic, proto=proto, mode=mode)
+
+    async def test_binding(self):
+        for proto in (UDP, TCP):
+            self.assertEqual(await self.client(RFC5389, proto).get_wan_ip(), "127.0.0.1")
+
+        # RFC 3489 replies carry the server's other address.
+        reply = await self.client(RFC3489).get_stun_reply()
+        self.assertEqual(reply.rtup[0], "127.0.0.1")
+        self.assertEqual(reply.ctup, self.serv.addrs[(1, 1)])
+
+    async def test_change_request(self):
+        client = self.client(RFC3489)
+        ctup = self.serv.addrs[(1, 1)]
+        reply = await client.get_change_port_reply(ctup)
+        self.assertEqual(reply.stup, self.serv.addrs[(0, 1)])
+
+        reply = await client.get_change_tup_reply(ctup)
+        self.assertEqual(reply.stup, ctup)
+        self.assertEqual(self.serv.stats()["changed"], 2)
+
+    async def test_tcp_stream(self):
+        # Two requests split across writes on one connection.
+        bufs = [STUNMsg(mode=RFC5389) for _ in range(2)]
+        data = b"".join(msg.pack() for msg in bufs)
+        loop = asyncio.get_running_loop()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        try:
+            await loop.sock_connect(sock, self.dest)
+            await loop.sock_sendall(sock, data[:10])
+            await asyncio.sleep(0.05)
+            await loop.sock_sendall(sock, data[10:])
+
+            out = b""
+            while len(out) < 64:
+                out += await asyncio.wait_for(loop.sock_recv(sock, 1024), 2)
+        finally:
+            sock.close()
+
+        for msg in bufs:
+            reply, out = stun_proto(out, IP4)
+            self.assertEqual(reply.txn_id, msg.txn_id)
+            self.assertEqual(reply.rtup[0], "127.0.0.1")
+
+
+class TestSTUNServerOneAddr(AsyncTestCase):
+    async def test_unsupported_change(self):
+        nic = FakeInterface("lo", 0, IP4, "127.0.0.1", None)
+        async with STUNServer() as serv:
+            await serv.listen_stun(nic, ["127.0.0.1"], [0], protos=[UDP])
+            dest = serv.addrs[(0, 0)]
+            msg = STUNMsg(mode=RFC3489)
+            msg.write_attr(b"\x00\x03", b"\x00\x00\x00\x06")
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            try:
+                sock.sendto(msg.pack(), dest)
+                await asyncio.sleep(0.1)
+            finally:
+                sock.close()
+
+            self.assertEqual(serv.stats()["unsupported"], 1)
+            self.assertEqual(serv.stats()["replies"], 0)
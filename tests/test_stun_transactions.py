@@ -0,0 +1,115 @@
+"""
+Tests for sharing one UDP pipe between many STUN transactions.
+"""
+
+import asyncio
+
+from aionetiface.testing import AsyncTestCase, FakeClock, FakeInterface
+from aionetiface.errors import ErrorNoReply
+from aionetiface.net.net_defs import IP4, UDP
+from aionetiface.protocol.stun.stun_client import STUNClient
+from aionetiface.protocol.stun.stun_defs import RFC3489, RFC5389
+from aionetiface.protocol.stun.stun_server import STUNServer
+from aionetiface.protocol.stun.stun_transactions import STUNTransactionManager
+
+
+class FakePipeEvents:
+    is_running = True
+
+
+class FakeRoute:
+    af = IP4
+
+
+class FakePipe:
+    def __init__(self):
+        self.pipe_events = FakePipeEvents()
+        self.route = FakeRoute()
+        self.sent = []
+
+    def add_msg_cb(self, msg_cb):
+        pass
+
+    def del_msg_cb(self, msg_cb):
+        pass
+
+    def send_many(self, items):
+        self.sent += [(bytes(buf), dest) for buf, dest in items]
+        return [1] * len(items)
+
+
+class TestSTUNTransactions(AsyncTestCase):
+    async def asyncSetUp(self):
+        self.nic = FakeInterface("lo", 0, IP4, "127.0.0.1", None)
+        self.serv = STUNServer()
+        await self.serv.listen_stun(
+            self.nic, ["127.0.0.1", "127.0.0.2"], [0, 0], protos=[UDP]
+        )
+        self.dest = self.serv.addrs[(0, 0)]
+        route = await self.nic.route(IP4).bind()
+        self.txm = await STUNTransactionManager.open(route)
+
+    async def asyncTearDown(self):
+        await self.txm.close()
+        await self.serv.close()
+
+    async def test_concurrent(self):
+        replies = await asyncio.gather(
+            *[self.txm.request(self.dest, mode=RFC5389) for _ in range(200)]
+        )
+        self.assertEqual({reply.rtup[0] for reply in replies}, {"127.0.0.1"})
+        self.assertEqual(len({reply.txn_id for reply in replies}), 200)
+        self.assertEqual(self.txm.stats()["replies"], 200)
+        self.assertEqual(len(self.txm), 0)
+
+    async def test_client_change_requests(self):
+        client = STUNClient(IP4, self.dest, self.nic, mode=RFC3489)
+        ctup = self.serv.addrs[(1, 1)]
+        replies = await asyncio.gather(
+            client.get_change_tup_reply(ctup, pipe=self.txm),
+            client.get_change_port_reply(ctup, pipe=self.txm),
+            client.get_wan_ip(pipe=self.txm),
+        )
+        self.assertEqual(replies[0].stup, ctup)
+        self.assertEqual(replies[1].stup, self.serv.addrs[(0, 1)])
+        self.assertEqual(replies[2], "127.0.0.1")
+
+    async def test_wrong_reply_addr(self):
+        # The server answers from dest, not the address we wait on.
+        with self.assertRaises(ErrorNoReply):
+            await self.txm.request(
+                self.dest, reply_addr=self.serv.addrs[(1, 1)], timeout=0.3
+            )
+
+        self.assertGreaterEqual(self.txm.stats()["stray"], 1)
+        self.assertEqual(len(self.txm), 0)
+
+
+class TestSTUNRetransmit(AsyncTestCase):
+    async def test_rto_schedule(self):
+        clock = FakeClock()
+        pipe = FakePipe()
+        txm = STUNTransactionManager(pipe, rto=0.5, rc=7, rm=16, clock=clock)
+        task = asyncio.ensure_future(txm.request(("192.0.2.1", 3478)))
+        await asyncio.sleep(0)
+
+        # Step the clock through 40 seconds and note when requests go out.
+        sends = [0.0]
+        for step in range(1, 801):
+            clock.now = step * 0.05
+            before = len(pipe.sent)
+            txm.expire()
+            if len(pipe.sent) > before:
+                sends.append(round(clock.now, 2))
+            if not txm.pending:
+                break
+
+        self.assertEqual(sends, [0.0, 0.5, 1.5, 3.5, 7.5, 15.5, 31.5])
+        self.assertEqual(round(clock.now, 2), 39.5)
+        with self.assertRaises(ErrorNoReply):
+            await task
+
+        # The transmit counter goes up with each send.
+        self.assertEqual([buf[-3] for buf, _ in pipe.sent], [1, 2, 3, 4, 5, 6, 7])
+        self.assertEqual(txm.stats()["timeouts"], 1)
+        await txm.close()
@@ -0,0 +1,104 @@
+"""
+Tests for caching the WAN IPs found by STUN per network and source IP.
+"""
+
+import os
+import tempfile
+
+from aionetiface.testing import AsyncTestCase, FakeInterface
+from aionetiface.net.ip_range import IPRange
+from aionetiface.net.net_defs import IP4, IP6
+from aionetiface.nic.interface import Interface
+from aionetiface.nic.nat import nat_cache
+from aionetiface.nic.route.route import Route
+from aionetiface.nic.route.route_load import lookup_wan_ip_cached
+from aionetiface.nic.route.route_pool import RoutePool
+from aionetiface.protocol.stun.stun_client import STUNClient
+from aionetiface.protocol.stun.stun_defs import RFC5389
+
+
+class StubNetifaces:
+    def __init__(self, addrs):
+        self.addrs = addrs
+
+    def ifaddresses(self, name):
+        return self.addrs
+
+    def gateways(self):
+        return {int(IP4): [("192.168.1.1", "eth0", True)]}
+
+
+def stub_nic(ip4, ip6):
+    nic = Interface("eth0")
+    nic.netifaces = StubNetifaces({
+        int(IP4): [{"addr": ip4}],
+        int(IP6): [{"addr": "fe80::1%eth0"}, {"addr": ip6}],
+    })
+    return nic
+
+
+class TestWANCache(AsyncTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.old_path = nat_cache.WAN_CACHE_PATH
+        nat_cache.WAN_CACHE_PATH = os.path.join(self.tmp.name, "wan.json")
+
+    async def asyncTearDown(self):
+        nat_cache.WAN_CACHE_PATH = self.old_path
+        self.tmp.cleanup()
+
+    async def test_get_put(self):
+        nat_cache.wan_cache_put("net1", "192.168.1.2", "8.8.8.8", now=100)
+        self.assertEqual(nat_cache.wan_cache_get("net1", "192.168.1.2", now=200), "8.8.8.8")
+        self.assertIsNone(nat_cache.wan_cache_get("net1", "192.168.1.3", now=200))
+        self.assertIsNone(nat_cache.wan_cache_get("net2", "192.168.1.2", now=200))
+
+        # Too old to serve.
+        later = 100 + nat_cache.WAN_CACHE_MAX_AGE
+        self.assertIsNone(nat_cache.wan_cache_get("net1", "192.168.1.2", now=later))
+
+    async def test_lookup_cached(self):
+        nic = FakeInterface("lo", 0, IP4, "127.0.0.1", None)
+        stun_clients = [STUNClient(IP4, ("192.0.2.1", 3478), nic, mode=RFC5389)]
+        nat_cache.wan_cache_put("net1", "192.168.1.2", "8.8.8.8")
+
+        # Hit: the route comes from the cache and is listed for revalidation.
+        stale = []
+        src_ip, route = await lookup_wan_ip_cached(
+            "192.168.1.2", 1, stun_clients, 4, fingerprint="net1", stale=stale
+        )
+        self.assertEqual(src_ip, "192.168.1.2")
+        self.assertEqual(route.ext(), "8.8.8.8")
+        self.assertEqual(route.nic(), "192.168.1.2")
+        self.assertEqual(stale, [(IP4, "192.168.1.2", "8.8.8.8", None)])
+
+    async def test_wan_ip_changed(self):
+        nic = Interface("eth0")
+        route = Route(IP4, [IPRange("192.168.1.2")], [IPRange("8.8.8.8")], nic)
+        nic.rp[IP4] = RoutePool([route])
+
+        seen = []
+        nic.add_wan_ip_cb(lambda *args: seen.append(args[1:]))
+        nic.wan_ip_changed(IP4, "192.168.1.2", "8.8.8.8", "1.1.1.1")
+        self.assertEqual(route.ext(), "1.1.1.1")
+        self.assertEqual(seen, [(IP4, "192.168.1.2", "8.8.8.8", "1.1.1.1")])
+
+    async def test_fingerprint(self):
+        # Same gateway and DHCP address, different IPv6 networks.
+        a = stub_nic("192.168.1.100", "2001:db8:1:1::10")
+        b = stub_nic("192.168.1.100", "2001:db8:2:2::10")
+        self.assertNotEqual(
+            nat_cache.network_fingerprint([a]), nat_cache.network_fingerprint([b])
+        )
+
+        # A new privacy address on the same /64 is the same network.
+        c = stub_nic("192.168.1.100", "2001:db8:1:1::99")
+        self.assertEqual(
+            nat_cache.network_fingerprint([a]), nat_cache.network_fingerprint([c])
+        )
+
+        # The addresses count even with no routes loaded.
+        d = stub_nic("192.168.1.101", "2001:db8:1:1::10")
+        self.assertNotEqual(
+            nat_cache.network_fingerprint([a]), nat_cache.network_fingerprint([d])
+        )